@@ -1,13 +1,23 @@
-from setuptools import setup, find_packages
+from setuptools import setup
 
 setup(
     name="data-ingestion",
     version="0.1",
-    packages=find_packages(),
+    # src/ se instala como el paquete pipeline_paises; sus módulos se importan entre sí con imports relativos
+    packages=["pipeline_paises"],
+    package_dir={"pipeline_paises": "src"},
+    # Datasets de entrada; las salidas se escriben en rutas.BASE_DIR y no forman parte del paquete
+    package_data={"pipeline_paises": ["Dataset2_Actividad3/*.csv"]},
     install_requires=[
         "requests",
         "pandas",
         "openpyxl",
+        "pyarrow",
         "sqlite3-offline",
     ],
-)
\ No newline at end of file
+    entry_points={
+        "console_scripts": [
+            "pipeline = pipeline_paises.comandos:main",
+        ],
+    },
+)
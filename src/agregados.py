@@ -0,0 +1,290 @@
+import sys
+import time
+import sqlite3
+import numpy as np
+import pandas as pd
+from . import rutas
+
+# Configuración
+ENRICHED_DB_PATH = rutas.output("db", "enriched.db")
+BASE_TABLE = "enriched_countries"
+ORDER_COL = 'id'  # Orden de aparición de los países, para desempatar como value_counts
+BATCH_SIZE = 500  # Huellas por sentencia al leer y borrar filas
+
+# Tablas materializadas: nombre -> columnas clave. Todas guardan la cantidad de países
+# y el primer id de cada grupo; region_totals y dataset_totals también sumas.
+AGGREGATES = {
+    'agg_region_language_family': ['region', 'language_family'],
+    'agg_linguistic_diversity': ['linguistic_diversity'],
+    'agg_region_totals': ['region'],
+    'agg_dataset_totals': [],
+}
+SUM_COLS = {
+    'agg_region_totals': ['population', 'area', 'language_count'],
+    'agg_dataset_totals': ['population', 'area', 'language_count'],
+}
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def row_hashes(df):
+    """Huella de 64 bits por fila; dos filas con la misma huella aportan lo mismo a los agregados"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64)
+
+def _stored_columns(conn):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({BASE_TABLE})")]
+
+def create_tables(conn, df):
+    """Tabla base con las columnas del dataset enriquecido y las tablas de agregados"""
+    columns = ", ".join(f'"{col}" {_sql_type(df[col].dtype)}' for col in df.columns)
+    conn.execute(f"CREATE TABLE {BASE_TABLE} ({columns}, row_hash INTEGER NOT NULL)")
+    conn.execute(f"CREATE INDEX idx_{BASE_TABLE}_row_hash ON {BASE_TABLE} (row_hash)")
+    # Índices para recalcular el primer id de un grupo y buscar el país con más idiomas sin recorrer la tabla
+    for table, keys in AGGREGATES.items():
+        if keys:
+            conn.execute(f"CREATE INDEX idx_{BASE_TABLE}_{table} ON {BASE_TABLE} ({', '.join(keys)}, {ORDER_COL})")
+    conn.execute(f"CREATE INDEX idx_{BASE_TABLE}_language_count ON {BASE_TABLE} (language_count, {ORDER_COL})")
+
+    for table, keys in AGGREGATES.items():
+        key_columns = [f"{key} TEXT NOT NULL" for key in keys] or ["id INTEGER NOT NULL DEFAULT 1"]
+        sum_columns = [f"{col} REAL NOT NULL DEFAULT 0" for col in SUM_COLS.get(table, [])]
+        primary_key = ", ".join(keys) or "id"
+        conn.execute(f"""
+        CREATE TABLE {table} (
+            {', '.join(key_columns + sum_columns)},
+            countries INTEGER NOT NULL,
+            first_id INTEGER,
+            PRIMARY KEY ({primary_key})
+        )""")
+
+def drop_tables(conn):
+    conn.execute(f"DROP TABLE IF EXISTS {BASE_TABLE}")
+    for table in AGGREGATES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+def _contributions(rows, sign):
+    """Aporte de un conjunto de filas a cada tabla de agregados: conteos y sumas con signo"""
+    result = {}
+    for table, keys in AGGREGATES.items():
+        valid = rows.dropna(subset=keys) if keys else rows
+        sums = SUM_COLS.get(table, [])
+        if valid.empty:
+            result[table] = pd.DataFrame(columns=keys + sums + ['countries', 'first_id'])
+            continue
+        frame = pd.DataFrame({key: valid[key].astype(str) for key in keys}, index=valid.index)
+        for col in sums:
+            frame[col] = valid[col].fillna(0).astype('float64') * sign
+        frame['countries'] = sign
+        frame['first_id'] = valid[ORDER_COL]
+        if keys:
+            grouped = frame.groupby(keys, sort=False)
+            aggregated = grouped[sums + ['countries']].sum()
+            aggregated['first_id'] = grouped['first_id'].min()
+            result[table] = aggregated.reset_index()
+        else:
+            result[table] = pd.DataFrame([{**{col: frame[col].sum() for col in sums + ['countries']},
+                                           'first_id': frame['first_id'].min()}])
+    return result
+
+def _apply_contributions(conn, table, deltas, adding):
+    """Suma los deltas a las filas materializadas (upsert); en altas el primer id es el mínimo"""
+    keys = AGGREGATES[table]
+    if deltas.empty:
+        return
+    columns = keys + SUM_COLS.get(table, []) + ['countries', 'first_id']
+    updates = [f"{col} = {col} + excluded.{col}" for col in SUM_COLS.get(table, []) + ['countries']]
+    if adding:
+        updates.append("first_id = MIN(first_id, excluded.first_id)")
+    conflict = ", ".join(keys) or "id"
+    values = deltas[columns].astype(object).where(deltas[columns].notna(), None).values.tolist()
+    if not keys:
+        columns, values = ['id'] + columns, [[1] + row for row in values]
+    conn.executemany(f"""
+    INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+    ON CONFLICT({conflict}) DO UPDATE SET {', '.join(updates)}
+    """, values)
+
+def _refresh_first_ids(conn, table, removed_keys):
+    """Tras una baja, el primer id de los grupos afectados se recalcula con el índice del grupo"""
+    keys = AGGREGATES[table]
+    condition = " AND ".join(f"{key} = ?" for key in keys) or "1"
+    params = [tuple(key) for key in removed_keys[keys].itertuples(index=False)] if keys else [()]
+    conn.executemany(f"""
+    UPDATE {table} SET first_id = (SELECT MIN({ORDER_COL}) FROM {BASE_TABLE} WHERE {condition})
+    WHERE {condition}
+    """, [param + param for param in params])
+
+def _fetch_by_hash(conn, columns, hashes, counts):
+    """Filas almacenadas con esas huellas, tantas como indica counts"""
+    selected = ", ".join(f'"{col}"' for col in columns)
+    frames = []
+    for value, count in zip(hashes.tolist(), counts.tolist()):
+        rows = conn.execute(f"SELECT {selected} FROM {BASE_TABLE} WHERE row_hash = ? LIMIT ?", (value, count))
+        frames.extend(rows.fetchall())
+    return pd.DataFrame(frames, columns=columns)
+
+def _multiset_difference(a, b):
+    """Huellas de a que no están en b, respetando repeticiones: (valores, cantidades)"""
+    a_values, a_counts = np.unique(a, return_counts=True)
+    b_values, b_counts = np.unique(b, return_counts=True)
+    position = np.searchsorted(b_values, a_values)
+    position = np.clip(position, 0, max(len(b_values) - 1, 0))
+    matched = np.zeros(len(a_values), dtype=np.int64)
+    if len(b_values):
+        found = b_values[position] == a_values
+        matched[found] = b_counts[position[found]]
+    remaining = a_counts - np.minimum(a_counts, matched)
+    keep = remaining > 0
+    return a_values[keep], remaining[keep]
+
+def materialize(df, db_path=None):
+    """Guarda el dataset enriquecido y mantiene los agregados aplicando solo las filas que cambiaron.
+
+    Devuelve las filas agregadas y eliminadas y si la tabla se reconstruyó.
+    """
+    if ORDER_COL not in df.columns:
+        print(f"  - Sin columna '{ORDER_COL}': no se materializan los agregados")
+        return None
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path or ENRICHED_DB_PATH, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        stored = _stored_columns(conn)
+        rebuilt = stored != list(df.columns) + ['row_hash']
+        if rebuilt:
+            # Primera ejecución o columnas distintas: se reconstruye desde cero
+            drop_tables(conn)
+            create_tables(conn, df)
+
+        new_hashes = row_hashes(df)
+        old_hashes = np.array([row[0] for row in conn.execute(f"SELECT row_hash FROM {BASE_TABLE}")],
+                              dtype=np.int64)
+        added_values, added_counts = _multiset_difference(new_hashes, old_hashes)
+        removed_values, removed_counts = _multiset_difference(old_hashes, new_hashes)
+
+        # 1. Filas que salen: se leen antes de borrarlas para restar su aporte
+        removed = _fetch_by_hash(conn, list(df.columns), removed_values, removed_counts)
+        conn.executemany(f"""
+        DELETE FROM {BASE_TABLE} WHERE rowid IN (SELECT rowid FROM {BASE_TABLE} WHERE row_hash = ? LIMIT ?)
+        """, list(zip(removed_values.tolist(), removed_counts.tolist())))
+
+        # 2. Filas que entran (con repeticiones, una por aparición en el dataset)
+        added_mask = np.zeros(len(df), dtype=bool)
+        if len(added_values):
+            remaining = dict(zip(added_values.tolist(), added_counts.tolist()))
+            for i, value in enumerate(new_hashes.tolist()):
+                if remaining.get(value, 0) > 0:
+                    remaining[value] -= 1
+                    added_mask[i] = True
+        added = df[added_mask]
+        rows = added.astype(object).where(added.notna(), None)
+        quoted = ", ".join(f'"{col}"' for col in list(df.columns) + ['row_hash'])
+        conn.executemany(
+            f"INSERT INTO {BASE_TABLE} ({quoted}) VALUES ({', '.join('?' * (len(df.columns) + 1))})",
+            [values + [hash_value] for values, hash_value in zip(rows.values.tolist(), new_hashes[added_mask].tolist())])
+
+        # 3. Agregados: restar las bajas, sumar las altas, recalcular el primer id donde hubo bajas
+        for table, deltas in _contributions(removed, -1).items():
+            _apply_contributions(conn, table, deltas, adding=False)
+            conn.execute(f"DELETE FROM {table} WHERE countries <= 0")
+            if not deltas.empty:
+                _refresh_first_ids(conn, table, deltas)
+        for table, deltas in _contributions(added, 1).items():
+            _apply_contributions(conn, table, deltas, adding=True)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    stats = {'added': len(added), 'removed': len(removed), 'rebuilt': rebuilt,
+             'seconds': time.perf_counter() - start}
+    print(f"  - Agregados materializados en {stats['seconds']:.2f}s: {stats['added']} filas nuevas o modificadas, "
+          f"{stats['removed']} filas salientes" + (" (tablas reconstruidas)" if rebuilt else ""))
+    return stats
+
+# Consultas sobre los agregados, con el mismo resultado que los cálculos sobre el DataFrame
+def region_language_families(db_path=None):
+    """Igual que metricas.region_language_families, leído de las tablas materializadas"""
+    conn = sqlite3.connect(db_path or ENRICHED_DB_PATH)
+    try:
+        result = {region: {} for region, in conn.execute(
+            "SELECT region FROM agg_region_totals ORDER BY first_id")}
+        for region, family, count in conn.execute(
+                "SELECT region, language_family, countries FROM agg_region_language_family "
+                "ORDER BY countries DESC, first_id"):
+            result.setdefault(region, {})[family] = count
+    finally:
+        conn.close()
+    return result
+
+def report_values(db_path=None):
+    """Conteos por diversidad, promedio de idiomas y país con más idiomas para el reporte"""
+    conn = sqlite3.connect(db_path or ENRICHED_DB_PATH)
+    try:
+        diversity_counts = dict(conn.execute(
+            "SELECT linguistic_diversity, countries FROM agg_linguistic_diversity ORDER BY countries DESC, first_id"))
+        totals = conn.execute("SELECT countries, language_count FROM agg_dataset_totals").fetchone()
+        most_diverse = conn.execute(
+            f"SELECT name_common, language_count FROM {BASE_TABLE} WHERE language_count > 0 "
+            f"ORDER BY language_count DESC, {ORDER_COL} LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    return {
+        'diversity_counts': diversity_counts,
+        'avg_languages': totals[1] / totals[0] if totals and totals[0] else float('nan'),
+        'most_diverse': most_diverse,
+    }
+
+def benchmark(n_rows=200_000, changed=0.01, seed=0):
+    """Carga inicial y actualización con una fracción de filas modificadas, sobre datos sintéticos"""
+    import os
+    import tempfile
+    from . import metricas
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'id': np.arange(n_rows),
+        'cca3': [f"S{i:08d}" for i in range(n_rows)],
+        'name_common': [f"Country {i}" for i in range(n_rows)],
+        'region': rng.choice(["Africa", "Americas", "Asia", "Europe", "Oceania"], n_rows),
+        'population': rng.integers(1_000, 100_000_000, n_rows),
+        'area': rng.uniform(10, 1_000_000, n_rows).round(1),
+        'language_family': rng.choice(["Indo-European", "Afro-Asiatic", "Niger-Congo", None], n_rows),
+        'language_count': rng.integers(0, 12, n_rows),
+    })
+    metricas.add_metrics(df, ['linguistic_diversity'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "enriched.db")
+        start = time.perf_counter()
+        materialize(df, path)
+        initial = time.perf_counter() - start
+
+        touched = rng.choice(n_rows, int(n_rows * changed), replace=False)
+        df.loc[touched, 'language_count'] = rng.integers(0, 12, len(touched))
+        metricas.add_metrics(df, ['linguistic_diversity'])
+        start = time.perf_counter()
+        materialize(df, path)
+        incremental = time.perf_counter() - start
+
+        start = time.perf_counter()
+        from_aggregates = region_language_families(path), report_values(path)
+        query = time.perf_counter() - start
+        start = time.perf_counter()
+        metricas.region_language_families(df), df['linguistic_diversity'].value_counts(), df['language_count'].mean()
+        scan = time.perf_counter() - start
+
+    print(f"{n_rows} filas: carga inicial {initial:.2f}s, actualización de {len(touched)} filas {incremental:.2f}s; "
+          f"consulta de agregados {query * 1000:.1f} ms vs recorrido del DataFrame {scan * 1000:.1f} ms")
+    return from_aggregates
+
+if __name__ == "__main__":
+    benchmark(int(float(sys.argv[1])) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,219 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import shutil
+import threading
+from datetime import datetime
+from . import instrumentacion
+from . import rutas
+
+# Configuración
+AUDIT_LOG_PATH = rutas.output("auditoria", "eventos", "audit.jsonl")  # Archivo activo; los rotados quedan al lado en .gz
+MAX_BYTES = 50 * 1024 * 1024  # Se rota al superar este tamaño
+ROTATE_DAILY = True  # Se rota también al cambiar el día
+BUFFER_EVENTS = 1_000  # Eventos por escritura
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+# Renderizadores de los reportes de texto: etapa -> (módulo, función que recibe los eventos de una ejecución)
+RENDERERS = {
+    'ingestion': ('ingestion', 'render_audit_report'),
+    'cleaning': ('simulacion_procesamiento', 'render_cleaning_report'),
+    'enrichment': ('enrichment', 'render_enrichment_report'),
+}
+
+_lock = threading.Lock()
+
+def record(stage, event, entity=None, **data):
+    """Evento de auditoría de la ejecución actual; entity es la clave del país cuando aplica"""
+    return {'run_id': instrumentacion.RUN_ID, 'ts': datetime.now().isoformat(), 'stage': stage,
+            'event': event, 'entity': entity, **data}
+
+def _default(value):
+    """Escalares de numpy y nulos de pandas a tipos JSON"""
+    # Solo llegan aquí valores de las etapas, que ya cargaron numpy y pandas: las consultas no los importan
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return str(value)
+
+def _edge_timestamps(path):
+    """Timestamps del primer y el último evento de un archivo activo, leyendo solo sus extremos"""
+    with open(path, 'rb') as f:
+        first = f.readline()
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        # Retrocede por bloques hasta encontrar el inicio de la última línea
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            if block.rstrip(b"\n").rfind(b"\n") >= 0 or position == 0:
+                break
+        f.seek(position)
+        last = f.read().rstrip(b"\n").rsplit(b"\n", 1)[-1]
+    stamp = lambda line: datetime.fromisoformat(json.loads(line)['ts']).strftime(TIMESTAMP_FORMAT)
+    return stamp(first), stamp(last)
+
+def _should_rotate(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    if os.path.getsize(path) >= MAX_BYTES:
+        return True
+    return ROTATE_DAILY and datetime.fromtimestamp(os.path.getmtime(path)).date() != datetime.now().date()
+
+def rotate(path=None):
+    """Comprime el archivo activo como audit-<primer evento>-<último evento>.jsonl.gz"""
+    path = path or AUDIT_LOG_PATH
+    first, last = _edge_timestamps(path)
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    target = f"{base}-{first}-{last}.jsonl.gz"
+    suffix = 1
+    while os.path.exists(target):
+        target = f"{base}-{first}-{last}-{suffix}.jsonl.gz"
+        suffix += 1
+    with open(path, 'rb') as source, gzip.open(target, 'wb') as compressed:
+        shutil.copyfileobj(source, compressed)
+    os.remove(path)
+    return target
+
+def _append(path, lines):
+    if _should_rotate(path):
+        rotate(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+def write(events, path=None):
+    """Agrega los eventos al log en bloques de BUFFER_EVENTS líneas; nunca reescribe eventos anteriores"""
+    path = path or AUDIT_LOG_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with _lock:
+        buffer = []
+        for item in events:
+            buffer.append(json.dumps(item, ensure_ascii=False, default=_default))
+            if len(buffer) >= BUFFER_EVENTS:
+                _append(path, buffer)
+                written += len(buffer)
+                buffer = []
+        if buffer:
+            _append(path, buffer)
+            written += len(buffer)
+    return written
+
+def segments(path=None, since=None, until=None):
+    """Archivos del log (rotados y activo) que pueden tener eventos entre since y until, en orden"""
+    path = path or AUDIT_LOG_PATH
+    base = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    rotated = []
+    for segment in glob.glob(f"{glob.escape(base)}-*.jsonl.gz"):
+        # El nombre lleva el rango de fechas (y un sufijo si se repite): los archivos fuera del rango no se abren
+        first, last, *suffix = os.path.basename(segment)[len(os.path.basename(base)) + 1:].split(".")[0].split("-")
+        if (since and last < _compact(since)) or (until and first > _compact(until)):
+            continue
+        rotated.append(((first, last, int(suffix[0]) if suffix else 0), segment))
+    selected = [segment for _, segment in sorted(rotated)]
+    if os.path.exists(path):
+        selected.append(path)
+    return selected
+
+def _compact(timestamp):
+    return datetime.fromisoformat(timestamp).strftime(TIMESTAMP_FORMAT)
+
+def query(stage=None, event=None, run_id=None, entity=None, since=None, until=None, path=None):
+    """Recorre los eventos que cumplen los filtros sin cargar el log completo en memoria"""
+    # Filtro previo por subcadena: solo se decodifican las líneas que pueden coincidir
+    needles = [json.dumps(value, ensure_ascii=False) for value in (run_id, entity, event) if value is not None]
+    for segment in segments(path, since, until):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not all(needle in line for needle in needles):
+                    continue
+                item = json.loads(line)
+                if ((stage is None or item['stage'] == stage) and (event is None or item['event'] == event)
+                        and (run_id is None or item['run_id'] == run_id)
+                        and (entity is None or item['entity'] == entity)
+                        and (since is None or item['ts'] >= since) and (until is None or item['ts'] <= until)):
+                    yield item
+
+def last_run_id(stage, path=None):
+    """Última ejecución registrada de una etapa"""
+    run_id = None
+    for item in query(stage=stage, event='run', path=path):
+        run_id = item['run_id']
+    return run_id
+
+def render(stage, run_id=None, path=None):
+    """Texto del reporte de una etapa, reconstruido a partir de los eventos de una ejecución"""
+    import importlib
+
+    run_id = run_id or last_run_id(stage, path)
+    if run_id is None:
+        return None
+    events = list(query(stage=stage, run_id=run_id, path=path))
+    # Si la etapa corrió varias veces en el mismo proceso, vale la última: cada reporte empieza con 'run'
+    starts = [i for i, item in enumerate(events) if item['event'] == 'run']
+    module, function = RENDERERS[stage]
+    return getattr(importlib.import_module(f".{module}", __package__), function)(events[starts[-1]:] if starts else events)
+
+def write_report(events, renderer, report_path):
+    """Persiste los eventos y escribe el reporte de texto renderizado de una sola vez"""
+    write(events)
+    text = renderer(events)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return text
+
+def stream_report(events, render_lines, report_path):
+    """Como write_report en una sola pasada: render_lines recibe los eventos a medida que se registran
+    y devuelve las líneas del reporte, así que ni los eventos ni el texto se reúnen en memoria"""
+    def logged():
+        buffer = []
+        for item in events:
+            buffer.append(item)
+            if len(buffer) >= BUFFER_EVENTS:
+                write(buffer)
+                buffer = []
+            yield item
+        if buffer:
+            write(buffer)
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        for line in render_lines(logged()):
+            f.write(line + "\n")
+
+def by_event(events):
+    """Eventos agrupados por nombre, en orden de aparición"""
+    grouped = {}
+    for item in events:
+        grouped.setdefault(item['event'], []).append(item)
+    return grouped
+
+def report_timestamp(item):
+    return datetime.fromisoformat(item['ts']).strftime('%Y-%m-%d %H:%M:%S')
+
+def cli(args):
+    """<etapa> [run_id]: reporte de una ejecución pasada; query campo=valor ...: eventos en JSON lines"""
+    if args and args[0] == "query":
+        filters = dict(argument.split("=", 1) for argument in args[1:])
+        for item in query(**filters):
+            print(json.dumps(item, ensure_ascii=False))
+    else:
+        text = render(args[0] if args else 'ingestion', args[1] if len(args) > 1 else None)
+        if text is None:
+            print("No hay eventos registrados para esa etapa.")
+        else:
+            # Igual que el archivo del reporte: sin una línea en blanco extra si ya termina en salto de línea
+            print(text, end="" if text.endswith("\n") else "\n")
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.auditoria <etapa> [run_id]: reporte de una ejecución pasada
+    # python -m pipeline_paises.auditoria query campo=valor ...: eventos en JSON lines
+    cli(sys.argv[1:])
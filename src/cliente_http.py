@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+from . import rutas
+
+# Configuración
+CACHE_DIR = rutas.output("cache", "http")
+CACHE_TTL = 6 * 60 * 60  # Segundos en los que una respuesta se sirve sin revalidar
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Tamaño máximo de la caché en disco
+TIMEOUT = (10, 120)  # (conexión, lectura) en segundos
+POOL_SIZE = 10
+CHUNK_SIZE = 64 * 1024
+
+# Solo se anuncia brotli si hay un decodificador instalado
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+# requests.Session no es segura entre hilos: cada hilo (p. ej. las descargas concurrentes) usa la suya
+_local = threading.local()
+_stats = {'requests': 0, 'hits': 0, 'revalidated': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def get_session():
+    """Devuelve la sesión HTTP del hilo actual con conexiones persistentes"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Connection": "keep-alive",
+        })
+    return session
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def cache_stats():
+    """Devuelve los contadores de la caché y la tasa de aciertos"""
+    with _stats_lock:
+        stats = dict(_stats)
+    served = stats['hits'] + stats['revalidated']
+    stats['hit_ratio'] = served / stats['requests'] if stats['requests'] else 0.0
+    return stats
+
+def reset_cache_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.body"), os.path.join(CACHE_DIR, f"{key}.json")
+
+def _read_metadata(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_metadata(meta_path, metadata):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, meta_path)
+
+def _iter_file(path, chunk_size):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def _store_while_streaming(response, url, body_path, meta_path, chunk_size):
+    """Reenvía el cuerpo por fragmentos mientras lo guarda en la caché"""
+    tmp_path = body_path + ".tmp"
+    size = 0
+    try:
+        with response, open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+                yield chunk
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, body_path)
+    now = time.time()
+    _write_metadata(meta_path, {
+        'url': url,
+        'etag': response.headers.get("ETag"),
+        'last_modified': response.headers.get("Last-Modified"),
+        'stored_at': now,
+        'accessed_at': now,
+        'size': size,
+    })
+    evict_cache()
+
+def evict_cache(max_bytes=None):
+    """Elimina las respuestas menos usadas hasta que la caché quepa en el límite"""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".json"):
+            meta_path = os.path.join(CACHE_DIR, name)
+            metadata = _read_metadata(meta_path) or {}
+            entries.append((metadata.get('accessed_at', 0), metadata.get('size', 0), meta_path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, meta_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for path in (meta_path, meta_path[:-len(".json")] + ".body"):
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+def fetch(url, params=None, ttl=None, chunk_size=CHUNK_SIZE):
+    """Devuelve un iterador con el cuerpo de la respuesta, usando la caché en disco si es posible"""
+    ttl = CACHE_TTL if ttl is None else ttl
+    full_url = f"{url}?{urlencode(params)}" if params else url
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    body_path, meta_path = _cache_paths(full_url)
+    metadata = _read_metadata(meta_path) if os.path.exists(body_path) else None
+    _count('requests')
+
+    # 1. Respuesta fresca: no se consulta la red
+    if metadata and time.time() - metadata['stored_at'] < ttl:
+        _count('hits')
+        metadata['accessed_at'] = time.time()
+        _write_metadata(meta_path, metadata)
+        return _iter_file(body_path, chunk_size)
+
+    # 2. Solicitud condicional si hay una copia vencida
+    headers = {}
+    if metadata:
+        if metadata.get('etag'):
+            headers["If-None-Match"] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers["If-Modified-Since"] = metadata['last_modified']
+
+    response = get_session().get(full_url, headers=headers, stream=True, timeout=TIMEOUT)
+    if response.status_code == 304 and metadata:
+        response.close()
+        _count('revalidated')
+        metadata['stored_at'] = metadata['accessed_at'] = time.time()
+        _write_metadata(meta_path, metadata)
+        return _iter_file(body_path, chunk_size)
+
+    if response.status_code != 200:
+        response.close()
+        response.raise_for_status()
+        raise requests.HTTPError(f"Respuesta inesperada: {response.status_code}", response=response)
+
+    _count('misses')
+    return _store_while_streaming(response, full_url, body_path, meta_path, chunk_size)
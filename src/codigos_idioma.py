@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import csv
+import sqlite3
+import hashlib
+import unicodedata
+from . import rutas
+
+# Configuración
+CROSSWALK_PATH = rutas.dataset("iso639_crosswalk.csv")  # ISO 639-3 con sus códigos 639-1 y 639-2 y nombre
+INDEX_DB_PATH = rutas.output("db", "language_codes.db")
+# Alias que se indexan: códigos de cada parte del estándar y nombres normalizados
+CODE_COLUMNS = ['iso639_3', 'iso639_2b', 'iso639_2t', 'iso639_1']
+
+_index = None
+
+def normalize_name(name):
+    """Nombre en minúsculas, sin acentos ni signos: 'Yue (Cantonese)' -> 'yue cantonese'"""
+    if not isinstance(name, str):
+        return None
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r"[^a-z0-9]+", " ", ascii_name.lower()).strip() or None
+
+def _name_aliases(name):
+    """El nombre completo, la parte anterior a una aclaración entre paréntesis y el nombre
+    invertido sin coma ('Chinese, Yue' -> 'yue chinese')"""
+    if not isinstance(name, str):
+        return []
+    aliases = [normalize_name(name)]
+    if "(" in name:
+        aliases.append(normalize_name(name.split("(", 1)[0]))
+    if name.count(",") == 1:
+        head, tail = name.split(",")
+        aliases.append(normalize_name(f"{tail} {head}"))
+    return [alias for alias in aliases if alias]
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def build_index(crosswalk_path=None, db_path=None):
+    """Tabla language_codes (alias -> código ISO 639-3) indexada por alias, a partir del crosswalk"""
+    crosswalk_path = crosswalk_path or CROSSWALK_PATH
+    db_path = db_path or INDEX_DB_PATH
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    codes = {}
+    names = {}
+    with open(crosswalk_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for col in CODE_COLUMNS:
+                if row[col]:
+                    codes.setdefault(row[col], (row['iso639_3'], col))
+            for alias in _name_aliases(row['name']):
+                # Un nombre repetido en varias entradas queda con la primera (orden del estándar)
+                names.setdefault(alias, (row['iso639_3'], 'name'))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS language_codes")
+        conn.execute("DROP TABLE IF EXISTS language_codes_meta")
+        # Códigos y nombres en espacios separados (kind): 'ga' código no es 'ga' nombre
+        conn.execute("""
+        CREATE TABLE language_codes (
+            alias TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            iso639_3 TEXT NOT NULL,
+            PRIMARY KEY (kind, alias)
+        ) WITHOUT ROWID""")
+        conn.executemany("INSERT INTO language_codes VALUES (?, 'code', ?)",
+                         [(alias, code) for alias, (code, _) in codes.items()])
+        conn.executemany("INSERT INTO language_codes VALUES (?, 'name', ?)",
+                         [(alias, code) for alias, (code, _) in names.items()])
+        conn.execute("CREATE TABLE language_codes_meta (source_sha256 TEXT NOT NULL)")
+        conn.execute("INSERT INTO language_codes_meta VALUES (?)", (_digest(crosswalk_path),))
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"  - Índice de códigos de idioma: {len(codes)} códigos y {len(names)} nombres en {db_path}")
+
+def _stored_digest(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT source_sha256 FROM language_codes_meta").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+def load_index(crosswalk_path=None, db_path=None):
+    """Diccionarios código -> ISO 639-3 y nombre normalizado -> ISO 639-3.
+
+    El índice persistido se reconstruye solo si el crosswalk cambió; en el proceso se carga una vez.
+    """
+    global _index
+    if _index is not None and crosswalk_path is None and db_path is None:
+        return _index
+    crosswalk_path = crosswalk_path or CROSSWALK_PATH
+    db_path = db_path or INDEX_DB_PATH
+    if not os.path.exists(db_path) or _stored_digest(db_path) != _digest(crosswalk_path):
+        build_index(crosswalk_path, db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        index = {'code': {}, 'name': {}}
+        for alias, kind, code in conn.execute("SELECT alias, kind, iso639_3 FROM language_codes"):
+            index[kind][alias] = code
+    finally:
+        conn.close()
+    if crosswalk_path == CROSSWALK_PATH and db_path == INDEX_DB_PATH:
+        _index = index
+    return index
+
+def canonical_codes(codes, names=None, index=None):
+    """Código ISO 639-3 de cada par (código, nombre): primero por código y, si no se reconoce, por nombre"""
+    index = index or load_index()
+    by_code, by_name = index['code'], index['name']
+    names = names if names is not None else [None] * len(codes)
+    resolved = {}  # Los pares distintos son pocos: cada uno se resuelve una sola vez
+    result = []
+    for pair in zip(codes, names):
+        if pair not in resolved:
+            code, name = pair
+            canonical = by_code.get(code.lower()) if isinstance(code, str) else None
+            if canonical is None:
+                canonical = next((by_name[alias] for alias in _name_aliases(name) if alias in by_name), None)
+            resolved[pair] = canonical
+        result.append(resolved[pair])
+    return result
+
+def build_crosswalk(xml_dir="/usr/share/xml/iso-codes", output_path=None):
+    """Regenera el crosswalk desde los XML del paquete iso-codes (iso_639-3.xml e iso_639-2.xml)"""
+    import xml.etree.ElementTree as ET
+
+    output_path = output_path or CROSSWALK_PATH
+    part2 = {entry.get('iso_639_2T_code') for entry in ET.parse(os.path.join(xml_dir, "iso_639-2.xml")).getroot()}
+    rows = []
+    for entry in ET.parse(os.path.join(xml_dir, "iso_639-3.xml")).getroot():
+        code = entry.get('id')
+        in_part2 = code in part2
+        rows.append({
+            'iso639_3': code,
+            'iso639_2b': entry.get('part2_code') or (code if in_part2 else ""),
+            'iso639_2t': code if in_part2 else "",
+            'iso639_1': entry.get('part1_code') or "",
+            'name': entry.get('name'),
+        })
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CODE_COLUMNS + ['name'])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Crosswalk ISO 639 con {len(rows)} idiomas escrito en {output_path}")
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.codigos_idioma [directorio de iso-codes]: regenera el crosswalk y el índice
+    build_crosswalk(*sys.argv[1:2])
+    build_index()
@@ -0,0 +1,100 @@
+import sys
+import time
+import importlib
+import subprocess
+import statistics
+
+# Configuración
+# Subcomando -> (módulo, descripción). El módulo se importa solo al ejecutar su subcomando,
+# así cada etapa carga únicamente sus dependencias (requests solo en la ingesta, openpyxl solo al exportar).
+COMMANDS = {
+    'ingestion': ('ingestion', "Ingesta desde la API [delta|full]"),
+    'cleaning': ('simulacion_procesamiento', "Limpieza [memory|chunked|parallel|sql]"),
+    'enrichment': ('enrichment', "Enriquecimiento [serial|parallel]"),
+    'run': ('orquestador', "Pipeline completo, omitiendo etapas vigentes [etapa ...] [--force etapa,...|all]"),
+    'audit': ('auditoria', "Reporte desde el log de auditoría <etapa> [run_id] | query campo=valor ..."),
+    'metrics': ('instrumentacion', "Spans de una ejecución [run_id]"),
+    'startup': (None, "Tiempo de arranque en frío de cada subcomando [repeticiones]"),
+}
+STARTUP_REPEATS = 5  # Intérpretes nuevos por medición; se informa la mediana
+BASE_DIR_OPTION = "--base-dir"  # Directorio de las salidas; por defecto rutas.BASE_DIR (PIPELINE_BASE_DIR o static/ del paquete)
+
+def _run_stage(module, args):
+    module.main(args[0] if args else None)
+    return 0
+
+def _run_pipeline(module, args):
+    return 0 if module.main(*module.parse_args(args)) else 1
+
+def _run_audit(module, args):
+    module.cli(args)
+    return 0
+
+def _run_metrics(module, args):
+    module.summarize(args[0] if args else None)
+    return 0
+
+HANDLERS = {
+    'ingestion': _run_stage,
+    'cleaning': _run_stage,
+    'enrichment': _run_stage,
+    'run': _run_pipeline,
+    'audit': _run_audit,
+    'metrics': _run_metrics,
+}
+
+def usage():
+    lines = [f"Uso: pipeline [{BASE_DIR_OPTION} DIR] <subcomando> [argumentos]", ""]
+    lines += [f"  {name:<11} {description}" for name, (_, description) in COMMANDS.items()]
+    return "\n".join(lines)
+
+def _cold_import_seconds(module):
+    """Segundos de importación de un módulo y del proceso completo, en un intérprete nuevo"""
+    code = ("import time; start = time.perf_counter(); "
+            f"import {__package__}.{module}; print(time.perf_counter() - start)" if module else "print(0.0)")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip()), time.perf_counter() - start
+
+def measure_startup(repeats=STARTUP_REPEATS):
+    """Mediana del tiempo de importación y del proceso completo de cada subcomando, en intérpretes nuevos"""
+    # Los subprocesos importan el paquete instalado y heredan el directorio base de esta ejecución
+    modules = {'(intérprete)': None}
+    modules.update({name: module for name, (module, _) in COMMANDS.items() if module})
+    results = {}
+    for name, module in modules.items():
+        runs = [_cold_import_seconds(module) for _ in range(repeats)]
+        results[name] = {'import_seconds': statistics.median(run[0] for run in runs),
+                         'process_seconds': statistics.median(run[1] for run in runs)}
+
+    print(f"Arranque en frío (mediana de {repeats} intérpretes nuevos):")
+    for name, result in results.items():
+        print(f"  - {name:<13} importación {result['import_seconds']:.3f}s, "
+              f"proceso completo {result['process_seconds']:.3f}s")
+    return results
+
+def main(argv=None):
+    """Punto de entrada de la consola: pipeline <subcomando> [argumentos]"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == [BASE_DIR_OPTION] and len(argv) > 1:
+        # Antes de importar cualquier etapa: cada una fija sus rutas al importarse
+        from . import rutas
+        rutas.set_base_dir(argv[1])
+        argv = argv[2:]
+    if not argv or argv[0] not in COMMANDS:
+        print(usage())
+        return 0 if not argv or argv[0] in ("-h", "--help") else 2
+    command, args = argv[0], argv[1:]
+    if command == 'startup':
+        measure_startup(int(args[0]) if args else STARTUP_REPEATS)
+        return 0
+
+    # El tiempo de importación del subcomando queda en metrics.jsonl como span propio
+    from . import instrumentacion
+    with instrumentacion.span(f"cli.import.{command}", module=COMMANDS[command][0]):
+        module = importlib.import_module(f".{COMMANDS[command][0]}", __package__)
+    return HANDLERS[command](module, args)
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.comandos <subcomando> [argumentos]: igual que el comando instalado pipeline
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import sys
+import time
+import queue
+import random
+import asyncio
+import threading
+from . import cliente_http
+from . import ingestion
+
+# Configuración
+SPLIT_BY = "regions"  # "regions": un endpoint por región; "fields": grupos de campos; "both": combinación
+REGIONS = ["africa", "americas", "asia", "europe", "oceania", "antarctic"]
+# Cada grupo incluye cca3 para unir las partes (la API admite pocos campos por solicitud)
+FIELD_GROUPS = [
+    "cca3,name,region,subregion,population,area",
+    "cca3,languages,capital,timezones,currencies,flags",
+]
+MAX_CONCURRENCY = 4  # Descargas simultáneas
+RETRIES = 3  # Reintentos por parte antes de darla por perdida
+BACKOFF_BASE = 0.5  # Segundos; la espera se duplica en cada reintento, con variación aleatoria
+QUEUE_SIZE = 10_000  # Países en tránsito entre las descargas y el cargador
+# Bytes comprimidos leídos por iteración: con bloques chicos los primeros países llegan antes
+CHUNK_SIZE = 4 * 1024
+
+_DONE = object()
+
+def plan_parts(split_by=SPLIT_BY, base_url=None):
+    """Lista de partes a descargar: URL, campos pedidos y grupo de campos al que aportan"""
+    base_url = base_url or ingestion.BASE_URL
+    root = base_url.rsplit("/", 1)[0]
+    urls = [f"{root}/region/{region}" for region in REGIONS] if split_by in ("regions", "both") else [base_url]
+    groups = FIELD_GROUPS if split_by in ("fields", "both") else [ingestion.API_FIELDS]
+    return [{'name': f"{url.rsplit('/', 1)[-1]}[{index}]", 'url': url, 'fields': fields, 'group': index}
+            for url in urls for index, fields in enumerate(groups)]
+
+def _put(output, item, cancelled):
+    """Encola sin bloquear indefinidamente si el cargador dejó de consumir"""
+    while not cancelled.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _download(part, output, cancelled):
+    """Descarga una parte en un hilo y pasa cada país a la cola a medida que se parsea"""
+    chunks = cliente_http.fetch(part['url'], params={'fields': part['fields']}, chunk_size=CHUNK_SIZE)
+    for country in ingestion.iter_json_array(chunks):
+        if not _put(output, (part['group'], country), cancelled):
+            return
+
+async def _fetch_part(part, semaphore, output, cancelled, stats, lock, completed):
+    """Descarga una parte con reintentos y espera exponencial; un fallo no detiene las demás"""
+    async with semaphore:
+        for attempt in range(RETRIES + 1):
+            try:
+                await asyncio.to_thread(_download, part, output, cancelled)
+                with lock:
+                    completed.add(part['name'])
+                return True
+            except Exception as e:  # Red, JSON inválido o cualquier otro error: la parte queda incompleta
+                if cancelled.is_set():
+                    return False
+                if attempt == RETRIES:
+                    print(f"  - Parte {part['name']} descartada tras {RETRIES + 1} intentos: {e}")
+                    return False
+                delay = BACKOFF_BASE * 2 ** attempt + random.uniform(0, BACKOFF_BASE)
+                print(f"  - Parte {part['name']} falló ({e}); reintento en {delay:.1f}s")
+                with lock:
+                    stats['retries'] += 1
+                await asyncio.sleep(delay)
+
+async def _fetch_all(parts, output, cancelled, stats, lock, completed, max_concurrency):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    await asyncio.gather(*(_fetch_part(part, semaphore, output, cancelled, stats, lock, completed)
+                           for part in parts))
+
+def _run_loop(parts, output, cancelled, stats, lock, max_concurrency):
+    completed = set()
+    try:
+        asyncio.run(_fetch_all(parts, output, cancelled, stats, lock, completed, max_concurrency))
+    except Exception as e:
+        print(f"  - Descarga concurrente interrumpida: {e}")
+    finally:
+        # Toda parte que no terminó cuenta como perdida, así el cargador no da de baja países
+        with lock:
+            stats['failed'].extend(part['name'] for part in parts if part['name'] not in completed)
+        _put(output, _DONE, cancelled)
+
+def iter_countries(parts=None, stats=None, max_concurrency=MAX_CONCURRENCY):
+    """Descarga las partes en paralelo y produce cada país en cuanto tiene todos sus grupos de campos.
+
+    stats (opcional) se completa con partes, reintentos, partes perdidas y países incompletos;
+    si alguna parte se pierde, el cargador no debe dar de baja los países ausentes.
+    """
+    parts = parts or plan_parts()
+    stats = stats if stats is not None else {}
+    stats.update({'parts': len(parts), 'retries': 0, 'failed': [], 'countries': 0,
+                  'incomplete': 0, 'first_country_seconds': None})
+    n_groups = len({part['group'] for part in parts})
+    output = queue.Queue(maxsize=QUEUE_SIZE)
+    cancelled = threading.Event()
+    lock = threading.Lock()  # stats lo actualizan el bucle de descargas y sus hilos
+    start = time.perf_counter()
+
+    # El bucle asyncio corre en su propio hilo; el cargador consume la cola de forma síncrona
+    thread = threading.Thread(target=_run_loop, args=(parts, output, cancelled, stats, lock, max_concurrency),
+                              daemon=True)
+    thread.start()
+
+    # Unión por cca3: un país se entrega cuando llegaron todos sus grupos de campos
+    pending = {}
+    delivered = set()
+    try:
+        while True:
+            item = output.get()
+            if item is _DONE:
+                break
+            group, country = item
+            cca3 = country.get('cca3')
+            if cca3 in delivered:
+                continue  # Repetido por un reintento tras un fallo a mitad de la descarga
+            groups, merged = pending.setdefault(cca3, (set(), {}))
+            groups.add(group)
+            merged.update(country)
+            if len(groups) == n_groups:
+                del pending[cca3]
+                delivered.add(cca3)
+                stats['countries'] += 1
+                if stats['first_country_seconds'] is None:
+                    stats['first_country_seconds'] = time.perf_counter() - start
+                yield merged
+    finally:
+        cancelled.set()
+        thread.join()
+
+    # Sin todos sus campos, un país sobrescribiría datos válidos con nulos: no se entrega
+    stats['incomplete'] = len(pending)
+    stats['seconds'] = time.perf_counter() - start
+    print(f"Descarga concurrente: {stats['countries']} países de {stats['parts']} partes en "
+          f"{stats['seconds']:.2f}s ({stats['retries']} reintentos, {len(stats['failed'])} partes perdidas, "
+          f"{stats['incomplete']} países incompletos)")
+
+def benchmark(n_records=2000, latency=0.3, record_delay=0.0005, fail_first=1):
+    """Compara la descarga única de /all con la concurrente contra el servidor local con latencia"""
+    import os
+    import tempfile
+    from . import servidor_local
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Descarga única de /all, sin fallos inyectados: un solo fallo la dejaría vacía
+        server, url = servidor_local.start_server(n_records, port=0, latency=latency, record_delay=record_delay)
+        cliente_http.CACHE_DIR = os.path.join(tmp, "cache_serial")
+        start = time.perf_counter()
+        first = None
+        count = 0
+        for _ in ingestion.stream_country_data(url):
+            first = first or time.perf_counter() - start
+            count += 1
+        results['serial'] = {'countries': count, 'seconds': time.perf_counter() - start,
+                             'first_country_seconds': first, 'retries': 0}
+        server.shutdown()
+
+        for split_by in ("regions", "fields"):
+            server, url = servidor_local.start_server(n_records, port=0, latency=latency,
+                                                      record_delay=record_delay, fail_first=fail_first)
+            cliente_http.CACHE_DIR = os.path.join(tmp, f"cache_{split_by}")
+            stats = {}
+            count = sum(1 for _ in iter_countries(plan_parts(split_by, url), stats))
+            results[split_by] = {'countries': count, 'seconds': stats['seconds'],
+                                 'first_country_seconds': stats['first_country_seconds'],
+                                 'retries': stats['retries']}
+            server.shutdown()
+
+    print(f"\nServidor local: {n_records} países, latencia {latency}s, {record_delay * 1000:.1f} ms por país, "
+          f"{fail_first} fallo(s) inicial(es) por ruta")
+    for name, result in results.items():
+        first = result['first_country_seconds']
+        print(f"  - {name:<8} {result['countries']} países en {result['seconds']:.2f}s "
+              f"(primer país a los {first if first is not None else float('nan'):.2f}s, "
+              f"{result['retries']} reintentos)")
+    return results
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
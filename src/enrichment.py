@@ -1,41 +1,57 @@
 import os
+import sys
 import sqlite3
 import pandas as pd
 import json
-import xml.etree.ElementTree as ET
-from datetime import datetime
-from bs4 import BeautifulSoup
-import csv
+from . import intercambio  # Formato columnar compartido con simulacion_procesamiento.py
+from . import metricas  # Métricas derivadas vectorizadas
+from . import paralelo  # Enriquecimiento en paralelo por particiones
+from . import esquema  # Tipos compactos: categorías, numéricos reducidos y texto en Arrow
+from . import instrumentacion  # Spans con tiempos, filas y memoria por paso
+from . import agregados  # Agregados materializados en SQLite, mantenidos de forma incremental
+from . import exportacion  # Excel por lotes y salidas escritas en paralelo
+from . import auditoria  # Log de auditoría estructurado; los reportes se renderizan de sus eventos
+from . import codigos_idioma  # Índice ISO 639 (639-1, 639-2, 639-3 y nombres) para unir idiomas
+from . import rutas  # Rutas de los datasets y de las salidas, independientes del directorio actual
 
 # Configuración de rutas
-DB_PATH = "src/static/db/ingestion.db"
-CLEANED_DATA_PATH = "src/static/xlsx/cleaned_data.xlsx"
-LANGUAGES_DATA_PATH = "src/Dataset2_Actividad3/languages_dataset.csv"
-ENRICHED_DATA_PATH = "src/static/xlsx/enriched_data.xlsx"
-ENRICHMENT_REPORT_PATH = "src/static/auditoria/enrichment_report.txt"
-
-# Asegurar directorios
-os.makedirs(os.path.dirname(ENRICHED_DATA_PATH), exist_ok=True)
-os.makedirs(os.path.dirname(ENRICHMENT_REPORT_PATH), exist_ok=True)
+DB_PATH = rutas.output("db", "ingestion.db")
+CLEANED_DATA_PATH = rutas.output("columnar", "cleaned_data.parquet")
+LANGUAGES_DATA_PATH = rutas.dataset("languages_dataset.csv")
+ENRICHED_DATA_PATH = rutas.output("columnar", "enriched_data.parquet")
+ENRICHED_EXCEL_PATH = rutas.output("xlsx", "enriched_data.xlsx")
+EXPORT_EXCEL = True  # Copia opcional en Excel del dataset enriquecido
+ENRICHMENT_MODE = "serial"  # "serial": un solo proceso; "parallel": particiones por cca3 en varios procesos
+WORKERS = paralelo.WORKERS
+ENRICHMENT_REPORT_PATH = rutas.output("auditoria", "enrichment_report.txt")
+MATERIALIZE_AGGREGATES = True  # El reporte lee familias, conteos y promedios de las tablas de agregados
 
 def check_cleaned_data_exists():
     """Verifica si los datos limpios existen o ejecuta el script de procesamiento"""
     if not os.path.exists(CLEANED_DATA_PATH):
         print(f"Los datos limpios no existen en {CLEANED_DATA_PATH}. Ejecutando simulacion_procesamiento.py...")
-        import simulacion_procesamiento
+        from . import simulacion_procesamiento
+        simulacion_procesamiento.main()
+        return True
+
+    # Regenerar si el archivo fue escrito con otra versión del esquema
+    version = intercambio.read_stage_metadata(CLEANED_DATA_PATH).get('schema_version')
+    if version != intercambio.SCHEMA_VERSION:
+        print(f"Los datos limpios usan la versión de esquema {version}. Ejecutando simulacion_procesamiento.py...")
+        from . import simulacion_procesamiento
         simulacion_procesamiento.main()
         return True
     
     print(f"Datos limpios encontrados en {CLEANED_DATA_PATH}")
     return False
 
-def load_cleaned_data():
-    """Carga los datos limpios desde el archivo Excel"""
+def load_cleaned_data(columns=None, span=None):
+    """Carga los datos limpios desde el archivo columnar con el esquema compacto, opcionalmente solo algunas columnas"""
     print("\n=== CARGANDO DATOS LIMPIOS ===")
     try:
-        cleaned_df = pd.read_excel(CLEANED_DATA_PATH)
+        cleaned_df = intercambio.read_stage_output(CLEANED_DATA_PATH, columns=columns)
         print(f"Datos cargados correctamente: {len(cleaned_df)} registros")
-        return cleaned_df
+        return esquema.load(cleaned_df, "enriquecimiento", span)
     except Exception as e:
         print(f"Error al cargar los datos limpios: {e}")
         return None
@@ -63,6 +79,10 @@ def load_languages_data():
         # Convertir códigos ISO a minúsculas para facilitar la unión
         languages_df['iso code'] = languages_df['iso code'].str.lower()
         
+        # Índice ISO 639 persistido: se construye aquí la primera vez, antes de que lo lean los workers
+        index = codigos_idioma.load_index()
+        print(f"  - Índice ISO 639 cargado: {len(index['code'])} códigos y {len(index['name'])} nombres")
+        
         return languages_df
     except Exception as e:
         print(f"Error al cargar los datos de idiomas: {e}")
@@ -103,6 +123,41 @@ def extract_country_languages(countries_df):
     print(f"Se extrajeron {len(country_languages_df)} relaciones país-idioma")
     return country_languages_df
 
+def build_language_lookup(languages_df):
+    """Construye la tabla de búsqueda código ISO 639-3 -> primer registro del dataset de idiomas.
+
+    El código del CSV (de dos o tres letras) se lleva a 639-3 con el índice; si no se reconoce, el nombre.
+    """
+    keys = codigos_idioma.canonical_codes(languages_df['iso code'].tolist(), languages_df['language'].tolist())
+    return (languages_df.assign(language_key=keys).dropna(subset=['language_key'])
+            .drop_duplicates(subset=['language_key'], keep='first')
+            .set_index('language_key')[['family', 'writing system']])
+
+def load_country_languages_from_db(countries_df):
+    """Obtiene la relación país-idioma desde la tabla normalizada country_languages"""
+    print("\n=== CARGANDO RELACIONES PAÍS-IDIOMA DESDE LA BASE DE DATOS ===")
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        relations = pd.read_sql_query("""
+        SELECT cca3, lower(iso_code) AS iso_code, language_name
+        FROM country_languages
+        ORDER BY cca3, position
+        """, conn)
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"  - No se pudo leer country_languages: {e}")
+        return None
+    finally:
+        conn.close()
+    
+    # Solo los países presentes en los datos limpios, con su nombre
+    names = countries_df.drop_duplicates(subset=['cca3'])[['cca3', 'name_common']]
+    names = names.rename(columns={'name_common': 'country_name'})
+    country_languages_df = relations.merge(names, on='cca3', how='inner')
+    country_languages_df = country_languages_df[['cca3', 'country_name', 'iso_code', 'language_name']]
+    
+    print(f"Se obtuvieron {len(country_languages_df)} relaciones país-idioma")
+    return country_languages_df
+
 def enrich_data(countries_df, country_languages_df, languages_df):
     """Enriquece los datos de países con información adicional de idiomas"""
     print("\n=== ENRIQUECIENDO DATOS ===")
@@ -110,222 +165,330 @@ def enrich_data(countries_df, country_languages_df, languages_df):
     # 1. Crear una copia del DataFrame original para no modificarlo
     enriched_df = countries_df.copy()
     
-    # 2. Agregar columnas para almacenar información enriquecida
-    enriched_df['primary_language'] = None
-    enriched_df['language_family'] = None
-    enriched_df['writing_system'] = None
-    enriched_df['language_count'] = 0
-    enriched_df['languages_list'] = ""
-    
     # Estadísticas para el reporte
     match_stats = {
         'countries_with_languages': 0,
         'countries_enriched': 0,
         'total_language_matches': 0,
+        'language_relations': 0,
+        'literal_language_matches': 0,
+        'countries_enriched_literal': 0,
         'countries_without_matches': []
     }
     
-    # 3. Para cada país, buscar coincidencias en los datos de idiomas
-    for i, country in enriched_df.iterrows():
-        # Obtener los idiomas asociados a este país
-        country_langs = country_languages_df[country_languages_df['cca3'] == country['cca3']]
-        
-        if not country_langs.empty:
-            match_stats['countries_with_languages'] += 1
-            language_matches = []
-            country_enriched = False
-            
-            # Almacenar la cantidad de idiomas
-            enriched_df.at[i, 'language_count'] = len(country_langs)
-            
-            # Crear lista de idiomas
-            langs_list = ', '.join(country_langs['language_name'].tolist())
-            enriched_df.at[i, 'languages_list'] = langs_list
-            
-            # Buscar coincidencias con el dataset de idiomas
-            for _, lang in country_langs.iterrows():
-                # Buscar por código ISO
-                lang_match = languages_df[languages_df['iso code'] == lang['iso_code']]
-                
-                if not lang_match.empty:
-                    language_matches.append(lang['language_name'])
-                    match_stats['total_language_matches'] += 1
-                    
-                    # Si es el primer match, usar como idioma principal
-                    if pd.isna(enriched_df.at[i, 'primary_language']):
-                        enriched_df.at[i, 'primary_language'] = lang['language_name']
-                        enriched_df.at[i, 'language_family'] = lang_match.iloc[0]['family']
-                        enriched_df.at[i, 'writing_system'] = lang_match.iloc[0]['writing system']
-                        country_enriched = True
-            
-            if country_enriched:
-                match_stats['countries_enriched'] += 1
-            else:
-                match_stats['countries_without_matches'].append(country['name_common'])
-    
-    # 4. Calcular estadísticas adicionales
+    # 2. Unir cada relación país-idioma con el dataset de idiomas por código ISO (hash join)
+    if country_languages_df.empty:
+        relations = pd.DataFrame(columns=['cca3', 'iso_code', 'language_name'])
+    else:
+        relations = country_languages_df[['cca3', 'iso_code', 'language_name']]
+    # Las claves de REST Countries son ISO 639-3 ('spa'); el índice las lleva al mismo código que el CSV
+    lookup = build_language_lookup(languages_df)
+    relations = relations.assign(language_key=codigos_idioma.canonical_codes(
+        relations['iso_code'].tolist(), relations['language_name'].tolist()))
+    relations = relations.join(lookup, on='language_key')
+    is_match = relations['language_key'].isin(lookup.index)
+    # Coincidencias comparando el código tal cual, sin el índice: para informar el cambio en el reporte
+    is_literal_match = relations['iso_code'].isin(set(languages_df['iso code'].dropna()))
+    
+    # 3. Agregaciones por país: cantidad de idiomas, lista y coincidencias
+    by_country = relations.groupby('cca3', sort=False)
+    language_count = by_country.size()
+    languages_list = by_country['language_name'].agg(', '.join)
+    matches_per_country = is_match.groupby(relations['cca3'], sort=False).sum()
+    literal_per_country = is_literal_match.groupby(relations['cca3'], sort=False).sum()
+    
+    # 4. El idioma principal es la primera relación con coincidencia de cada país
+    primary = (relations[is_match & relations['language_name'].notna()]
+               .drop_duplicates(subset=['cca3'], keep='first')
+               .set_index('cca3'))
+    
+    # 5. Asignar los resultados a cada fila de países
+    keys = enriched_df['cca3']
+    has_languages = keys.isin(language_count.index)
+    is_enriched = keys.isin(primary.index)
+    
+    enriched_df['primary_language'] = _map_or_none(keys, primary['language_name'])
+    enriched_df['language_family'] = _map_or_none(keys, primary['family'])
+    enriched_df['writing_system'] = _map_or_none(keys, primary['writing system'])
+    enriched_df['language_count'] = keys.map(language_count).fillna(0).astype('int64')
+    enriched_df['languages_list'] = keys.map(languages_list).fillna("")
+    
+    match_stats['countries_with_languages'] = int(has_languages.sum())
+    match_stats['countries_enriched'] = int(is_enriched.sum())
+    match_stats['total_language_matches'] = int(keys.map(matches_per_country).fillna(0).sum())
+    match_stats['language_relations'] = int(enriched_df['language_count'].sum())
+    match_stats['literal_language_matches'] = int(keys.map(literal_per_country).fillna(0).sum())
+    match_stats['countries_enriched_literal'] = int((keys.map(literal_per_country).fillna(0) > 0).sum())
+    match_stats['countries_without_matches'] = (
+        enriched_df.loc[has_languages & ~is_enriched, 'name_common'].tolist())
+    
+    # 6. Calcular estadísticas adicionales
     print(f"  - Países con información de idiomas: {match_stats['countries_with_languages']}")
     print(f"  - Países enriquecidos con datos adicionales: {match_stats['countries_enriched']}")
     print(f"  - Total de coincidencias de idiomas: {match_stats['total_language_matches']}")
     
     return enriched_df, match_stats
 
-def calculate_additional_metrics(enriched_df):
+def _map_or_none(keys, values):
+    """Mapea claves a valores dejando None (no NaN) donde no hay coincidencia"""
+    mapped = keys.map(values).astype(object)
+    return mapped.where(mapped.notna(), None)
+
+def calculate_additional_metrics(enriched_df, families=True):
     """Calcula métricas adicionales basadas en los datos enriquecidos"""
     print("\n=== CALCULANDO MÉTRICAS ADICIONALES ===")
     
     # Crear copia para no modificar el DataFrame original
     final_df = enriched_df.copy()
     
-    # 1. Calcular la densidad lingüística (idiomas por millón de habitantes )
-    final_df['language_density'] = final_df.apply(
-        lambda row: (row['language_count'] * 1000000 / row['population']) 
-        if row['population'] > 0 and row['language_count'] > 0 else 0, 
-        axis=1
-    )
-    
+    # 1. Calcular la densidad lingüística (idiomas por millón de habitantes)
     # 2. Clasificar países por diversidad lingüística
-    def classify_linguistic_diversity(row):
-        if row['language_count'] == 0:
-            return "No data"
-        elif row['language_count'] == 1:
-            return "Monolingual"
-        elif row['language_count'] <= 3:
-            return "Low diversity"
-        elif row['language_count'] <= 10:
-            return "Medium diversity"
-        else:
-            return "High diversity"
-    
-    final_df['linguistic_diversity'] = final_df.apply(classify_linguistic_diversity, axis=1)
+    metricas.add_metrics(final_df, ['language_density', 'linguistic_diversity'])
     
     # 3. Identificar familias lingüísticas principales por región
-    region_language_families = {}
-    for region in final_df['region'].unique():
-        if pd.isna(region):
-            continue
-            
-        region_df = final_df[final_df['region'] == region]
-        language_families = region_df['language_family'].value_counts().to_dict()
-        region_language_families[region] = language_families
+    # (con families=False se leen después de las tablas de agregados)
+    region_language_families = metricas.region_language_families(final_df) if families else None
     
     print("  - Calculada densidad lingüística por millón de habitantes")
     print("  - Clasificados países por diversidad lingüística")
-    print("  - Identificadas familias lingüísticas principales por región")
+    if families:
+        print("  - Identificadas familias lingüísticas principales por región")
     
     return final_df, region_language_families
 
-def generate_output_files(enriched_df, match_stats, region_language_families):
-    """Genera los archivos de salida: datos enriquecidos y reporte de auditoría"""
+def generate_output_files(enriched_df, match_stats, region_language_families, report_values=None, export_excel=None):
+    """Genera los archivos de salida: datos enriquecidos y reporte de auditoría.
+
+    report_values (opcional) son los valores de agregados.report_values; sin ellos se recorre el DataFrame.
+    """
     print("\n=== GENERANDO ARCHIVOS DE SALIDA ===")
+    export_excel = EXPORT_EXCEL if export_excel is None else export_excel
     
-    # 1. Exportar datos enriquecidos a Excel
+    # Las tres salidas son independientes y se escriben a la vez
+    # 1. Datos enriquecidos en formato columnar
     print(f"Exportando datos enriquecidos a {ENRICHED_DATA_PATH}...")
-    enriched_df.to_excel(ENRICHED_DATA_PATH, index=False)
+    outputs = [("enrichment.write_parquet", len(enriched_df),
+                lambda: intercambio.write_stage_output(enriched_df, ENRICHED_DATA_PATH, stage="enrichment"))]
+
+    if export_excel:
+        print(f"Exportando copia en Excel a {ENRICHED_EXCEL_PATH}...")
+        outputs.append(("enrichment.to_excel", len(enriched_df),
+                        lambda: exportacion.write_excel(enriched_df, ENRICHED_EXCEL_PATH)))
     
-    # 2. Generar reporte de auditoría
-    print(f"Generando reporte de auditoría en {ENRICHMENT_REPORT_PATH}...")
+    # 2. Reporte de auditoría
+    outputs.append(("enrichment.report", None,
+                    lambda: generate_enrichment_report(enriched_df, match_stats, region_language_families,
+                                                       report_values)))
+    exportacion.run_outputs(outputs)
     
-    with open(ENRICHMENT_REPORT_PATH, 'w', encoding='utf-8') as f:
-        f.write("INFORME DE AUDITORÍA DEL PROCESO DE ENRIQUECIMIENTO DE DATOS\n")
-        f.write("=========================================================\n\n")
-        f.write(f"Fecha y hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        # Resumen del proceso
-        f.write("1. RESUMEN DEL PROCESO DE ENRIQUECIMIENTO\n")
-        f.write("---------------------------------------\n")
-        f.write(f"Total de países en el dataset base: {len(enriched_df)}\n")
-        f.write(f"Países con información de idiomas: {match_stats['countries_with_languages']}\n")
-        f.write(f"Países enriquecidos con datos adicionales: {match_stats['countries_enriched']}\n")
-        f.write(f"Total de coincidencias de idiomas: {match_stats['total_language_matches']}\n\n")
-        
-        # Detalle de países sin coincidencias
-        f.write("2. PAÍSES SIN COINCIDENCIAS EN EL DATASET DE IDIOMAS\n")
-        f.write("------------------------------------------------\n")
-        if match_stats['countries_without_matches']:
-            for country in match_stats['countries_without_matches'][:20]:  # Limitar a 20 para no hacer el reporte demasiado largo
-                f.write(f"  - {country}\n")
-            
-            if len(match_stats['countries_without_matches']) > 20:
-                f.write(f"  ... y {len(match_stats['countries_without_matches']) - 20} países más\n")
-        else:
-            f.write("  No hay países sin coincidencias.\n")
-        f.write("\n")
-        
-        # Estadísticas sobre familias lingüísticas por región
-        f.write("3. FAMILIAS LINGÜÍSTICAS PRINCIPALES POR REGIÓN\n")
-        f.write("-------------------------------------------\n")
-        for region, families in region_language_families.items():
-            if not families:
-                continue
-                
-            f.write(f"\nRegión: {region}\n")
-            sorted_families = sorted(families.items(), key=lambda x: x[1], reverse=True)
-            
-            for i, (family, count) in enumerate(sorted_families):
-                if i >= 5:  # Limitar a las 5 familias más comunes
-                    break
-                if pd.notna(family):
-                    f.write(f"  - {family}: {count} países\n")
-        f.write("\n")
-        
-        # Métricas lingüísticas
-        f.write("4. MÉTRICAS LINGÜÍSTICAS DEL DATASET ENRIQUECIDO\n")
-        f.write("--------------------------------------------\n")
-        diversity_counts = enriched_df['linguistic_diversity'].value_counts().to_dict()
-        for diversity, count in diversity_counts.items():
-            f.write(f"  - {diversity}: {count} países\n")
-        
-        # Promedio de idiomas por país
-        avg_languages = enriched_df['language_count'].mean()
-        f.write(f"\nPromedio de idiomas por país: {avg_languages:.2f}\n")
-        
-        # País con mayor diversidad lingüística
+    print(f"Archivos generados exitosamente.")
+
+def generate_enrichment_report(enriched_df, match_stats, region_language_families, report_values=None):
+    """Escribe el reporte de auditoría del enriquecimiento"""
+    print(f"Generando reporte de auditoría en {ENRICHMENT_REPORT_PATH}...")
+    events = enrichment_events(enriched_df, match_stats, region_language_families, report_values)
+    auditoria.write_report(events, render_enrichment_report, ENRICHMENT_REPORT_PATH)
+
+def enrichment_events(enriched_df, match_stats, region_language_families, report_values=None):
+    """Eventos de auditoría del enriquecimiento: resumen, coincidencias por país y familias por región"""
+    if report_values is None:
+        report_values = {
+            'diversity_counts': enriched_df['linguistic_diversity'].value_counts().to_dict(),
+            'avg_languages': enriched_df['language_count'].mean(),
+            'most_diverse': None,
+        }
         if enriched_df['language_count'].max() > 0:
             most_diverse = enriched_df.loc[enriched_df['language_count'].idxmax()]
-            f.write(f"País con mayor diversidad lingüística: {most_diverse['name_common']} "
-                   f"({most_diverse['language_count']} idiomas)\n\n")
-        
-        # Muestra de los datos enriquecidos
-        f.write("5. MUESTRA DE DATOS ENRIQUECIDOS\n")
-        f.write("-----------------------------\n")
-        sample_columns = ['cca3', 'name_common', 'region', 'primary_language', 
-                         'language_family', 'language_count', 'linguistic_diversity']
-        f.write(enriched_df.head(5)[sample_columns].to_string())
-        
-    print(f"Archivos generados exitosamente.")
+            report_values['most_diverse'] = (most_diverse['name_common'], most_diverse['language_count'])
+
+    sample_columns = ['cca3', 'name_common', 'region', 'primary_language',
+                      'language_family', 'language_count', 'linguistic_diversity']
+    sample = enriched_df.head(5)[sample_columns].astype(object)
+    events = [auditoria.record(
+        'enrichment', 'run',
+        total_countries=len(enriched_df),
+        countries_with_languages=match_stats['countries_with_languages'],
+        countries_enriched=match_stats['countries_enriched'],
+        total_language_matches=match_stats['total_language_matches'],
+        language_relations=match_stats['language_relations'],
+        literal_language_matches=match_stats['literal_language_matches'],
+        countries_enriched_literal=match_stats['countries_enriched_literal'],
+        diversity_counts={str(diversity): count for diversity, count in report_values['diversity_counts'].items()},
+        avg_languages=report_values['avg_languages'],
+        most_diverse=report_values['most_diverse'],
+        sample={'index': sample.index.tolist(), 'columns': sample_columns,
+                'rows': sample.where(sample.notna(), None).values.tolist()},
+    )]
 
-def main():
+    # Coincidencia de cada país con el dataset de idiomas, en el orden del dataset
+    countries = enriched_df[['cca3', 'name_common', 'language_count', 'primary_language', 'language_family']]
+    for cca3, name, language_count, primary_language, language_family in (
+            countries.astype(object).where(countries.notna(), None).itertuples(index=False, name=None)):
+        events.append(auditoria.record('enrichment', 'country', cca3, name=name, language_count=language_count,
+                                       primary_language=primary_language, language_family=language_family))
+    for region, families in region_language_families.items():
+        events.append(auditoria.record('enrichment', 'region_families', region=region, families=families))
+    return events
+
+def render_enrichment_report(events):
+    """Texto del informe de enriquecimiento a partir de sus eventos"""
+    grouped = auditoria.by_event(events)
+    run = grouped['run'][0]
+    lines = [
+        "INFORME DE AUDITORÍA DEL PROCESO DE ENRIQUECIMIENTO DE DATOS",
+        "=========================================================",
+        "",
+        f"Fecha y hora: {auditoria.report_timestamp(run)}",
+        "",
+        # Resumen del proceso
+        "1. RESUMEN DEL PROCESO DE ENRIQUECIMIENTO",
+        "---------------------------------------",
+        f"Total de países en el dataset base: {run['total_countries']}",
+        f"Países con información de idiomas: {run['countries_with_languages']}",
+        f"Países enriquecidos con datos adicionales: {run['countries_enriched']}",
+        f"Total de coincidencias de idiomas: {run['total_language_matches']}",
+    ]
+    if run.get('language_relations'):
+        # Cambio respecto de comparar el código del país con el del CSV tal cual
+        relations = run['language_relations']
+        lines += [
+            f"Tasa de coincidencia por código literal: {run['literal_language_matches']} de {relations} "
+            f"relaciones ({run['literal_language_matches'] / relations:.1%}), {run['countries_enriched_literal']} países",
+            f"Tasa de coincidencia con el índice ISO 639: {run['total_language_matches']} de {relations} "
+            f"relaciones ({run['total_language_matches'] / relations:.1%}), {run['countries_enriched']} países",
+        ]
+    lines += [
+        "",
+        # Detalle de países sin coincidencias
+        "2. PAÍSES SIN COINCIDENCIAS EN EL DATASET DE IDIOMAS",
+        "------------------------------------------------",
+    ]
+    without_matches = [country['name'] for country in grouped.get('country', [])
+                       if country['language_count'] > 0 and country['primary_language'] is None]
+    if without_matches:
+        lines += [f"  - {name}" for name in without_matches[:20]]  # Limitar a 20 para no hacer el reporte demasiado largo
+        if len(without_matches) > 20:
+            lines.append(f"  ... y {len(without_matches) - 20} países más")
+    else:
+        lines.append("  No hay países sin coincidencias.")
+    lines.append("")
+
+    # Estadísticas sobre familias lingüísticas por región
+    lines += ["3. FAMILIAS LINGÜÍSTICAS PRINCIPALES POR REGIÓN", "-------------------------------------------"]
+    for item in grouped.get('region_families', []):
+        if not item['families']:
+            continue
+        lines += ["", f"Región: {item['region']}"]
+        sorted_families = sorted(item['families'].items(), key=lambda x: x[1], reverse=True)
+        # Limitar a las 5 familias más comunes
+        lines += [f"  - {family}: {count} países" for family, count in sorted_families[:5] if pd.notna(family)]
+    lines.append("")
+
+    # Métricas lingüísticas
+    lines += ["4. MÉTRICAS LINGÜÍSTICAS DEL DATASET ENRIQUECIDO", "--------------------------------------------"]
+    lines += [f"  - {diversity}: {count} países" for diversity, count in run['diversity_counts'].items()]
+    # Promedio de idiomas por país
+    lines += ["", f"Promedio de idiomas por país: {run['avg_languages']:.2f}"]
+    # País con mayor diversidad lingüística
+    if run['most_diverse'] is not None:
+        name, language_count = run['most_diverse']
+        lines += [f"País con mayor diversidad lingüística: {name} ({language_count} idiomas)", ""]
+
+    # Muestra de los datos enriquecidos (columnas object, como se tomó la muestra)
+    sample = run['sample']
+    lines += ["5. MUESTRA DE DATOS ENRIQUECIDOS", "-----------------------------",
+              pd.DataFrame(sample['rows'], index=sample['index'], columns=sample['columns'], dtype=object).to_string()]
+    return "\n".join(lines)
+
+def ensure_output_dirs():
+    """Crea los directorios de salida al ejecutar la etapa (no al importar el módulo)"""
+    for path in (ENRICHED_DATA_PATH, ENRICHED_EXCEL_PATH, ENRICHMENT_REPORT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+def main(mode=None, export_excel=None):
+    """export_excel=False omite la copia en Excel (el orquestador la escribe como etapa propia)"""
+    mode = mode or ENRICHMENT_MODE
+    ensure_output_dirs()
+    with instrumentacion.span("enrichment", mode=mode) as stage_span:
+        stage_span['rows_out'] = run(mode, export_excel)
+
+def run(mode, export_excel=None):
+    """Pasos de la etapa de enriquecimiento; devuelve la cantidad de registros enriquecidos"""
     print("\n===== INICIANDO PROCESO DE ENRIQUECIMIENTO DE DATOS =====\n")
     
     # 1. Verificar si los datos limpios existen o ejecutar simulacion_procesamiento.py
     check_cleaned_data_exists()
     
     # 2. Cargar los datos limpios
-    countries_df = load_cleaned_data()
+    with instrumentacion.span("enrichment.load_cleaned_data") as load_span:
+        countries_df = load_cleaned_data(span=load_span)
+        load_span['rows_out'] = None if countries_df is None else len(countries_df)
     if countries_df is None:
         print("Error: No se pudieron cargar los datos limpios. Abortando proceso.")
-        return
+        return None
     
     # 3. Cargar datos adicionales de idiomas
-    languages_df = load_languages_data()
+    with instrumentacion.span("enrichment.load_languages_data") as load_span:
+        languages_df = load_languages_data()
+        load_span['rows_out'] = len(languages_df)
     if languages_df.empty:
         print("Error: No se pudieron cargar los datos de idiomas. Abortando proceso.")
-        return
-    
-    # 4. Extraer y estructurar información de idiomas de cada país
-    country_languages_df = extract_country_languages(countries_df)
+        return None
     
-    # 5. Enriquecer los datos de países con información de idiomas
-    enriched_df, match_stats = enrich_data(countries_df, country_languages_df, languages_df)
+    # 4. Obtener la relación país-idioma: tabla normalizada o, si no existe, el campo JSON
+    with instrumentacion.span("enrichment.country_languages", rows_in=len(countries_df)) as relations_span:
+        country_languages_df = load_country_languages_from_db(countries_df)
+        if country_languages_df is None:
+            country_languages_df = extract_country_languages(countries_df)
+        relations_span['rows_out'] = len(country_languages_df)
     
-    # 6. Calcular métricas adicionales
-    final_df, region_language_families = calculate_additional_metrics(enriched_df)
+    # 5-6. Enriquecer los datos de países y calcular métricas adicionales
+    if mode == "parallel":
+        with instrumentacion.span("enrichment.enrich_parallel", rows_in=len(countries_df)) as enrich_span:
+            final_df, match_stats, region_language_families = paralelo.enrich_parallel(
+                countries_df, country_languages_df, languages_df, workers=WORKERS,
+                families=not MATERIALIZE_AGGREGATES)
+            enrich_span['rows_out'] = len(final_df)
+    else:
+        with instrumentacion.span("enrichment.enrich_data", rows_in=len(countries_df)) as enrich_span:
+            enriched_df, match_stats = enrich_data(countries_df, country_languages_df, languages_df)
+            enrich_span['rows_out'] = len(enriched_df)
+        with instrumentacion.span("enrichment.additional_metrics", rows_in=len(enriched_df)) as metrics_span:
+            final_df, region_language_families = calculate_additional_metrics(
+                enriched_df, families=not MATERIALIZE_AGGREGATES)
+            metrics_span['rows_out'] = len(final_df)
     
-    # 7. Generar archivos de salida
-    generate_output_files(final_df, match_stats, region_language_families)
+    # 7. Generar archivos de salida (language_family y linguistic_diversity pasan a categóricas)
+    with instrumentacion.span("enrichment.compact_output", rows_in=len(final_df)) as compact_span:
+        final_df = esquema.load(final_df, "salida del enriquecimiento", compact_span)
+
+    # 8. Agregados materializados: solo se aplican las filas que cambiaron desde la última ejecución
+    report_values = None
+    if MATERIALIZE_AGGREGATES:
+        with instrumentacion.span("enrichment.materialize_aggregates", rows_in=len(final_df)) as aggregates_span:
+            aggregate_stats = agregados.materialize(final_df)
+            if aggregate_stats is not None:
+                aggregates_span['rows_out'] = aggregate_stats['added']
+                aggregates_span['rows_removed'] = aggregate_stats['removed']
+                region_language_families = agregados.region_language_families()
+                report_values = agregados.report_values()
+        if region_language_families is None:
+            region_language_families = metricas.region_language_families(final_df)
+    with instrumentacion.span("enrichment.output_files", rows_in=len(final_df)):
+        generate_output_files(final_df, match_stats, region_language_families, report_values, export_excel)
     
     print("\n===== PROCESO DE ENRIQUECIMIENTO COMPLETADO =====")
+    return len(final_df)
+
+def export_excel_copy():
+    """Copia en Excel del dataset enriquecido, leída por lotes del archivo columnar; devuelve las filas escritas"""
+    ensure_output_dirs()
+    with instrumentacion.span("enrichment.to_excel") as excel_span:
+        print(f"Exportando copia en Excel a {ENRICHED_EXCEL_PATH}...")
+        excel_span['rows_out'] = exportacion.write_excel(
+            intercambio.iter_stage_batches(ENRICHED_DATA_PATH, exportacion.EXCEL_BATCH_SIZE), ENRICHED_EXCEL_PATH)
+    return excel_span.get('rows_out')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python -m pipeline_paises.enrichment [serial|parallel]: modo de esta ejecución
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,74 +1,129 @@
 import sqlite3
-import pandas as pd
 import numpy as np
-import random
-import string
+from . import rutas
 
-DB_PATH = "src/static/db/ingestion.db"
+DB_PATH = rutas.output("db", "ingestion.db")
+DIRTY_TABLE = "countries_dirty"  # Copia ensuciada que lee la limpieza; countries queda como la dejó la ingesta
+SEED = None  # Semilla del generador aleatorio; None para una corrupción distinta en cada ejecución
+BATCH_SIZE = 500  # Filas por sentencia IN al leer las filas afectadas
 
-def ensuciar_datos():
+# Tipos de corrupción: columnas afectadas y proporción de filas
+NULL_COLS = ['subregion', 'capital']
+NULL_RATE = 0.01
+DRIFT_COLS = ['population', 'area']
+DRIFT_RATE = 0.01
+DRIFT_RANGE = (0.97, 1.03)
+DUPLICATE_RATE = 0.005
+TYPO_COLS = ['name_common', 'region']
+TYPO_RATE = 0.01  # Filas candidatas por columna
+TYPO_PROBABILITY = 0.01  # Probabilidad de error en cada candidata
+
+def introduce_typo(value, position):
+    """Intercambia dos caracteres contiguos; position en [0, 1) elige dónde"""
+    if not isinstance(value, str) or len(value) <= 3:
+        return value
+    index = int(position * (len(value) - 1))
+    return value[:index] + value[index + 1] + value[index] + value[index + 2:]
+
+def _sample(rng, rowids, rate):
+    """Rowids afectados sin reemplazo; al menos uno, como en la versión original"""
+    size = min(len(rowids), max(1, int(len(rowids) * rate)))
+    return rng.choice(rowids, size=size, replace=False)
+
+def _fetch(cursor, columns, rowids):
+    """Lee solo las filas afectadas, por lotes de rowids"""
+    rows = []
+    for start in range(0, len(rowids), BATCH_SIZE):
+        batch = [int(rowid) for rowid in rowids[start:start + BATCH_SIZE]]
+        placeholders = ", ".join("?" * len(batch))
+        rows.extend(cursor.execute(
+            f"SELECT rowid, {', '.join(columns)} FROM {DIRTY_TABLE} WHERE rowid IN ({placeholders})", batch))
+    return rows
+
+def _update(cursor, column, values):
+    """UPDATE por lotes sobre la copia ensuciada"""
+    cursor.executemany(f"UPDATE {DIRTY_TABLE} SET {column} = ? WHERE rowid = ?", values)
+
+def source_table(db_path=None):
+    """Tabla que lee la limpieza: la copia ensuciada si existe, si no countries"""
+    conn = sqlite3.connect(db_path or DB_PATH)
+    try:
+        exists = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?",
+                              (DIRTY_TABLE,)).fetchone()[0]
+    finally:
+        conn.close()
+    return DIRTY_TABLE if exists else "countries"
+
+def ensuciar_datos(db_path=None, seed=SEED):
+    """Escribe en DIRTY_TABLE una copia ensuciada de los países vigentes; countries no se modifica.
+
+    La copia no tiene restricciones (id PRIMARY KEY, cca3 UNIQUE), así que los duplicados son copias exactas
+    que todos los modos de limpieza eliminan. Devuelve el nombre de la tabla.
+    """
     print("\n=== ENSUCIANDO DATOS ORIGINALES (MODO SUAVE) ===")
 
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM countries", conn)
-    conn.close()
+    conn = sqlite3.connect(db_path or DB_PATH)
+    cursor = conn.cursor()
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(countries)")}
+    # Se recrea en cada ejecución: las copias no se acumulan y los países dados de baja no se ensucian
+    cursor.execute(f"DROP TABLE IF EXISTS {DIRTY_TABLE}")
+    cursor.execute(f"CREATE TABLE {DIRTY_TABLE} AS SELECT * FROM countries"
+                   + (" WHERE deleted_at IS NULL" if 'deleted_at' in columns else ""))
+    rowids = np.array([row[0] for row in cursor.execute(f"SELECT rowid FROM {DIRTY_TABLE}")], dtype=np.int64)
 
-    if df.empty:
+    if len(rowids) == 0:
+        conn.commit()
+        conn.close()
         print("No hay datos para ensuciar.")
-        return
-    
-    num_rows = len(df)
+        return DIRTY_TABLE
+
+    rng = np.random.default_rng(seed)
+    num_rows = len(rowids)
 
     # 🔵 1. Introducir valores nulos en un 1% de algunas columnas clave
-    cols_with_nulls = ['subregion', 'capital']
-    for col in cols_with_nulls:
-        if col in df.columns:
-            num_nulls = max(1, int(num_rows * 0.01))  # Garantiza al menos 1 afectado
-            indices = np.random.choice(df.index, size=num_nulls, replace=False)
-            df.loc[indices, col] = np.nan
+    for col in NULL_COLS:
+        if col in columns:
+            _update(cursor, col, [(None, int(rowid)) for rowid in _sample(rng, rowids, NULL_RATE)])
     print("  - Se introdujeron algunos valores nulos en columnas seleccionadas.")
 
-    # 🔵 2. Modificar valores numéricos ligeramente (±5% del valor original) en un 1%
-    def distort_number(x):
-        if pd.isnull(x) or not isinstance(x, (int, float)):
-            return x
-        factor = random.uniform(0.97, 1.03)
-        return x * factor
-
-    for col in ['population', 'area']:
-        if col in df.columns:
-            affected_indices = np.random.choice(df.index, size=max(1, int(num_rows * 0.01)), replace=False)
-            df.loc[affected_indices, col] = df.loc[affected_indices, col].apply(distort_number)
-    
+    # 🔵 2. Modificar valores numéricos ligeramente (±3% del valor original) en un 1%
+    for col in DRIFT_COLS:
+        if col in columns:
+            affected = [(rowid, value) for rowid, value in _fetch(cursor, [col], _sample(rng, rowids, DRIFT_RATE))
+                        if value is not None]
+            if affected:
+                ids, values = map(np.array, zip(*affected))
+                factors = rng.uniform(*DRIFT_RANGE, len(values))
+                distorted = values.astype('float64') * factors
+                _update(cursor, col, list(zip(distorted.tolist(), ids.tolist())))
     print("  - Se agregaron pequeñas variaciones en valores numéricos.")
 
-    # 🔵 3. Duplicar solo el 0.5% de los registros
-    if len(df) > 10:
-        duplicated_rows = df.sample(n=max(1, int(num_rows * 0.005)), replace=True)
-        df = pd.concat([df, duplicated_rows], ignore_index=True)
-    print(f"  - Se duplicaron {len(duplicated_rows)} registros.")
-
-    # 🔵 4. Introducir errores tipográficos en menos del 1% de los textos
-    def introduce_typo(value):
-        if isinstance(value, str) and len(value) > 3 and random.random() < 0.01:
-            index = random.randint(0, len(value) - 2)
-            return value[:index] + value[index + 1] + value[index] + value[index + 2:]
-        return value
-
-    text_cols = ['name_common', 'region']
-    for col in text_cols:
-        if col in df.columns:
-            affected_indices = np.random.choice(df.index, size=max(1, int(num_rows * 0.01)), replace=False)
-            df.loc[affected_indices, col] = df.loc[affected_indices, col].apply(introduce_typo)
-    
+    # 🔵 3. Introducir errores tipográficos en menos del 1% de los textos
+    for col in TYPO_COLS:
+        if col in columns:
+            candidates = _sample(rng, rowids, TYPO_RATE)
+            affected = candidates[rng.random(len(candidates)) < TYPO_PROBABILITY]
+            rows = _fetch(cursor, [col], affected)
+            positions = rng.random(len(rows))
+            _update(cursor, col, [(introduce_typo(value, position), rowid)
+                                  for (rowid, value), position in zip(rows, positions.tolist())])
     print("  - Se introdujeron errores tipográficos mínimos.")
 
-    # 🔵 Guardar los datos ensuciados en la base de datos
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql("countries", conn, if_exists="replace", index=False)
+    # 🔵 4. Duplicar solo el 0.5% de los registros, al final para que cada copia sea idéntica a su original
+    duplicated = 0
+    if num_rows > 10:
+        copies = rng.choice(rowids, size=max(1, int(num_rows * DUPLICATE_RATE)), replace=True)
+        cursor.executemany(f"INSERT INTO {DIRTY_TABLE} SELECT * FROM {DIRTY_TABLE} WHERE rowid = ?",
+                           [(int(rowid),) for rowid in copies])
+        duplicated = len(copies)
+    print(f"  - Se duplicaron {duplicated} registros.")
+
+    # 🔵 Confirmar los cambios sobre la copia ensuciada
+    conn.commit()
     conn.close()
 
-    print("Datos ensuciados y guardados correctamente.")
+    print(f"Datos ensuciados y guardados correctamente en la tabla {DIRTY_TABLE}.")
+    return DIRTY_TABLE
 
 if __name__ == "__main__":
     ensuciar_datos()
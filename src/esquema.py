@@ -0,0 +1,114 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Configuración
+COMPACT_DTYPES = True  # Cargar los DataFrames con el esquema compacto
+STRING_DTYPE = "string[pyarrow]"  # Texto en buffers de Arrow en lugar de objetos Python
+# Columnas con pocos valores distintos: categóricas
+CATEGORY_COLS = ['region', 'subregion', 'language_family', 'linguistic_diversity']
+MB = 1024 * 1024
+
+def memory_mb(df):
+    """Memoria del DataFrame en MB, contando el contenido de las cadenas"""
+    return df.memory_usage(deep=True, index=False).sum() / MB
+
+def downcast(series):
+    """Enteros al tipo más chico que los contiene; flotantes a float32 solo si no se pierde precisión"""
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series) and series.dtype != 'float32':
+        values = series.to_numpy()
+        compact = values.astype('float32')
+        if np.array_equal(compact.astype(values.dtype), values, equal_nan=True):
+            return series.astype('float32')
+    return series
+
+def compact_column(series):
+    """Tipo compacto de una columna según su nombre y su contenido"""
+    if series.name in CATEGORY_COLS:
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if series.dtype == object:
+        # Solo columnas de texto puro: las que mezclan tipos se dejan como están
+        if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+            return series.astype(STRING_DTYPE)
+        return series
+    return downcast(series)
+
+def compact(df):
+    """Aplica el esquema compacto a todas las columnas"""
+    return pd.DataFrame({col: compact_column(df[col]) for col in df.columns}, index=df.index)
+
+def memory_report(before, after):
+    """Memoria antes y después por columna, con su tipo"""
+    before_usage = before.memory_usage(deep=True, index=False)
+    after_usage = after.memory_usage(deep=True, index=False)
+    return {
+        'before_mb': round(before_usage.sum() / MB, 2),
+        'after_mb': round(after_usage.sum() / MB, 2),
+        'columns': {
+            col: {
+                'before': str(before[col].dtype), 'after': str(after[col].dtype),
+                'before_mb': round(before_usage[col] / MB, 3), 'after_mb': round(after_usage[col] / MB, 3),
+            }
+            for col in before.columns
+        },
+    }
+
+def load(df, stage, span=None):
+    """Compacta un DataFrame recién cargado e informa la memoria de la etapa.
+
+    span (opcional) es el registro de instrumentacion.span del paso de carga.
+    """
+    if not COMPACT_DTYPES:
+        return df
+    compacted = compact(df)
+    report = memory_report(df, compacted)
+    saved = 1 - report['after_mb'] / report['before_mb'] if report['before_mb'] else 0.0
+    print(f"  - Memoria de {stage}: {report['before_mb']:.2f} MB -> {report['after_mb']:.2f} MB ({saved:.0%} menos)")
+    if span is not None:
+        span['memory_before_mb'] = report['before_mb']
+        span['memory_after_mb'] = report['after_mb']
+    return compacted
+
+# Operaciones de limpieza que deben respetar las columnas categóricas
+def text_columns(df):
+    return df.select_dtypes(include=['object', 'string', 'category']).columns
+
+def fill_missing(series, value):
+    """fillna que agrega la categoría nueva si hace falta"""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+def strip_text(series):
+    """str.strip que conserva el tipo categórico, con categorías que solo dependen de las originales"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.str.strip()
+    categories = series.cat.categories
+    stripped = categories.str.strip()
+    if stripped.is_unique:
+        return series.cat.rename_categories(stripped)
+    return pd.Series(pd.Categorical(series.astype(object).str.strip(), categories=stripped.unique()),
+                     index=series.index, name=series.name)
+
+def benchmark(n_rows=1_000_000):
+    """Memoria de la tabla countries sintética con los tipos por defecto y con el esquema compacto"""
+    from . import generador_datos
+
+    df = pd.concat(generador_datos.iter_batches(n_rows), ignore_index=True)
+    start = time.perf_counter()
+    compacted = compact(df)
+    elapsed = time.perf_counter() - start
+    report = memory_report(df, compacted)
+
+    print(f"{len(df)} filas: {report['before_mb']:.1f} MB -> {report['after_mb']:.1f} MB "
+          f"(conversión en {elapsed:.1f}s)")
+    for col, info in report['columns'].items():
+        print(f"  {col:<14} {info['before']:>8} -> {info['after']:<16} "
+              f"{info['before_mb']:>9.1f} MB -> {info['after_mb']:>8.1f} MB")
+    return report
+
+if __name__ == "__main__":
+    benchmark(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,124 @@
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from . import instrumentacion
+
+# Configuración
+EXCEL_BATCH_SIZE = 5_000  # Filas convertidas y escritas por lote en el libro de solo escritura
+SHEET_NAME = "Sheet1"  # Igual que DataFrame.to_excel
+OUTPUT_WORKERS = 3  # Salidas independientes (libro, reporte, Parquet) escritas a la vez; 1 = en serie
+
+def _batches(data, batch_size):
+    """Un DataFrame se corta en lotes; cualquier otro iterable ya produce DataFrames"""
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, max(len(data), 1), batch_size):
+            yield data.iloc[start:start + batch_size]
+    else:
+        yield from data
+
+def _rows(batch):
+    """Filas como tuplas de valores Python; nulos como celdas vacías e infinitos como texto (igual que pandas)"""
+    values = batch.astype(object).where(batch.notna(), None)
+    for col in batch.select_dtypes(include=['floating']).columns:
+        infinite = np.isinf(batch[col].to_numpy(dtype='float64', na_value=np.nan))
+        if infinite.any():
+            values.loc[infinite, col] = np.where(batch.loc[infinite, col] > 0, 'inf', '-inf')
+    return values.itertuples(index=False, name=None)
+
+def _header(sheet, columns):
+    """Encabezado con el mismo estilo que DataFrame.to_excel"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    thin = Side(style="thin")
+    font, border = Font(bold=True), Border(left=thin, right=thin, top=thin, bottom=thin)
+    alignment = Alignment(horizontal="center", vertical="top")
+    cells = []
+    for col in columns:
+        cell = WriteOnlyCell(sheet, value=str(col))
+        cell.font, cell.border, cell.alignment = font, border, alignment
+        cells.append(cell)
+    return cells
+
+def write_excel(data, path, batch_size=EXCEL_BATCH_SIZE, sheet_name=SHEET_NAME):
+    """Escribe un xlsx en modo de solo escritura, lote a lote, sin índice.
+
+    data es un DataFrame o un iterable de DataFrames con las mismas columnas (por ejemplo
+    read_sql_query con chunksize); la memoria no depende de la cantidad de filas.
+    Devuelve la cantidad de filas escritas.
+    """
+    from openpyxl import Workbook  # openpyxl solo se carga si la ejecución exporta a Excel
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    rows = 0
+    header_written = False
+    for batch in _batches(data, batch_size):
+        if not header_written:
+            sheet.append(_header(sheet, batch.columns))
+            header_written = True
+        for row in _rows(batch):
+            sheet.append(row)
+        rows += len(batch)
+    workbook.save(path)
+    return rows
+
+def run_outputs(outputs, workers=OUTPUT_WORKERS):
+    """Ejecuta salidas independientes en un pool de hilos, cada una en su span.
+
+    outputs es una lista de (nombre del span, filas de entrada, función sin argumentos).
+    Todas terminan aunque alguna falle; el primer error se propaga al final.
+    Devuelve los segundos de cada salida.
+    """
+    # Los spans de los hilos cuelgan del span activo en el hilo que llama
+    parent = instrumentacion.current_span()
+
+    def timed(name, rows_in, write):
+        start = time.perf_counter()
+        with instrumentacion.span(name, rows_in=rows_in, parent=parent):
+            write()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(name, pool.submit(timed, name, rows_in, write)) for name, rows_in, write in outputs]
+    timings = {name: future.result() for name, future in futures}
+    elapsed = time.perf_counter() - start
+
+    print(f"  - Salidas escritas en {elapsed:.2f}s ({max(1, workers)} hilos): "
+          + ", ".join(f"{name.rsplit('.', 1)[-1]} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
+
+def benchmark(n_rows=20_000, batch_size=EXCEL_BATCH_SIZE):
+    """Memoria pico y tiempo de DataFrame.to_excel frente a la escritura por lotes, con datos sintéticos"""
+    import os
+    import tempfile
+    from . import generador_datos
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = pd.concat(generador_datos.iter_batches(n_rows, batch_size), ignore_index=True)
+        df.to_excel(os.path.join(tmp, "to_excel.xlsx"), index=False)
+        results['to_excel'] = (time.perf_counter() - start, tracemalloc.get_traced_memory()[1])
+        del df
+        tracemalloc.stop()
+
+        # Los lotes se generan y escriben sin reunir nunca la tabla completa
+        tracemalloc.start()
+        start = time.perf_counter()
+        write_excel(generador_datos.iter_batches(n_rows, batch_size), os.path.join(tmp, "streaming.xlsx"))
+        results['streaming'] = (time.perf_counter() - start, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    print(f"{n_rows} filas (tiempos con tracemalloc activo):")
+    for name, (seconds, peak) in results.items():
+        print(f"  - {name:<10} {seconds:.1f}s, pico de memoria {peak / (1024 * 1024):.1f} MB")
+    return results
+
+if __name__ == "__main__":
+    benchmark(int(float(sys.argv[1])) if len(sys.argv) > 1 else 20_000)
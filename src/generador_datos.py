@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import itertools
+import numpy as np
+import pandas as pd
+from . import ingestion
+from . import intercambio
+from . import ensuciar_datos
+from . import rutas
+
+# Configuración
+OUTPUT_PATH = rutas.output("db", "synthetic.db")
+N_ROWS = 1_000_000
+BATCH_SIZE = 100_000  # Filas generadas y escritas por lote; con la misma semilla y lote, mismos datos
+SEED = 42
+TIMESTAMP = "2025-04-06T00:00:00"  # Fijo para que la salida sea reproducible
+
+# Tasas de corrupción por tipo; las columnas afectadas son las de ensuciar_datos.py
+CORRUPTION_RATES = {
+    'nulls': ensuciar_datos.NULL_RATE,
+    'drift': ensuciar_datos.DRIFT_RATE,
+    'duplicates': ensuciar_datos.DUPLICATE_RATE,
+    'typos': ensuciar_datos.TYPO_RATE,
+}
+
+SUBREGIONS = {
+    "Africa": ["Northern Africa", "Eastern Africa", "Middle Africa", "Southern Africa", "Western Africa"],
+    "Americas": ["Caribbean", "Central America", "North America", "South America"],
+    "Asia": ["Central Asia", "Eastern Asia", "South-Eastern Asia", "Southern Asia", "Western Asia"],
+    "Europe": ["Central Europe", "Eastern Europe", "Northern Europe", "Southeast Europe",
+               "Southern Europe", "Western Europe"],
+    "Oceania": ["Australia and New Zealand", "Melanesia", "Micronesia", "Polynesia"],
+    "Antarctic": [None],
+}
+LANGUAGES = {"eng": "English", "spa": "Spanish", "fra": "French", "ara": "Arabic", "por": "Portuguese",
+             "rus": "Russian", "zho": "Chinese", "deu": "German", "hin": "Hindi", "swa": "Swahili",
+             "ita": "Italian", "nld": "Dutch"}
+CURRENCIES = {"USD": ("United States dollar", "$"), "EUR": ("Euro", "€"), "XOF": ("West African CFA franc", "Fr"),
+              "XCD": ("Eastern Caribbean dollar", "$"), "GBP": ("British pound", "£"), "INR": ("Indian rupee", "₹"),
+              "CHF": ("Swiss franc", "Fr."), "AUD": ("Australian dollar", "$"), "BRL": ("Brazilian real", "R$")}
+
+def countries_schema():
+    """Columnas y tipos declarados de la tabla countries de ingestion.py"""
+    conn = sqlite3.connect(":memory:")
+    ingestion.create_countries_table(conn.cursor())
+    schema = [(name, declared_type) for _, name, declared_type, *_ in conn.execute("PRAGMA table_info(countries)")]
+    conn.close()
+    return schema
+
+def _value_pools():
+    """Valores JSON precalculados: cada fila elige uno por índice, sin serializar fila a fila"""
+    languages = [np.array([json.dumps(dict(combo))
+                           for combo in itertools.combinations(sorted(LANGUAGES.items()), size)], dtype=object)
+                 for size in (1, 2, 3)]
+    currencies = [json.dumps({code: {"name": name, "symbol": symbol}})
+                  for code, (name, symbol) in sorted(CURRENCIES.items())]
+    timezones = [json.dumps([f"UTC{offset:+03d}:00"]) for offset in range(-11, 13)]
+    regions, subregions = zip(*[(region, subregion) for region, subs in SUBREGIONS.items() for subregion in subs])
+    return {
+        'languages': languages,  # Combinaciones de 1, 2 y 3 idiomas
+        'currencies': np.array(currencies, dtype=object),
+        'timezones': np.array(timezones, dtype=object),
+        'region': np.array(regions, dtype=object),
+        'subregion': np.array(subregions, dtype=object),
+    }
+
+def generate_batch(start, n_rows, rng, pools):
+    """Genera n_rows países limpios a partir del id start"""
+    ids = np.arange(start, start + n_rows)
+    cca3 = [f"S{i:08d}" for i in ids.tolist()]
+    names = [f"Country {i}" for i in ids.tolist()]
+    geo = rng.integers(0, len(pools['region']), n_rows)
+    n_languages = rng.choice(3, size=n_rows, p=[0.6, 0.3, 0.1])
+    languages = np.empty(n_rows, dtype=object)
+    for size, combos in enumerate(pools['languages']):
+        mask = n_languages == size
+        languages[mask] = combos[rng.integers(0, len(combos), mask.sum())]
+
+    return pd.DataFrame({
+        'id': ids + 1,
+        'cca3': cca3,
+        'name_common': names,
+        'name_official': ["Republic of " + name for name in names],
+        'region': pools['region'][geo],
+        'subregion': pools['subregion'][geo],
+        'population': rng.lognormal(15, 2, n_rows).astype('int64') + 1000,
+        'area': np.round(rng.lognormal(11, 2, n_rows), 1),
+        'languages': languages,
+        'capital': [f'["Capital {i}"]' for i in ids.tolist()],
+        'timezones': pools['timezones'][rng.integers(0, len(pools['timezones']), n_rows)],
+        'currencies': pools['currencies'][rng.integers(0, len(pools['currencies']), n_rows)],
+        'flag': [f"https://flagcdn.com/w320/{code.lower()}.png" for code in cca3],
+        'timestamp': TIMESTAMP,
+        # Las filas sintéticas no provienen de la API: sin huella ni borrado lógico
+        'content_hash': None,
+        'deleted_at': None,
+    })
+
+def corrupt_batch(df, rng, rates=CORRUPTION_RATES):
+    """Aplica los tipos de corrupción de ensuciar_datos.py con máscaras aleatorias por columna"""
+    n_rows = len(df)
+
+    # 1. Valores nulos
+    for col in ensuciar_datos.NULL_COLS:
+        mask = rng.random(n_rows) < rates['nulls']
+        df[col] = df[col].where(~mask, None)
+
+    # 2. Variaciones numéricas; population queda como float igual que tras ensuciar la BD
+    if rates['drift'] > 0:
+        for col in ensuciar_datos.DRIFT_COLS:
+            mask = rng.random(n_rows) < rates['drift']
+            factors = np.where(mask, rng.uniform(*ensuciar_datos.DRIFT_RANGE, n_rows), 1.0)
+            df[col] = df[col].astype('float64') * factors
+
+    # 3. Duplicados de filas del mismo lote
+    n_duplicates = rng.binomial(n_rows, rates['duplicates']) if rates['duplicates'] > 0 else 0
+    if n_duplicates:
+        df = pd.concat([df, df.iloc[rng.integers(0, n_rows, n_duplicates)]], ignore_index=True)
+
+    # 4. Errores tipográficos, solo sobre las filas afectadas
+    for col in ensuciar_datos.TYPO_COLS:
+        affected = np.flatnonzero(rng.random(len(df)) < rates['typos'])
+        positions = rng.random(len(affected))
+        values = df[col].to_numpy(dtype=object)
+        for row, position in zip(affected.tolist(), positions.tolist()):
+            values[row] = ensuciar_datos.introduce_typo(values[row], position)
+        df[col] = values
+    return df
+
+def iter_batches(n_rows=N_ROWS, batch_size=BATCH_SIZE, seed=SEED, rates=CORRUPTION_RATES):
+    """Lotes de países sintéticos ya ensuciados; cada lote tiene su propio generador derivado de la semilla"""
+    pools = _value_pools()
+    for batch_number, start in enumerate(range(0, n_rows, batch_size)):
+        rng = np.random.default_rng([seed, batch_number])
+        batch = generate_batch(start, min(batch_size, n_rows - start), rng, pools)
+        yield corrupt_batch(batch, rng, rates)
+
+def write_sqlite(batches, db_path, table="countries"):
+    """Escribe los lotes en SQLite con el esquema de countries, sin restricciones para admitir duplicados"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        columns = ", ".join(f'"{name}" {declared_type}' for name, declared_type in countries_schema())
+        conn.execute(f"CREATE TABLE {table} ({columns})")
+        rows = 0
+        for batch in batches:
+            batch.to_sql(table, conn, if_exists="append", index=False)
+            rows += len(batch)
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+def generate(n_rows=N_ROWS, output_path=OUTPUT_PATH, batch_size=BATCH_SIZE, seed=SEED, rates=CORRUPTION_RATES):
+    """Genera n_rows países sintéticos en SQLite (.db) o en un archivo columnar (.parquet)"""
+    print(f"Generando {n_rows} países sintéticos (semilla {seed}, lotes de {batch_size}) en {output_path}...")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    start = time.perf_counter()
+    batches = iter_batches(n_rows, batch_size, seed, rates)
+    if output_path.endswith(".parquet"):
+        rows = intercambio.write_stage_chunks(batches, output_path, stage="synthetic")
+    else:
+        rows = write_sqlite(batches, output_path)
+    elapsed = time.perf_counter() - start
+    print(f"  - {rows} filas escritas ({rows - n_rows} duplicados) en {elapsed:.1f}s "
+          f"({rows / elapsed:,.0f} filas/s)")
+    return rows
+
+if __name__ == "__main__":
+    generate(int(float(sys.argv[1])) if len(sys.argv) > 1 else N_ROWS,
+             sys.argv[2] if len(sys.argv) > 2 else OUTPUT_PATH)
@@ -1,46 +1,113 @@
 import os
+import sys
 import json
+import codecs
+import hashlib
 import sqlite3
+import time
+import tempfile
 import requests
 import pandas as pd
 from datetime import datetime
+from . import cliente_http
+from . import reconciliacion
+from . import instrumentacion
+from . import exportacion
+from . import auditoria
+from . import rutas
 
 # Configuración
 BASE_URL = "https://restcountries.com/v3.1/all"
-DB_PATH = "src/static/db/ingestion.db"
-EXCEL_PATH = "src/static/xlsx/ingestion.xlsx"
-AUDIT_PATH = "src/static/auditoria/ingestion.txt"
+DB_PATH = rutas.output("db", "ingestion.db")
+EXCEL_PATH = rutas.output("xlsx", "ingestion.xlsx")
+AUDIT_PATH = rutas.output("auditoria", "ingestion.txt")
+BATCH_SIZE = 500  # Filas por lote en la carga masiva
+CHUNK_SIZE = 64 * 1024  # Bytes leídos por iteración del cuerpo HTTP
+# Solo se piden a la API los campos que se almacenan en la tabla countries
+API_FIELDS = "cca3,name,region,subregion,population,area,languages,capital,timezones,currencies,flags"
+# Columnas de datos de la tabla countries, en el orden de country_to_row
+STORED_FIELDS = [
+    'cca3', 'name_common', 'name_official', 'region', 'subregion', 'population',
+    'area', 'languages', 'capital', 'timezones', 'currencies', 'flag'
+]
+LOAD_MODE = "delta"  # "delta": upsert incremental por cca3; "full": recarga completa
+FETCH_MODE = "stream"  # "stream": una solicitud a /all; "concurrent": partes en paralelo (descarga_concurrente.py)
 
-# Asegurar directorios
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-os.makedirs(os.path.dirname(EXCEL_PATH), exist_ok=True)
-os.makedirs(os.path.dirname(AUDIT_PATH), exist_ok=True)
+INSERT_SQL = '''
+INSERT INTO {table} (
+    cca3, name_common, name_official, region, subregion,
+    population, area, languages, capital, timezones,
+    currencies, flag, timestamp, content_hash
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+UPDATE_SQL = '''
+UPDATE countries SET
+    name_common = ?, name_official = ?, region = ?, subregion = ?,
+    population = ?, area = ?, languages = ?, capital = ?, timezones = ?,
+    currencies = ?, flag = ?, timestamp = ?, content_hash = ?, deleted_at = NULL
+WHERE cca3 = ?
+'''
 
 # Obtener datos de la API
 def get_country_data():
-    response = requests.get(BASE_URL)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error en la solicitud HTTP: {response.status_code}")
-        return None
+    countries = list(stream_country_data())
+    return countries or None
 
-# Crear base de datos y tabla
-def create_database():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# Parsear incrementalmente un arreglo JSON y producir cada elemento
+def iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    started = False
+    finished = False
 
-    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='countries'")
-    table_exists = cursor.fetchone()[0] == 1
+    for chunk in chunks:
+        # Tras el corchete final se consume el resto para que la fuente termine limpiamente
+        if finished:
+            continue
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            # Saltar espacios, el corchete inicial y los separadores
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Se esperaba un arreglo JSON en la respuesta")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Elemento incompleto: esperar el siguiente fragmento
+                break
+            pos = end
+            yield item
+        buffer = buffer[pos:]
 
-    if table_exists:
-        print("Base de datos existente. Eliminando datos antiguos...")
-        cursor.execute('DROP TABLE IF EXISTS countries')
-    else:
-        print("Base de datos no existe. Creando nueva tabla...")
+    if not finished:
+        raise ValueError("La respuesta JSON terminó de forma inesperada")
 
-    cursor.execute('''
-    CREATE TABLE countries (
+# Obtener datos de la API en streaming, país por país
+def stream_country_data(url=None, chunk_size=CHUNK_SIZE):
+    try:
+        chunks = cliente_http.fetch(url or BASE_URL, params={'fields': API_FIELDS}, chunk_size=chunk_size)
+    except requests.RequestException as e:
+        print(f"Error en la solicitud HTTP: {e}")
+        return
+    yield from iter_json_array(chunks)
+
+# Crear tabla de países con el esquema canónico
+def create_countries_table(cursor, table_name="countries"):
+    cursor.execute(f'''
+    CREATE TABLE {table_name} (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         cca3 TEXT UNIQUE,
         name_common TEXT,
@@ -54,13 +121,143 @@ def create_database():
         timezones TEXT,
         currencies TEXT,
         flag TEXT,
-        timestamp TEXT
+        timestamp TEXT,
+        content_hash TEXT,
+        deleted_at TEXT
+    )
+    ''')
+
+# Tablas relacionales derivadas de los campos JSON: nombre -> columnas (tras cca3)
+CHILD_TABLES = {
+    'country_languages': ['position INTEGER', 'iso_code TEXT', 'language_name TEXT'],
+    'country_currencies': ['position INTEGER', 'currency_code TEXT', 'currency_name TEXT', 'symbol TEXT'],
+    'country_timezones': ['position INTEGER', 'timezone TEXT'],
+    'country_capitals': ['position INTEGER', 'capital TEXT'],
+}
+
+# Índices secundarios además del índice por (cca3, position)
+CHILD_INDEXES = {
+    'country_languages': ['iso_code'],
+    'country_currencies': ['currency_code'],
+    'country_timezones': [],
+    'country_capitals': [],
+}
+
+# Crear las tablas relacionales (sin índices, se crean al final de la carga)
+def create_child_tables(cursor):
+    for table, columns in CHILD_TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (cca3 TEXT NOT NULL, {', '.join(columns)})")
+
+def create_child_indexes(cursor):
+    for table, extra_columns in CHILD_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_cca3 ON {table} (cca3, position)")
+        for column in extra_columns:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+# Extraer las filas de las tablas relacionales de un país
+def country_children(country_data):
+    cca3 = country_data.get('cca3')
+    languages = country_data.get('languages') or {}
+    currencies = country_data.get('currencies') or {}
+    return {
+        'country_languages': [
+            (cca3, i, code, name) for i, (code, name) in enumerate(languages.items())],
+        'country_currencies': [
+            (cca3, i, code, (info or {}).get('name'), (info or {}).get('symbol'))
+            for i, (code, info) in enumerate(currencies.items())],
+        'country_timezones': [
+            (cca3, i, tz) for i, tz in enumerate(country_data.get('timezones') or [])],
+        'country_capitals': [
+            (cca3, i, capital) for i, capital in enumerate(country_data.get('capital') or [])],
+    }
+
+def _insert_children(cursor, children_list):
+    for table, columns in CHILD_TABLES.items():
+        rows = [row for children in children_list for row in children[table]]
+        if rows:
+            placeholders = ", ".join("?" * (len(columns) + 1))
+            cursor.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+def _delete_children(cursor, cca3_list):
+    keys = [(cca3,) for cca3 in cca3_list]
+    for table in CHILD_TABLES:
+        cursor.executemany(f"DELETE FROM {table} WHERE cca3 = ?", keys)
+
+# Crear tabla con el conteo de cambios de cada ejecución
+def create_runs_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ingestion_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        mode TEXT,
+        inserted INTEGER,
+        updated INTEGER,
+        unchanged INTEGER,
+        deleted INTEGER,
+        rejected INTEGER,
+        seconds REAL
     )
     ''')
 
+# Registrar los conteos de una ejecución de ingesta
+def record_ingestion_run(cursor, mode, stats):
+    create_runs_table(cursor)
+    cursor.execute('''
+    INSERT INTO ingestion_runs (
+        timestamp, mode, inserted, updated, unchanged, deleted, rejected, seconds
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        datetime.now().isoformat(), mode, stats.get('inserted', 0), stats.get('updated', 0),
+        stats.get('unchanged', 0), stats.get('deleted', 0), stats.get('rejected', 0),
+        stats.get('seconds', 0.0)
+    ))
+
+# Crear base de datos y tabla
+def create_database():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='countries'")
+    table_exists = cursor.fetchone()[0] == 1
+
+    if table_exists:
+        print("Base de datos existente. Eliminando datos antiguos...")
+        cursor.execute('DROP TABLE IF EXISTS countries')
+    else:
+        print("Base de datos no existe. Creando nueva tabla...")
+
+    create_countries_table(cursor)
+    for table in CHILD_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    create_child_tables(cursor)
+    create_child_indexes(cursor)
+
     conn.commit()
     conn.close()
 
+# Hash del contenido almacenado de un país (sin el timestamp de ingesta)
+def content_hash(values):
+    canonical = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+# Convertir un país de la API en la tupla de columnas de la tabla
+def country_to_row(country_data, timestamp=None):
+    values = (
+        country_data.get('cca3'),
+        country_data.get('name', {}).get('common'),
+        country_data.get('name', {}).get('official'),
+        country_data.get('region'),
+        country_data.get('subregion'),
+        country_data.get('population'),
+        country_data.get('area'),
+        json.dumps(country_data.get('languages', {})),
+        json.dumps(country_data.get('capital', [])),
+        json.dumps(country_data.get('timezones', [])),
+        json.dumps(country_data.get('currencies', {})),
+        country_data.get('flags', {}).get('png')
+    )
+    return values + (timestamp or datetime.now().isoformat(), content_hash(values))
+
 # Insertar datos de país
 def insert_country_data(country_data):
     if not country_data:
@@ -69,27 +266,9 @@ def insert_country_data(country_data):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     try:
-        cursor.execute('''
-        INSERT INTO countries (
-            cca3, name_common, name_official, region, subregion,
-            population, area, languages, capital, timezones,
-            currencies, flag, timestamp
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            country_data.get('cca3'),
-            country_data.get('name', {}).get('common'),
-            country_data.get('name', {}).get('official'),
-            country_data.get('region'),
-            country_data.get('subregion'),
-            country_data.get('population'),
-            country_data.get('area'),
-            json.dumps(country_data.get('languages', {})),
-            json.dumps(country_data.get('capital', [])),
-            json.dumps(country_data.get('timezones', [])),
-            json.dumps(country_data.get('currencies', {})),
-            country_data.get('flags', {}).get('png'),
-            datetime.now().isoformat()
-        ))
+        cursor.execute(INSERT_SQL.format(table="countries"), country_to_row(country_data))
+        create_child_tables(cursor)
+        _insert_children(cursor, [country_children(country_data)])
         conn.commit()
         conn.close()
         return True
@@ -99,64 +278,394 @@ def insert_country_data(country_data):
         conn.close()
         return False
 
-# Obtener datos de la base de datos
-def get_db_data():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+# Insertar un lote con executemany; si falla, aislar las filas rechazadas una a una
+def _insert_batch(cursor, table_name, batch, stats):
+    sql = INSERT_SQL.format(table=table_name)
+    batch_start = time.perf_counter()
+    rejected = 0
+
+    cursor.execute("SAVEPOINT lote")
+    try:
+        cursor.executemany(sql, [row for row, _ in batch])
+        cursor.execute("RELEASE SAVEPOINT lote")
+        accepted = batch
+    except sqlite3.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT lote")
+        cursor.execute("RELEASE SAVEPOINT lote")
+        accepted = []
+        for row, children in batch:
+            try:
+                cursor.execute(sql, row)
+                accepted.append((row, children))
+            except sqlite3.Error as e:
+                print(f"Error al insertar datos ({row[0]}): {e}")
+                rejected += 1
+
+    # Las relaciones solo se escriben para los países aceptados
+    _insert_children(cursor, [children for _, children in accepted])
+    inserted = len(accepted)
+
+    elapsed = time.perf_counter() - batch_start
+    stats['batches'] += 1
+    stats['inserted'] += inserted
+    stats['rejected'] += rejected
+    rate = inserted / elapsed if elapsed > 0 else 0
+    print(f"  - Lote {stats['batches']}: {inserted} filas ({rate:,.0f} filas/s)")
+
+# Carga masiva: tabla de staging, lotes con executemany y una única transacción
+def bulk_insert_country_data(countries, batch_size=BATCH_SIZE):
+    staging_table = "countries_staging"
+    timestamp = datetime.now().isoformat()
+    stats = {'inserted': 0, 'rejected': 0, 'batches': 0, 'seconds': 0.0}
+
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
     cursor = conn.cursor()
+    start = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        create_countries_table(cursor, staging_table)
+        for table in CHILD_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        create_child_tables(cursor)
 
-    cursor.execute('''
-    SELECT cca3, name_common, region, population, area 
-    FROM countries
-    ''')
+        batch = []
+        for country in countries:
+            if not country:
+                continue
+            batch.append((country_to_row(country, timestamp), country_children(country)))
+            if len(batch) >= batch_size:
+                _insert_batch(cursor, staging_table, batch, stats)
+                batch = []
+        if batch:
+            _insert_batch(cursor, staging_table, batch, stats)
+
+        # Intercambio atómico: dentro de la misma transacción
+        cursor.execute("DROP TABLE IF EXISTS countries")
+        cursor.execute(f"ALTER TABLE {staging_table} RENAME TO countries")
+        create_child_indexes(cursor)
+        stats['seconds'] = time.perf_counter() - start
+        record_ingestion_run(cursor, "full", stats)
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
-    rows = cursor.fetchall()
-    result = [dict(row) for row in rows]
+    rate = stats['inserted'] / stats['seconds'] if stats['seconds'] > 0 else 0
+    print(f"Carga masiva completada: {stats['inserted']} registros insertados, "
+          f"{stats['rejected']} rechazados en {stats['batches']} lotes ({rate:,.0f} filas/s)")
+    return stats
 
-    conn.close()
-    return result
+# Verificar que la tabla existente admite la ingesta incremental
+def supports_delta(cursor):
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(countries)")}
+    if not {'cca3', 'content_hash', 'deleted_at'} <= columns:
+        return False
+
+    # Las tablas relacionales deben existir para mantenerlas al día
+    tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if not set(CHILD_TABLES) <= tables:
+        return False
+
+    # La tabla debe conservar la restricción UNIQUE sobre cca3
+    for index in cursor.execute("PRAGMA index_list(countries)").fetchall():
+        if index[2]:
+            index_columns = [row[2] for row in cursor.execute(f"PRAGMA index_info('{index[1]}')")]
+            if index_columns == ['cca3']:
+                return True
+    return False
+
+def _flush_delta(cursor, inserts, updates):
+    if inserts:
+        cursor.executemany(INSERT_SQL.format(table="countries"), [row for row, _ in inserts])
+        _insert_children(cursor, [children for _, children in inserts])
+        inserts.clear()
+    if updates:
+        cursor.executemany(UPDATE_SQL, [row[1:] + (row[0],) for row, _ in updates])
+        _delete_children(cursor, [row[0] for row, _ in updates])
+        _insert_children(cursor, [children for _, children in updates])
+        updates.clear()
+
+# Ingesta incremental: solo se escriben las filas nuevas, modificadas o eliminadas.
+# fetch_stats es el resumen de la descarga concurrente: si se perdió alguna parte no hay borrado lógico
+def upsert_country_data(countries, batch_size=BATCH_SIZE, fetch_stats=None):
+    timestamp = datetime.now().isoformat()
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'rejected': 0, 'seconds': 0.0}
+
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        if not supports_delta(cursor):
+            cursor.execute("ROLLBACK")
+            conn.close()
+            print("La tabla 'countries' no admite ingesta incremental. Realizando recarga completa...")
+            return bulk_insert_country_data(countries, batch_size)
+
+        # Índice en memoria cca3 -> (hash, eliminado) del estado almacenado
+        stored = {
+            cca3: (stored_hash, deleted_at is not None)
+            for cca3, stored_hash, deleted_at in cursor.execute(
+                "SELECT cca3, content_hash, deleted_at FROM countries WHERE cca3 IS NOT NULL")
+        }
+        seen = set()
+        inserts = []
+        updates = []
+
+        for country in countries:
+            if not country:
+                continue
+            row = country_to_row(country, timestamp)
+            cca3 = row[0]
+            if cca3 is None or cca3 in seen:
+                print(f"Error al insertar datos ({cca3}): registro sin cca3 o repetido en la API")
+                stats['rejected'] += 1
+                continue
+            seen.add(cca3)
+
+            previous = stored.get(cca3)
+            if previous is None:
+                inserts.append((row, country_children(country)))
+                stats['inserted'] += 1
+            elif previous[0] != row[-1] or previous[1]:
+                updates.append((row, country_children(country)))
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+
+            if len(inserts) + len(updates) >= batch_size:
+                _flush_delta(cursor, inserts, updates)
+        _flush_delta(cursor, inserts, updates)
+
+        # Borrado lógico de los países que ya no publica la API
+        removed = [(timestamp, cca3) for cca3, (_, deleted) in stored.items()
+                   if cca3 not in seen and not deleted]
+        if not seen and removed:
+            print("No se recibieron países de la API. Se omite el borrado lógico.")
+            removed = []
+        elif fetch_stats and (fetch_stats.get('failed') or fetch_stats.get('incomplete')) and removed:
+            print("La descarga quedó incompleta. Se omite el borrado lógico.")
+            removed = []
+        cursor.executemany("UPDATE countries SET deleted_at = ? WHERE cca3 = ?", removed)
+        stats['deleted'] = len(removed)
+
+        stats['seconds'] = time.perf_counter() - start
+        record_ingestion_run(cursor, "delta", stats)
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    print(f"Ingesta incremental completada en {stats['seconds']:.2f}s: {stats['inserted']} insertados, "
+          f"{stats['updated']} actualizados, {stats['unchanged']} sin cambios, "
+          f"{stats['deleted']} eliminados, {stats['rejected']} rechazados")
+    return stats
+
+# Contar los países vigentes en la base de datos
+def count_db_records():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM countries WHERE deleted_at IS NULL").fetchone()[0]
+    finally:
+        conn.close()
 
 # Generar Excel
 def generate_excel_sample():
     conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT cca3, name_common, region, population, area FROM countries", conn)
-    conn.close()
-    df.to_excel(EXCEL_PATH, index=False)
-
-# Generar archivo de auditoría
-def generate_audit_file(api_data, db_data, was_reset):
-    with open(AUDIT_PATH, 'w') as f:
-        f.write("INFORME DE AUDITORÍA DE INGESTIÓN DE DATOS\n")
-        f.write("=========================================\n\n")
-        f.write(f"Fecha y hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-
-        f.write("1. RESUMEN DE INGESTIÓN\n")
-        f.write("----------------------\n")
-        if was_reset:
-            f.write("Estado: La base de datos EXISTENTE fue eliminada y recreada.\n")
-        else:
-            f.write("Estado: La base de datos fue creada por primera vez.\n")
-        f.write(f"Total de registros consultados en API: {len(api_data)}\n")
-        f.write(f"Total de registros almacenados en BD: {len(db_data)}\n\n")
-
-        f.write("2. COMPARACIÓN DETALLADA\n")
-        f.write("------------------------\n")
-
-        for country in api_data:
-            country_name = country.get('name', {}).get('common')
-            f.write(f"\nPaís: {country_name}\n")
-            db_country = next((c for c in db_data if c['cca3'] == country.get('cca3')), None)
-            if db_country:
-                f.write("  - ESTADO: Almacenado correctamente en BD\n")
-                if country.get('name', {}).get('common') == db_country['name_common']:
-                    f.write("  - Nombre común: Coincide\n")
-                if country.get('region') == db_country['region']:
-                    f.write("  - Región: Coincide\n")
-                if country.get('population') == db_country['population']:
-                    f.write("  - Población: Coincide\n")
+    try:
+        # Lectura y escritura por lotes: la muestra nunca está completa en memoria
+        batches = pd.read_sql_query(
+            "SELECT cca3, name_common, region, population, area FROM countries WHERE deleted_at IS NULL", conn,
+            chunksize=exportacion.EXCEL_BATCH_SIZE)
+        return exportacion.write_excel(batches, EXCEL_PATH)
+    finally:
+        conn.close()
+
+# Proyecciones de la API para la auditoría: se guardan por lotes en un SQLite temporal
+# en lugar de una lista, así la memoria de la ingesta no crece con la cantidad de países
+def create_audit_spool():
+    """Crea el archivo temporal (junto a la BD) con la tabla api_audit; devuelve su ruta"""
+    fd, path = tempfile.mkstemp(prefix="audit_spool_", suffix=".db", dir=os.path.dirname(DB_PATH) or ".")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"CREATE TABLE api_audit (seq INTEGER PRIMARY KEY, {', '.join(STORED_FIELDS)})")
+    finally:
+        conn.close()
+    return path
+
+def spool_projections(countries, spool_path, batch_size=BATCH_SIZE):
+    """Deja pasar los países hacia el cargador y guarda en el spool los campos que compara la auditoría"""
+    insert = (f"INSERT INTO api_audit ({', '.join(STORED_FIELDS)}) "
+              f"VALUES ({', '.join('?' for _ in STORED_FIELDS)})")
+    conn = sqlite3.connect(spool_path)
+    try:
+        batch = []
+        for country in countries:
+            batch.append(audit_projection(country))
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                conn.commit()
+                batch = []
+            yield country
+        if batch:
+            conn.executemany(insert, batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+def count_spooled(spool_path):
+    conn = sqlite3.connect(spool_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM api_audit").fetchone()[0]
+    finally:
+        conn.close()
+
+# Generar archivo de auditoría a partir de la reconciliación API vs BD, hecha en SQLite sobre el spool
+def generate_audit_file(spool_path, was_reset, load_stats=None, fetch_stats=None):
+    conn = sqlite3.connect(spool_path)
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS api_audit_cca3 ON api_audit (cca3, seq)")
+        conn.execute("ATTACH DATABASE ? AS stored", (DB_PATH,))
+        tables = (conn, "api_audit", "stored.countries")
+        db_filter = "d.deleted_at IS NULL"
+        summary = reconciliacion.table_summary(*tables, STORED_FIELDS, db_filter=db_filter)
+        events = audit_events(summary,
+                              reconciliacion.iter_table_pairs(*tables, STORED_FIELDS, db_filter=db_filter),
+                              reconciliacion.iter_table_extra(*tables, db_filter=db_filter, columns=['name_common']),
+                              was_reset, load_stats, fetch_stats)
+        auditoria.stream_report(events, iter_audit_report, AUDIT_PATH)
+    finally:
+        conn.close()
+    return summary
+
+def audit_events(summary, pairs, extra, was_reset, load_stats=None, fetch_stats=None):
+    """Eventos de auditoría de la ingesta: resumen de la ejecución y estado de cada país, uno a la vez"""
+    if load_stats and 'updated' in load_stats:
+        status = 'incremental'
+    else:
+        status = 'reset' if was_reset else 'created'
+    yield auditoria.record(
+        'ingestion', 'run', status=status,
+        load_stats={key: load_stats[key] for key in ('inserted', 'updated', 'unchanged', 'deleted')}
+        if status == 'incremental' else None,
+        api_records=summary['api_records'], db_records=summary['db_records'],
+        matched=summary['matched'], mismatched=summary['mismatched'],
+        missing=summary['missing'], extra=summary['extra'],
+        api_duplicates=summary['api_duplicates'], fields=summary['fields'],
+        fetch={key: fetch_stats[key] for key in ('parts', 'retries', 'first_country_seconds', 'failed', 'incomplete')}
+        if fetch_stats else None,
+    )
+
+    for cca3, country, differences in pairs:
+        yield auditoria.record(
+            'ingestion', 'country', cca3, name=country.get('name_common'),
+            status='missing' if differences is None else 'stored',
+            differences=differences or {})
+    for cca3, stored in extra:
+        yield auditoria.record('ingestion', 'extra_country', cca3, name=stored.get('name_common'))
+
+def render_audit_report(events):
+    """Texto del informe de auditoría de la ingesta a partir de sus eventos"""
+    return "\n".join(iter_audit_report(events)) + "\n"
+
+def iter_audit_report(events):
+    """Líneas del informe en una sola pasada sobre los eventos, en el orden en que se registran (run primero)"""
+    events = iter(events)
+    run = next(events)
+    lines = [
+        "INFORME DE AUDITORÍA DE INGESTIÓN DE DATOS",
+        "=========================================",
+        "",
+        f"Fecha y hora: {auditoria.report_timestamp(run)}",
+        "",
+        "1. RESUMEN DE INGESTIÓN",
+        "----------------------",
+    ]
+    if run['status'] == 'incremental':
+        lines += [
+            "Estado: Ingesta incremental sobre la base de datos EXISTENTE.",
+            f"  - Insertados: {run['load_stats']['inserted']}",
+            f"  - Actualizados: {run['load_stats']['updated']}",
+            f"  - Sin cambios: {run['load_stats']['unchanged']}",
+            f"  - Eliminados (borrado lógico): {run['load_stats']['deleted']}",
+        ]
+    elif run['status'] == 'reset':
+        lines.append("Estado: La base de datos EXISTENTE fue eliminada y recreada.")
+    else:
+        lines.append("Estado: La base de datos fue creada por primera vez.")
+    lines += [
+        f"Total de registros consultados en API: {run['api_records']}",
+        f"Total de registros almacenados en BD: {run['db_records']}",
+        f"Registros coincidentes en todos los campos: {run['matched']}",
+        f"Registros con diferencias: {run['mismatched']}",
+        f"Registros de la API faltantes en BD: {run['missing']}",
+        f"Registros en BD ausentes en la API: {run['extra']}",
+    ]
+    if run['api_duplicates']:
+        lines.append(f"Claves repetidas en la API: {run['api_duplicates']}")
+    fetch = run['fetch']
+    if fetch:
+        lines.append(f"Descarga concurrente: {fetch['parts']} partes, {fetch['retries']} reintentos, "
+                     f"primer país a los {fetch['first_country_seconds'] or 0:.2f}s")
+        if fetch['failed'] or fetch['incomplete']:
+            lines.append(f"  - Partes perdidas: {', '.join(fetch['failed']) or 'ninguna'}; "
+                         f"países incompletos no cargados: {fetch['incomplete']}")
+    lines += ["", "2. COMPARACIÓN DETALLADA", "------------------------", f"Campos comparados: {', '.join(run['fields'])}"]
+    yield from lines
+
+    extra_header = ["", "3. REGISTROS EN BD AUSENTES EN LA API", "-------------------------------------"]
+    extra_found = False
+    for item in events:
+        if item['event'] == 'extra_country':
+            if not extra_found:
+                yield from extra_header
+                extra_found = True
+            yield f"  - {item['entity']}: {item['name']}"
+            continue
+        if item['event'] != 'country':
+            continue
+        yield ""
+        yield f"País: {item['name']}"
+        if item['status'] == 'missing':
+            yield "  - ESTADO: No encontrado en BD"
+            continue
+        yield "  - ESTADO: Almacenado correctamente en BD"
+        if not item['differences']:
+            yield "  - Todos los campos coinciden"
+            continue
+        for field, values in item['differences'].items():
+            yield f"  - {field}: Diferente (API: {values['api']!r}, BD: {values['db']!r})"
+
+    if not extra_found:
+        yield from extra_header
+        yield "  No hay registros sobrantes."
+
+# Conservar los campos almacenados que compara la auditoría
+def audit_projection(country_data):
+    return country_to_row(country_data)[:len(STORED_FIELDS)]
 
 # Función principal
-def main():
+def ensure_output_dirs():
+    """Crea los directorios de salida al ejecutar la etapa (no al importar el módulo)"""
+    for path in (DB_PATH, EXCEL_PATH, AUDIT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+def main(mode=None):
+    mode = mode or LOAD_MODE
+    ensure_output_dirs()
+    with instrumentacion.span("ingestion", mode=mode) as stage_span:
+        stage_span['rows_out'] = run(mode)
+
+# Pasos de la ingesta; devuelve la cantidad de registros vigentes en la BD
+def run(mode):
     print("Iniciando proceso de ingestión de datos...")
 
     conn = sqlite3.connect(DB_PATH)
@@ -165,22 +674,48 @@ def main():
     was_reset = cursor.fetchone()[0] == 1
     conn.close()
 
-    create_database()
-    api_data = get_country_data()
-    if api_data:
-        for country in api_data:
-            insert_country_data(country)
+    # Los países pasan del cuerpo HTTP al cargador sin materializar la lista completa;
+    # lo que compara la auditoría queda en el spool, no en memoria
+    fetch_stats = {}
+    if FETCH_MODE == "concurrent":
+        from . import descarga_concurrente
+        source = descarga_concurrente.iter_countries(stats=fetch_stats)
+    else:
+        source = stream_country_data()
+
+    spool_path = create_audit_spool()
+    try:
+        # El span de carga incluye la descarga, que se consume mientras se inserta
+        with instrumentacion.span("ingestion.fetch_and_load", mode=mode) as load_span:
+            countries = spool_projections(source, spool_path)
+            if mode == "delta" and was_reset:
+                load_stats = upsert_country_data(countries, fetch_stats=fetch_stats)
+            else:
+                load_stats = bulk_insert_country_data(countries)
+            api_records = count_spooled(spool_path)
+            load_span['rows_in'] = api_records
+            load_span['rows_out'] = load_stats['inserted'] + load_stats.get('updated', 0)
 
-    db_data = get_db_data()
-    generate_excel_sample()
-    generate_audit_file(api_data, db_data, was_reset)
+        db_records = count_db_records()
+        # La muestra en Excel y la auditoría son independientes: se escriben a la vez
+        exportacion.run_outputs([
+            ("ingestion.to_excel", db_records, generate_excel_sample),
+            ("ingestion.audit_file", api_records,
+             lambda: generate_audit_file(spool_path, was_reset, load_stats, fetch_stats)),
+        ])
+    finally:
+        os.remove(spool_path)
 
-    if was_reset:
+    if 'updated' in load_stats:
+        print("Base de datos actualizada de forma incremental.")
+    elif was_reset:
         print("Base de datos eliminada y recreada. Nuevos datos insertados.")
     else:
         print("Base de datos creada por primera vez. Datos insertados correctamente.")
 
     print("Proceso de ingestión completado.")
+    return db_records
 
 if __name__ == "__main__":
-    main()
+    # python -m pipeline_paises.ingestion [delta|full]: modo de esta ejecución
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
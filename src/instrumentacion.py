@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+from datetime import datetime
+from . import rutas
+
+# Configuración: se controla con variables de entorno, sin tocar el código de las etapas
+METRICS_PATH = os.environ.get("PIPELINE_METRICS_PATH", rutas.output("auditoria", "metrics.jsonl"))
+PROFILE_DIR = rutas.output("auditoria", "perfiles")
+ENABLED = os.environ.get("PIPELINE_METRICS", "1") != "0"
+PROFILE_SPANS = {name for name in os.environ.get("PIPELINE_PROFILE", "").split(",") if name}  # cProfile
+TRACEMALLOC_SPANS = {name for name in os.environ.get("PIPELINE_TRACEMALLOC", "").split(",") if name}
+RUN_ID = os.environ.get("PIPELINE_RUN_ID") or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+
+_lock = threading.Lock()
+_local = threading.local()
+_profiling = False
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def current_span():
+    """Nombre del span activo en este hilo, para colgar de él los spans de otros hilos"""
+    stack = _stack()
+    return stack[-1]['span'] if stack else None
+
+def current_rss_mb():
+    """RSS actual del proceso; en Linux se lee de /proc, en otros sistemas se usa el pico"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _selected(name, names):
+    return "*" in names or name in names
+
+def emit(record, path=None):
+    """Agrega un registro al archivo de métricas en formato JSON lines"""
+    path = path or METRICS_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+@contextlib.contextmanager
+def span(name, rows_in=None, **attributes):
+    """Mide un bloque: duración, filas de entrada y salida y variación de memoria.
+
+    El bloque puede completar el registro con span['rows_out'] u otros campos.
+    """
+    if not ENABLED:
+        yield {}
+        return
+
+    global _profiling
+    stack = _stack()
+    record = {
+        'run_id': RUN_ID,
+        'span': name,
+        'parent': stack[-1]['span'] if stack else None,
+        'started_at': datetime.now().isoformat(),
+        'rows_in': rows_in,
+        'rows_out': None,
+        **attributes,
+    }
+    stack.append(record)
+
+    # Captura opcional: un solo cProfile activo a la vez; tracemalloc se reutiliza si ya está activo
+    profiler = None
+    if _selected(name, PROFILE_SPANS) and not _profiling:
+        profiler = cProfile.Profile()
+        _profiling = True
+    started_tracing = False
+    if _selected(name, TRACEMALLOC_SPANS):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+            started_tracing = True
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+        record['status'] = 'ok'
+    except BaseException as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            _profiling = False
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        rss_after = current_rss_mb()
+        record['rss_mb'] = round(rss_after, 1)
+        record['rss_delta_mb'] = round(rss_after - rss_before, 1)
+
+        if _selected(name, TRACEMALLOC_SPANS):
+            record['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            if started_tracing:
+                tracemalloc.stop()
+        if profiler:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            record['profile'] = os.path.join(PROFILE_DIR, f"{RUN_ID}_{name}.prof")
+            profiler.dump_stats(record['profile'])
+
+        stack.pop()
+        emit(record)
+
+def load_metrics(path=None, run_id=None):
+    """Lee el archivo de métricas, opcionalmente filtrado por ejecución"""
+    path = path or METRICS_PATH
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if run_id is None or record['run_id'] == run_id]
+
+def summarize(run_id=None, path=None):
+    """Imprime los spans de una ejecución (por defecto la última), ordenados por duración"""
+    records = load_metrics(path)
+    if not records:
+        print("No hay métricas registradas.")
+        return []
+    run_id = run_id or records[-1]['run_id']
+    records = sorted((r for r in records if r['run_id'] == run_id),
+                     key=lambda r: r.get('seconds') or 0, reverse=True)
+
+    print(f"Ejecución {run_id}: {len(records)} spans")
+    for record in records:
+        rows = f"{record.get('rows_in') if record.get('rows_in') is not None else '-'} -> " \
+               f"{record.get('rows_out') if record.get('rows_out') is not None else '-'}"
+        extra = f"caché {record['cache']}" if 'cache' in record else \
+            f"memoria {record.get('rss_delta_mb', 0):+.1f} MB"
+        print(f"  {record['span']:<32} {record.get('seconds') or 0:>9.3f}s  filas {rows:<16} {extra}")
+    return records
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,100 @@
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+
+# Versión del esquema de los archivos intermedios entre etapas.
+# Se incrementa cuando cambian las columnas o sus tipos.
+SCHEMA_VERSION = 1
+METADATA_KEY = b"pipeline_handoff"
+
+def write_stage_output(df, path, stage):
+    """Guarda un DataFrame intermedio en Parquet o Feather con la versión del esquema"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'schema_version': SCHEMA_VERSION, 'stage': stage}).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    # Escritura atómica: la etapa siguiente nunca ve un archivo a medio escribir
+    tmp_path = path + ".tmp"
+    if path.endswith(".parquet"):
+        pq.write_table(table, tmp_path, compression="snappy")
+    else:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+def read_stage_metadata(path):
+    """Lee la metadata del archivo intermedio sin cargar los datos"""
+    if path.endswith(".parquet"):
+        schema = pq.read_schema(path)
+    else:
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else {}
+
+def read_stage_output(path, columns=None):
+    """Carga un archivo intermedio validando la versión del esquema, opcionalmente solo algunas columnas"""
+    metadata = read_stage_metadata(path)
+    version = metadata.get('schema_version')
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Versión de esquema incompatible en {path}: {version} (se esperaba {SCHEMA_VERSION})")
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    # Feather sin compresión se lee con memory map
+    return feather.read_feather(path, columns=columns, memory_map=True)
+
+def iter_stage_batches(path, batch_size, columns=None):
+    """Recorre un archivo intermedio en DataFrames de hasta batch_size filas, sin cargarlo completo"""
+    metadata = read_stage_metadata(path)
+    version = metadata.get('schema_version')
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Versión de esquema incompatible en {path}: {version} (se esperaba {SCHEMA_VERSION})")
+
+    if path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(path)
+        schema = parquet_file.schema_arrow
+        batches = parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        schema = table.schema
+        batches = table.to_batches(max_chunksize=batch_size)
+    if columns is not None:
+        schema = pa.schema([schema.field(col) for col in columns], metadata=schema.metadata)
+
+    empty = True
+    for batch in batches:
+        empty = False
+        # La metadata de pandas del esquema conserva los tipos (categorías, enteros reducidos)
+        yield pa.Table.from_batches([batch], schema=schema).to_pandas()
+    if empty:
+        yield schema.empty_table().to_pandas()
+
+def write_stage_chunks(chunks, path, stage):
+    """Escribe un archivo Parquet intermedio bloque a bloque, sin reunir todo el DataFrame"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                metadata = dict(table.schema.metadata or {})
+                metadata[METADATA_KEY] = json.dumps({'schema_version': SCHEMA_VERSION, 'stage': stage}).encode("utf-8")
+                schema = table.schema.with_metadata(metadata)
+                writer = pq.ParquetWriter(tmp_path, schema, compression="snappy")
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError("No se recibió ningún bloque para escribir")
+    os.replace(tmp_path, path)
+    return rows
@@ -0,0 +1,282 @@
+import os
+import sqlite3
+import tempfile
+import numpy as np
+import pandas as pd
+from . import intercambio
+from . import metricas
+
+# Configuración
+MEMORY_BUDGET_MB = 256  # Memoria objetivo para cada bloque durante la limpieza
+WORKING_COPIES = 4  # Copias simultáneas estimadas de un bloque mientras se limpia
+MIN_CHUNK_ROWS = 1000
+SAMPLE_ROWS = 1000  # Filas leídas para estimar el tamaño de cada registro
+MEDIAN_METHOD = "exact"  # "exact": segunda pasada con los valores en disco; "approx": muestra de tamaño fijo
+APPROX_SAMPLE_SIZE = 100_000
+SEED = 0
+
+CRITICAL_COLS = ['cca3', 'name_common', 'name_official']
+JSON_COLS = ['languages', 'capital', 'timezones', 'currencies']
+NUMERIC_SQL_TYPES = ('INT', 'REAL', 'FLOA', 'DOUB', 'NUM')
+
+def chunk_rows_for_budget(conn, query, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Estima cuántas filas caben en un bloque según el presupuesto de memoria"""
+    sample = pd.read_sql_query(f"SELECT * FROM ({query}) LIMIT {SAMPLE_ROWS}", conn)
+    if sample.empty:
+        return MIN_CHUNK_ROWS
+    bytes_per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+    rows = int(memory_budget_mb * 1024 * 1024 / (bytes_per_row * WORKING_COPIES))
+    return max(MIN_CHUNK_ROWS, rows)
+
+def _numeric_columns(conn, table="countries"):
+    """Columnas declaradas como numéricas en SQLite"""
+    numeric = set()
+    for _, name, declared_type, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        if declared_type and declared_type.upper().startswith(NUMERIC_SQL_TYPES):
+            numeric.add(name)
+    return numeric
+
+def _iter_chunks(db_path, query, chunk_rows):
+    conn = sqlite3.connect(db_path)
+    try:
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunk_rows):
+            yield chunk
+    finally:
+        conn.close()
+
+def _row_digests(chunk, numeric):
+    """Huella de 64 bits por fila, con las columnas numéricas normalizadas a float64"""
+    # Así 30 y 30.0 coinciden entre bloques con distinto dtype, igual que en drop_duplicates
+    normalized = chunk.copy()
+    for col in normalized.columns:
+        if col in numeric:
+            normalized[col] = pd.to_numeric(normalized[col], errors='coerce').astype('float64')
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+def _drop_seen(chunk, seen, numeric):
+    """Elimina las filas cuya huella ya apareció en este bloque o en bloques anteriores"""
+    digests = _row_digests(chunk, numeric)
+    new = np.empty(len(digests), dtype=bool)
+    for i, digest in enumerate(digests.tolist()):
+        new[i] = digest not in seen
+        seen.add(digest)
+    return chunk[new]
+
+def _progressive_masks(chunk):
+    """Recorre las columnas en orden como clean_transform_data, con las filas vigentes y los nulos de cada una"""
+    # Las filas con nulos en columnas críticas dejan de contar para las columnas siguientes
+    kept = np.ones(len(chunk), dtype=bool)
+    for col in chunk.columns:
+        nulls = chunk[col].isnull().to_numpy()
+        yield col, kept.copy(), nulls
+        if col in CRITICAL_COLS:
+            kept &= ~nulls
+
+def _reservoir(current, values, rng, size):
+    """Muestra uniforme de tamaño fijo: conserva los valores con las claves aleatorias más pequeñas"""
+    keys = rng.random(len(values))
+    merged_values = np.concatenate([current[0], values])
+    merged_keys = np.concatenate([current[1], keys])
+    if len(merged_keys) > size:
+        keep = np.argpartition(merged_keys, size)[:size]
+        merged_values, merged_keys = merged_values[keep], merged_keys[keep]
+    return merged_values, merged_keys
+
+def profile_pass(db_path, query, chunk_rows, numeric):
+    """Primera pasada: conteos de nulos, duplicados y filas descartadas, sin retener datos"""
+    stats = {
+        'total_records': 0,
+        'duplicates': 0,
+        'raw_nulls': {},
+        'null_counts': {},
+        'has_values': set(),
+        'columns': None,
+    }
+    seen = set()
+    for chunk in _iter_chunks(db_path, query, chunk_rows):
+        if stats['columns'] is None:
+            stats['columns'] = list(chunk.columns)
+            stats['raw_nulls'] = {col: 0 for col in chunk.columns}
+            stats['null_counts'] = {col: 0 for col in chunk.columns}
+        stats['total_records'] += len(chunk)
+        for col, count in chunk.isnull().sum().items():
+            stats['raw_nulls'][col] += int(count)
+
+        unique = _drop_seen(chunk, seen, numeric)
+        stats['duplicates'] += len(chunk) - len(unique)
+        for col, kept, nulls in _progressive_masks(unique):
+            stats['null_counts'][col] += int((kept & nulls).sum())
+            if (~nulls).any():
+                stats['has_values'].add(col)
+    return stats
+
+def _spooled_median(spool, table):
+    """Mediana exacta de una tabla de valores: SQLite ordena en disco lo que no cabe en su caché"""
+    count = spool.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    if count == 0:
+        return np.nan
+    # Uno o dos valores centrales, igual que np.median
+    middle = [value for (value,) in spool.execute(
+        f"SELECT value FROM {table} ORDER BY value LIMIT ? OFFSET ?", (2 - count % 2, (count - 1) // 2))]
+    return float(np.mean(middle))
+
+def median_pass(db_path, query, chunk_rows, numeric, columns, method=MEDIAN_METHOD):
+    """Segunda pasada: medianas de las columnas numéricas con nulos, exactas o aproximadas.
+
+    Las exactas no reúnen los valores en memoria: cada bloque los agrega a una base SQLite temporal
+    junto a db_path, y la mediana se selecciona ordenando en disco.
+    """
+    if not columns:
+        return {}
+    rng = np.random.default_rng(SEED)
+    reservoirs = {col: (np.empty(0), np.empty(0)) for col in columns}
+    tables = {col: f"median_{i}" for i, col in enumerate(columns)}
+    seen = set()
+
+    spool = None
+    if method != "approx":
+        fd, spool_path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(db_path)))
+        os.close(fd)
+        spool = sqlite3.connect(spool_path)
+        for table in tables.values():
+            spool.execute(f"CREATE TABLE {table} (value REAL)")
+    try:
+        for chunk in _iter_chunks(db_path, query, chunk_rows):
+            unique = _drop_seen(chunk, seen, numeric)
+            for col, kept, nulls in _progressive_masks(unique):
+                if col not in columns:
+                    continue
+                values = pd.to_numeric(unique[col], errors='coerce').to_numpy(dtype='float64')[kept & ~nulls]
+                if method == "approx":
+                    reservoirs[col] = _reservoir(reservoirs[col], values, rng, APPROX_SAMPLE_SIZE)
+                else:
+                    # SQLite guarda NaN como NULL; la mediana de pandas también los omite
+                    spool.executemany(f"INSERT INTO {tables[col]} VALUES (?)",
+                                      ((value,) for value in values[~np.isnan(values)].tolist()))
+
+        if method == "approx":
+            return {col: float(np.median(values)) if len(values) else np.nan
+                    for col, (values, _) in reservoirs.items()}
+        spool.commit()
+        return {col: _spooled_median(spool, table) for col, table in tables.items()}
+    finally:
+        if spool is not None:
+            spool.close()
+            os.remove(spool_path)
+
+def _clean_chunks(db_path, query, chunk_rows, numeric, plan, cleaning_stats, sample):
+    """Tercera pasada: aplica el plan de limpieza a cada bloque y lo entrega ya limpio"""
+    seen = set()
+    text_cols = None
+    columns = None
+
+    for chunk in _iter_chunks(db_path, query, chunk_rows):
+        columns = list(chunk.columns)
+        cleaned = _drop_seen(chunk, seen, numeric)
+
+        # Nulos: descartar filas con nulos críticos e imputar el resto según el plan
+        kept = np.ones(len(cleaned), dtype=bool)
+        for col in CRITICAL_COLS:
+            if col in cleaned.columns:
+                kept &= cleaned[col].notnull().to_numpy()
+        cleaned = cleaned[kept].copy()
+        for col, fill_value in plan['fills'].items():
+            cleaned[col] = cleaned[col].fillna(fill_value)
+            if col in plan['numeric_fills']:
+                cleaned[col] = pd.to_numeric(cleaned[col])
+
+        if cleaned.empty:
+            continue
+
+        # Tipos de datos
+        if 'population' in cleaned.columns:
+            if cleaned['population'].dtype != 'int64':
+                cleaned['population'] = cleaned['population'].astype('int64')
+                cleaning_stats['type_corrections']['population'] = 'Convertido a entero'
+        if 'area' in cleaned.columns:
+            if cleaned['area'].dtype != 'float64':
+                cleaned['area'] = cleaned['area'].astype('float64')
+                cleaning_stats['type_corrections']['area'] = 'Convertido a float'
+
+        # Texto: las columnas a normalizar se deciden con la primera fila limpia, como en memoria
+        if text_cols is None:
+            text_cols = [
+                col for col in cleaned.select_dtypes(include=['object']).columns
+                if col not in JSON_COLS and isinstance(cleaned[col].iloc[0], str)
+            ]
+            for col in text_cols:
+                cleaning_stats['text_transformations'][col] = 'Eliminados espacios en blanco innecesarios'
+        for col in text_cols:
+            cleaned[col] = cleaned[col].str.strip()
+
+        metricas.add_metrics(cleaned, ['population_density'])
+
+        cleaning_stats['final_records'] += len(cleaned)
+        if sum(map(len, sample)) < 5:
+            sample.append(cleaned.head(5 - sum(map(len, sample))))
+        yield cleaned
+
+    # Sin filas limpias se escribe igualmente un archivo vacío con las columnas
+    if cleaning_stats['final_records'] == 0:
+        yield pd.DataFrame(columns=columns or [])
+
+def clean_in_chunks(db_path, query, output_path, memory_budget_mb=MEMORY_BUDGET_MB, method=MEDIAN_METHOD,
+                    table="countries"):
+    """Limpia countries por bloques; devuelve las mismas estadísticas que el modo en memoria y una muestra"""
+    print("\n=== LIMPIEZA POR BLOQUES ===")
+    conn = sqlite3.connect(db_path)
+    chunk_rows = chunk_rows_for_budget(conn, query, memory_budget_mb)
+    numeric = _numeric_columns(conn, table)
+    conn.close()
+    print(f"Presupuesto de memoria: {memory_budget_mb} MB -> bloques de {chunk_rows} filas")
+
+    # 1. Perfilado: nulos, duplicados y columnas a imputar
+    profile = profile_pass(db_path, query, chunk_rows, numeric)
+    numeric_present = {col for col in numeric if col in profile['has_values']}
+    print(f"  - {profile['total_records']} registros, {profile['duplicates']} duplicados")
+
+    analysis_results = {
+        "total_records": profile['total_records'],
+        "duplicates": profile['duplicates'],
+        "null_values": profile['raw_nulls'],
+        "outliers": {}
+    }
+
+    null_operations = {}
+    to_impute = []
+    for col in profile['columns'] or []:
+        null_count = profile['null_counts'][col]
+        if null_count == 0:
+            continue
+        if col in CRITICAL_COLS:
+            null_operations[col] = f"Eliminadas {null_count} filas con valores nulos"
+        elif col in numeric_present:
+            to_impute.append(col)
+            null_operations[col] = f"Imputados {null_count} valores nulos con la mediana"
+        else:
+            null_operations[col] = f"Imputados {null_count} valores nulos con 'Unknown'"
+
+    # 2. Medianas para las columnas numéricas con nulos
+    medians = median_pass(db_path, query, chunk_rows, numeric, to_impute, method)
+    plan = {
+        'fills': {col: medians.get(col, "Unknown") for col in null_operations if col not in CRITICAL_COLS},
+        'numeric_fills': set(to_impute),
+    }
+
+    # 3. Limpieza y escritura incremental
+    cleaning_stats = {
+        'initial_records': profile['total_records'],
+        'final_records': 0,
+        'duplicates_removed': profile['duplicates'],
+        'near_duplicates': None,  # Los casi duplicados requieren comparar el bloque con todo el resto: solo en memoria
+        'null_operations': null_operations,
+        'type_corrections': {},
+        'text_transformations': {}
+    }
+    sample = []
+    chunks = _clean_chunks(db_path, query, chunk_rows, numeric, plan, cleaning_stats, sample)
+    intercambio.write_stage_chunks(chunks, output_path, stage="cleaning")
+    print(f"  - {cleaning_stats['final_records']} registros limpios escritos en {output_path}")
+
+    sample_df = pd.concat(sample) if sample else pd.DataFrame(columns=profile['columns'] or [])
+    return analysis_results, {'stats': cleaning_stats}, sample_df
@@ -0,0 +1,239 @@
+import sys
+import time
+import sqlite3
+import numpy as np
+import pandas as pd
+from . import limpieza_por_bloques
+
+# Configuración
+CLEAN_TABLE = "countries_clean"  # Resultado de la limpieza dentro de la misma base de datos
+EXPORT_BATCH_SIZE = 50_000  # Filas por lote al exportar countries_clean
+WHITESPACE = " \t\n\r\x0b\x0c"  # Lo que elimina str.strip, salvo los espacios Unicode
+CRITICAL_COLS = limpieza_por_bloques.CRITICAL_COLS
+JSON_COLS = limpieza_por_bloques.JSON_COLS
+
+def _q(col):
+    return f'"{col}"'
+
+def source_query(conn, control_columns, table="countries"):
+    """Campos de datos de countries con su rowid (para conservar el orden), sin países dados de baja"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    selected = [col for col in columns if col not in control_columns]
+    query = f"SELECT rowid AS _rowid, {', '.join(map(_q, selected))} FROM {table}"
+    if 'deleted_at' in columns:
+        query += " WHERE deleted_at IS NULL"
+    return query, selected
+
+def profile(conn, query, columns):
+    """Conteos por columna sobre las filas cargadas: nulos, valores numéricos y reales"""
+    expressions = ["COUNT(*)"]
+    for col in columns:
+        expressions += [f"SUM({_q(col)} IS NULL)",
+                        f"SUM(typeof({_q(col)}) IN ('integer', 'real'))",
+                        f"SUM(typeof({_q(col)}) = 'real')"]
+    row = conn.execute(f"SELECT {', '.join(expressions)} FROM ({query})").fetchone()
+    total = row[0]
+    result = {'total_records': total, 'nulls': {}, 'numeric': set(), 'has_real': set()}
+    for i, col in enumerate(columns):
+        nulls, numeric, real = (value or 0 for value in row[1 + 3 * i:4 + 3 * i])
+        result['nulls'][col] = nulls
+        # Igual que read_sql_query: numérica si tiene valores y todos son números
+        if numeric and numeric == total - nulls:
+            result['numeric'].add(col)
+        if real:
+            result['has_real'].add(col)
+    return result
+
+def _median(conn, table, col, condition):
+    """Mediana con ventana ordenada: promedio de los uno o dos valores centrales"""
+    return conn.execute(f"""
+    SELECT AVG(value) FROM (
+        SELECT value, ROW_NUMBER() OVER (ORDER BY value) AS position, COUNT(*) OVER () AS total
+        FROM (SELECT {_q(col)} AS value FROM {table} WHERE {_q(col)} IS NOT NULL AND {condition})
+    ) WHERE position IN ((total + 1) / 2, (total + 2) / 2)
+    """).fetchone()[0]
+
+def clean_in_sql(db_path, control_columns, table="countries"):
+    """Compila la limpieza del modo en memoria a SQL y la escribe en countries_clean.
+
+    Python solo recibe los conteos para el reporte; devuelve los resultados del análisis y de la limpieza
+    con la misma forma que exploratory_analysis y clean_transform_data, y una muestra de 5 filas.
+    """
+    print("\n=== LIMPIEZA EN SQL ===")
+    conn = sqlite3.connect(db_path)
+    try:
+        query, columns = source_query(conn, control_columns, table)
+        stats = profile(conn, query, columns)
+        total = stats['total_records']
+        print(f"  - {total} registros analizados en {db_path}")
+
+        # 1. Duplicados exactos: se conserva la primera aparición de cada fila (ventana por todas las columnas)
+        conn.execute("DROP TABLE IF EXISTS temp._dedup")
+        conn.execute(f"""
+        CREATE TEMP TABLE _dedup AS
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY {', '.join(map(_q, columns))} ORDER BY _rowid) AS _rn
+            FROM ({query})
+        ) WHERE _rn = 1
+        """)
+        unique = conn.execute("SELECT COUNT(*) FROM _dedup").fetchone()[0]
+        duplicates = total - unique
+
+        # 2. Nulos en el orden de las columnas: las filas sin columnas críticas dejan de contar para las siguientes
+        conditions = []
+        kept = []
+        for col in columns:
+            conditions.append(" AND ".join(kept) or "1")
+            if col in CRITICAL_COLS:
+                kept.append(f"{_q(col)} IS NOT NULL")
+        null_counts = conn.execute("SELECT " + ", ".join(
+            f"COALESCE(SUM({_q(col)} IS NULL AND {condition}), 0)" for col, condition in zip(columns, conditions)
+        ) + " FROM _dedup").fetchone()
+
+        null_operations = {}
+        expressions = {col: _q(col) for col in columns}
+        for col, condition, null_count in zip(columns, conditions, null_counts):
+            if null_count == 0:
+                continue
+            if col in CRITICAL_COLS:
+                null_operations[col] = f"Eliminadas {null_count} filas con valores nulos"
+            elif col in stats['numeric']:
+                median = _median(conn, "_dedup", col, condition)
+                expressions[col] = f"COALESCE({_q(col)}, {median if median is not None else 'NULL'})"
+                null_operations[col] = f"Imputados {null_count} valores nulos con la mediana"
+            else:
+                expressions[col] = f"COALESCE({_q(col)}, 'Unknown')"
+                null_operations[col] = f"Imputados {null_count} valores nulos con 'Unknown'"
+
+        # 3. Tipos: los mismos casos en que pandas cargaría population sin tipo entero o area sin tipo flotante
+        type_corrections = {}
+        if 'population' in columns:
+            expressions['population'] = f"CAST({expressions['population']} AS INTEGER)"
+            if 'population' not in stats['numeric'] or 'population' in stats['has_real'] or stats['nulls']['population']:
+                type_corrections['population'] = 'Convertido a entero'
+        if 'area' in columns:
+            expressions['area'] = f"CAST({expressions['area']} AS REAL)"
+            if 'area' not in stats['numeric'] or not ('area' in stats['has_real'] or stats['nulls']['area']):
+                type_corrections['area'] = 'Convertido a float'
+
+        conn.execute("DROP TABLE IF EXISTS temp._imputed")
+        conn.execute(f"""
+        CREATE TEMP TABLE _imputed AS
+        SELECT _rowid, {', '.join(f'{expression} AS {_q(col)}' for col, expression in expressions.items())}
+        FROM _dedup WHERE {' AND '.join(kept) or '1'}
+        """)
+
+        # 4. Texto: columnas no numéricas cuyo primer valor limpio es texto, como en el modo en memoria
+        first = conn.execute(f"SELECT {', '.join(f'typeof({_q(col)})' for col in columns)} "
+                             f"FROM _imputed ORDER BY _rowid LIMIT 1").fetchone()
+        text_cols = [col for col, kind in zip(columns, first or []) if col not in stats['numeric']
+                     and col not in JSON_COLS and kind == 'text']
+        text_transformations = {col: 'Eliminados espacios en blanco innecesarios' for col in text_cols}
+        whitespace = " || ".join(["' '"] + [f"char({ord(c)})" for c in WHITESPACE if c != " "])
+        selected = [f"TRIM({_q(col)}, {whitespace}) AS {_q(col)}" if col in text_cols else _q(col)
+                    for col in columns]
+
+        # 5. Densidad de población como columna calculada (NULL si el área no es positiva)
+        if 'population' in columns and 'area' in columns:
+            selected.append("CASE WHEN area > 0 THEN CAST(population AS REAL) / area END AS population_density")
+            print("  - Agregada columna 'population_density' (población/área)")
+
+        conn.execute(f"DROP TABLE IF EXISTS {CLEAN_TABLE}")
+        conn.execute(f"CREATE TABLE {CLEAN_TABLE} AS SELECT {', '.join(selected)} FROM _imputed ORDER BY _rowid")
+        final_records = conn.execute(f"SELECT COUNT(*) FROM {CLEAN_TABLE}").fetchone()[0]
+        conn.commit()
+        sample = pd.read_sql_query(f"SELECT * FROM {CLEAN_TABLE} ORDER BY rowid LIMIT 5", conn)
+    finally:
+        conn.close()
+
+    print(f"  - {duplicates} duplicados y {unique - final_records} filas con nulos críticos eliminados; "
+          f"{final_records} registros en {CLEAN_TABLE}")
+    analysis_results = {
+        "total_records": total,
+        "duplicates": duplicates,
+        "null_values": stats['nulls'],
+        "outliers": {}
+    }
+    cleaning_results = {'stats': {
+        'initial_records': total,
+        'final_records': final_records,
+        'duplicates_removed': duplicates,
+        'near_duplicates': None,  # Los casi duplicados requieren comparación difusa: solo en pandas
+        'null_operations': null_operations,
+        'type_corrections': type_corrections,
+        'text_transformations': text_transformations,
+    }}
+    return analysis_results, cleaning_results, sample
+
+def iter_clean_table(db_path, batch_size=EXPORT_BATCH_SIZE):
+    """Lotes de countries_clean en orden, para exportarlos sin cargar la tabla completa"""
+    conn = sqlite3.connect(db_path)
+    try:
+        empty = True
+        for chunk in pd.read_sql_query(f"SELECT * FROM {CLEAN_TABLE} ORDER BY rowid", conn, chunksize=batch_size):
+            empty = False
+            yield chunk
+        if empty:
+            yield pd.read_sql_query(f"SELECT * FROM {CLEAN_TABLE} LIMIT 0", conn)
+    finally:
+        conn.close()
+
+def _comparable(df):
+    """Valores numéricos como float64 y el resto como texto, para comparar sin depender del esquema compacto"""
+    df = df.reset_index(drop=True)
+    return pd.DataFrame({col: pd.to_numeric(df[col]).astype('float64') if pd.api.types.is_numeric_dtype(df[col])
+                         else df[col].astype(object).where(df[col].notna(), None) for col in df.columns})
+
+def parity(db_path=None):
+    """Compara countries_clean y las estadísticas con la limpieza en pandas (sin casi duplicados, solo en pandas)"""
+    from . import simulacion_procesamiento as sp
+    from . import ensuciar_datos
+
+    db_path = db_path or sp.DB_PATH
+    table = ensuciar_datos.source_table(db_path)
+    near_duplicates, sp.DB_PATH, sp.NEAR_DUPLICATES = sp.NEAR_DUPLICATES, db_path, False
+    try:
+        start = time.perf_counter()
+        df = sp.load_data_from_db(table=table)
+        analysis_results = sp.exploratory_analysis(df)
+        cleaning_results = sp.clean_transform_data(df, analysis_results)
+        pandas_seconds = time.perf_counter() - start
+    finally:
+        sp.NEAR_DUPLICATES = near_duplicates
+
+    start = time.perf_counter()
+    sql_analysis, sql_cleaning, _ = clean_in_sql(db_path, sp.INGESTION_CONTROL_COLUMNS, table)
+    sql_seconds = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    try:
+        sql_df = pd.read_sql_query(f"SELECT * FROM {CLEAN_TABLE} ORDER BY rowid", conn)
+    finally:
+        conn.close()
+
+    differences = []
+    for key in ('total_records', 'duplicates', 'null_values'):
+        if analysis_results[key] != sql_analysis[key]:
+            differences.append(f"análisis {key}: pandas {analysis_results[key]} / SQL {sql_analysis[key]}")
+    for key, value in cleaning_results['stats'].items():
+        if value != sql_cleaning['stats'][key]:
+            differences.append(f"limpieza {key}: pandas {value} / SQL {sql_cleaning['stats'][key]}")
+    expected, actual = _comparable(cleaning_results['cleaned_df']), _comparable(sql_df)
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        differences.append(f"tabla: pandas {expected.shape} {list(expected.columns)} / SQL {actual.shape} {list(actual.columns)}")
+    else:
+        for col in expected.columns:
+            if expected[col].dtype == 'float64' and actual[col].dtype == 'float64':
+                same = np.isclose(expected[col], actual[col], rtol=1e-12, equal_nan=True)
+            else:
+                same = (expected[col] == actual[col]) | (expected[col].isna() & actual[col].isna())
+            if not same.all():
+                differences.append(f"columna {col}: {(~same).sum()} valores distintos")
+
+    print(f"\nPandas {pandas_seconds:.2f}s, SQL {sql_seconds:.2f}s; {len(sql_df)} registros limpios")
+    print("Sin diferencias entre pandas y SQL" if not differences else "\n".join(f"  - {d}" for d in differences))
+    return differences
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.limpieza_sql [db_path]: paridad de countries_clean con la limpieza en pandas
+    sys.exit(1 if parity(*sys.argv[1:2]) else 0)
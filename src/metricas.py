@@ -0,0 +1,86 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Umbrales de clasificación por cantidad de idiomas: (límite superior inclusivo, etiqueta)
+DIVERSITY_BINS = [
+    (0, "No data"),
+    (1, "Monolingual"),
+    (3, "Low diversity"),
+    (10, "Medium diversity"),
+    (np.inf, "High diversity"),
+]
+
+def population_density(df):
+    """Habitantes por km²; NaN cuando el área no es positiva"""
+    area = df['area']
+    return df['population'].div(area).where(area > 0, np.nan)
+
+def language_density(df):
+    """Idiomas por millón de habitantes; 0 sin población o sin idiomas"""
+    population = df['population']
+    language_count = df['language_count']
+    valid = (population > 0) & (language_count > 0)
+    return (language_count * 1000000).div(population.where(valid)).where(valid, 0.0)
+
+def linguistic_diversity(df):
+    """Clasificación por cantidad de idiomas con cortes por intervalos"""
+    edges = [-np.inf] + [upper for upper, _ in DIVERSITY_BINS]
+    labels = [label for _, label in DIVERSITY_BINS]
+    return pd.cut(df['language_count'], bins=edges, labels=labels, right=True).astype(object)
+
+# Cada métrica se declara una sola vez: nombre -> (columnas requeridas, función vectorizada)
+DERIVED_METRICS = {
+    'population_density': (['population', 'area'], population_density),
+    'language_density': (['population', 'language_count'], language_density),
+    'linguistic_diversity': (['language_count'], linguistic_diversity),
+}
+
+def add_metrics(df, names):
+    """Agrega al DataFrame las métricas indicadas, evaluadas columna a columna"""
+    added = []
+    for name in names:
+        required, compute = DERIVED_METRICS[name]
+        if all(col in df.columns for col in required):
+            df[name] = compute(df)
+            added.append(name)
+    return added
+
+def region_language_families(df):
+    """Conteo de familias lingüísticas por región con un único groupby"""
+    result = {region: {} for region in df['region'].dropna().unique()}
+    # observed=True: con columnas categóricas no se generan combinaciones vacías
+    counts = df.groupby(['region', 'language_family'], sort=False, observed=True).size()
+    for (region, family), count in counts.items():
+        result[region][family] = int(count)
+
+    # Mismo orden que value_counts: por conteo descendente, empates por aparición
+    return {
+        region: dict(sorted(families.items(), key=lambda item: item[1], reverse=True))
+        for region, families in result.items()
+    }
+
+def benchmark(n_rows=1_000_000, seed=0):
+    """Compara las métricas vectorizadas con el apply fila a fila original"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'population': rng.integers(0, 100_000_000, n_rows),
+        'area': rng.uniform(-10, 1_000_000, n_rows),
+        'language_count': rng.integers(0, 15, n_rows),
+    })
+
+    start = time.perf_counter()
+    add_metrics(df, DERIVED_METRICS)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df.apply(lambda row: row['population'] / row['area'] if row['area'] > 0 else np.nan, axis=1)
+    row_wise = time.perf_counter() - start
+
+    print(f"{n_rows} filas: {len(DERIVED_METRICS)} métricas vectorizadas en {vectorized:.2f}s; "
+          f"solo population_density con apply(axis=1) en {row_wise:.2f}s")
+    return vectorized, row_wise
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,285 @@
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import importlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import instrumentacion
+from . import rutas
+
+# Configuración
+STAGE_CACHE_PATH = rutas.output("cache", "etapas.json")
+MAX_PARALLEL_STAGES = 2  # Etapas independientes que pueden ejecutarse a la vez
+SRC_DIR = rutas.PACKAGE_DIR
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Nodos admitidos al leer una constante del código fuente: literales, aritmética y llamadas a rutas
+_CONSTANT_NODES = (ast.Expression, ast.Constant, ast.BinOp, ast.UnaryOp, ast.operator, ast.unaryop,
+                   ast.Tuple, ast.List, ast.Dict, ast.Load, ast.Call, ast.Attribute, ast.Name)
+_source_constants = {}
+
+def stage_module(name):
+    """Importa el módulo de una etapa: solo al ejecutarla, no para calcular su clave de caché"""
+    return importlib.import_module(f".{name}", __package__)
+
+def _read_constants(path):
+    """Constantes de nivel superior de un módulo, evaluadas desde su código fuente sin importarlo"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    constants = {}
+    for node in tree.body:
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)):
+            continue
+        expression = ast.Expression(node.value)
+        nodes = list(ast.walk(expression))
+        if (all(isinstance(child, _CONSTANT_NODES) for child in nodes)
+                and all(child.id == "rutas" for child in nodes if isinstance(child, ast.Name))):
+            constants[node.targets[0].id] = eval(compile(expression, path, "eval"),
+                                                 {"__builtins__": {}, "rutas": rutas})
+    return constants
+
+def config(module, name):
+    """Configuración de una etapa: la del módulo si ya está importado (y quizá modificado);
+    si no, la de su código fuente, así una ejecución con todo en caché no importa las etapas"""
+    loaded = sys.modules.get(f"{__package__}.{module}")
+    if loaded is not None:
+        return getattr(loaded, name)
+    key = (module, rutas.BASE_DIR)  # Las rutas de salida dependen del directorio base
+    if key not in _source_constants:
+        _source_constants[key] = _read_constants(os.path.join(SRC_DIR, f"{module}.py"))
+    return _source_constants[key][name]
+
+# Grafo de etapas: dependencias, archivos leídos, código que las define y archivos producidos.
+# La clave de caché de cada etapa es el hash de sus entradas, su código y sus parámetros.
+# El índice de idiomas no depende de la ingesta y las copias en Excel salen de la cadena principal,
+# así que hay pares de etapas que sí corren a la vez: language_index con ingestion, cleaning_excel con enrichment.
+# Los módulos de las etapas se importan en 'run'; entradas, parámetros y salidas se leen con config().
+STAGES = {
+    'ingestion': {
+        'deps': [],
+        'run': lambda: stage_module('ingestion').main(),
+        'inputs': lambda: [],
+        'code': ['ingestion.py', 'cliente_http.py', 'reconciliacion.py', 'descarga_concurrente.py',
+                 'auditoria.py'],
+        # La API no se puede hashear sin descargarla: se considera vigente durante el TTL de la caché HTTP
+        'params': lambda: {'url': config('ingestion', 'BASE_URL'), 'mode': config('ingestion', 'LOAD_MODE'),
+                           'fetch': config('ingestion', 'FETCH_MODE'),
+                           'api_window': int(time.time() // config('cliente_http', 'CACHE_TTL'))},
+        'outputs': lambda: [config('ingestion', 'DB_PATH'), config('ingestion', 'EXCEL_PATH'),
+                            config('ingestion', 'AUDIT_PATH')],
+    },
+    'language_index': {
+        'deps': [],
+        # Con las rutas explícitas se verifica el índice en disco aunque el proceso ya lo tenga cargado
+        'run': lambda: stage_module('codigos_idioma').load_index(config('codigos_idioma', 'CROSSWALK_PATH'),
+                                                                  config('codigos_idioma', 'INDEX_DB_PATH')),
+        'inputs': lambda: [config('codigos_idioma', 'CROSSWALK_PATH')],
+        'code': ['codigos_idioma.py'],
+        'params': lambda: {},
+        'outputs': lambda: [config('codigos_idioma', 'INDEX_DB_PATH')],
+    },
+    'cleaning': {
+        'deps': ['ingestion'],
+        # La copia en Excel es la etapa cleaning_excel
+        'run': lambda: stage_module('simulacion_procesamiento').main(export_excel=False),
+        'inputs': lambda: [config('simulacion_procesamiento', 'DB_PATH')],
+        'code': ['simulacion_procesamiento.py', 'ensuciar_datos.py', 'limpieza_por_bloques.py', 'limpieza_sql.py',
+                 'paralelo.py', 'deduplicacion.py', 'esquema.py', 'metricas.py', 'intercambio.py',
+                 'auditoria.py'],
+        'params': lambda: {'mode': config('simulacion_procesamiento', 'CLEANING_MODE'),
+                           'near_duplicates': config('simulacion_procesamiento', 'NEAR_DUPLICATES'),
+                           'compact': config('esquema', 'COMPACT_DTYPES')},
+        'outputs': lambda: [config('simulacion_procesamiento', 'CLEANED_DATA_PATH'),
+                            config('simulacion_procesamiento', 'CLEANING_REPORT_PATH')],
+        # ensuciar_datos modifica la BD de entrada: la clave se toma al terminar la etapa
+        'mutates_inputs': True,
+    },
+    'cleaning_excel': {
+        'deps': ['cleaning'],
+        'run': lambda: (config('simulacion_procesamiento', 'EXPORT_EXCEL')
+                        and stage_module('simulacion_procesamiento').export_excel_copy()),
+        'inputs': lambda: [config('simulacion_procesamiento', 'CLEANED_DATA_PATH')],
+        'code': ['simulacion_procesamiento.py', 'exportacion.py', 'intercambio.py'],
+        'params': lambda: {'excel': config('simulacion_procesamiento', 'EXPORT_EXCEL')},
+        'outputs': lambda: [config('simulacion_procesamiento', 'CLEANED_EXCEL_PATH')],
+    },
+    'enrichment': {
+        'deps': ['cleaning', 'language_index'],
+        'run': lambda: stage_module('enrichment').main(export_excel=False),
+        'inputs': lambda: [config('enrichment', 'CLEANED_DATA_PATH'), config('enrichment', 'LANGUAGES_DATA_PATH'),
+                           config('enrichment', 'DB_PATH'), config('codigos_idioma', 'INDEX_DB_PATH')],
+        'code': ['enrichment.py', 'paralelo.py', 'esquema.py', 'metricas.py', 'intercambio.py', 'agregados.py',
+                 'auditoria.py', 'codigos_idioma.py'],
+        'params': lambda: {'mode': config('enrichment', 'ENRICHMENT_MODE'),
+                           'compact': config('esquema', 'COMPACT_DTYPES'),
+                           'aggregates': config('enrichment', 'MATERIALIZE_AGGREGATES')},
+        'outputs': lambda: [config('enrichment', 'ENRICHED_DATA_PATH'), config('enrichment', 'ENRICHMENT_REPORT_PATH'),
+                            config('agregados', 'ENRICHED_DB_PATH')],
+    },
+    'enrichment_excel': {
+        'deps': ['enrichment'],
+        'run': lambda: config('enrichment', 'EXPORT_EXCEL') and stage_module('enrichment').export_excel_copy(),
+        'inputs': lambda: [config('enrichment', 'ENRICHED_DATA_PATH')],
+        'code': ['enrichment.py', 'exportacion.py', 'intercambio.py'],
+        'params': lambda: {'excel': config('enrichment', 'EXPORT_EXCEL')},
+        'outputs': lambda: [config('enrichment', 'ENRICHED_EXCEL_PATH')],
+    },
+}
+
+def file_digest(path):
+    """SHA-256 del contenido de un archivo, leído por bloques; None si no existe"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_key(name, stages=STAGES):
+    """Clave de caché de una etapa: hash de entradas, código y parámetros"""
+    stage = stages[name]
+    parts = {
+        'inputs': {path: file_digest(path) for path in stage['inputs']()},
+        'code': {module: file_digest(os.path.join(SRC_DIR, module)) for module in stage['code']},
+        'params': stage['params'](),
+    }
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def load_stage_cache(path=STAGE_CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_stage_cache(cache, path=STAGE_CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+def is_cached(name, key, cache, stages=STAGES):
+    """La salida es válida si la clave coincide y todos los archivos producidos siguen existiendo"""
+    entry = cache.get(name)
+    return (entry is not None and entry['key'] == key
+            and all(os.path.exists(path) for path in stages[name]['outputs']()))
+
+def execution_order(stages=STAGES, targets=None):
+    """Etapas necesarias para los objetivos, con sus dependencias, validando que no haya ciclos"""
+    needed = []
+    visiting = set()
+
+    def visit(name):
+        if name in needed:
+            return
+        if name in visiting:
+            raise ValueError(f"Ciclo en el grafo de etapas en '{name}'")
+        visiting.add(name)
+        for dep in stages[name]['deps']:
+            visit(dep)
+        visiting.discard(name)
+        needed.append(name)
+
+    for name in targets or stages:
+        visit(name)
+    return needed
+
+def run_pipeline(targets=None, force=(), stages=STAGES, max_workers=MAX_PARALLEL_STAGES):
+    """Ejecuta el grafo: omite las etapas con caché válida y lanza a la vez las que no dependen entre sí"""
+    order = execution_order(stages, targets)
+    cache = load_stage_cache()
+    results = {}
+    pending = list(order)
+    running = {}
+
+    def start(name, pool):
+        # La clave se calcula cuando terminan las dependencias, con sus salidas ya escritas
+        key = stage_key(name, stages)
+        if name not in force and is_cached(name, key, cache, stages):
+            results[name] = {'cache': 'hit', 'key': key, 'seconds': 0.0}
+            print(f"[{name}] caché válida ({key[:12]}), se omite")
+            return None
+        print(f"[{name}] sin caché válida, ejecutando...")
+        return pool.submit(_run_stage, name, key, stages)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [name for name in pending
+                     if all(dep in results and results[dep].get('status') != 'error'
+                            for dep in stages[name]['deps'])]
+            blocked = [name for name in pending
+                       if any(results.get(dep, {}).get('status') == 'error' for dep in stages[name]['deps'])]
+            for name in blocked:
+                pending.remove(name)
+                results[name] = {'cache': 'skipped', 'status': 'error', 'error': 'dependencia fallida'}
+            for name in ready:
+                pending.remove(name)
+                future = start(name, pool)
+                if future is not None:
+                    running[future] = name
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                if results[name]['status'] == 'ok':
+                    cache[name] = {'key': results[name]['key'], 'finished_at': datetime.now().isoformat()}
+                    save_stage_cache(cache)
+
+    for name in order:
+        result = results[name]
+        instrumentacion.emit({
+            'run_id': instrumentacion.RUN_ID,
+            'span': f"dag.{name}",
+            'cache': result['cache'],
+            'status': result.get('status', 'ok'),
+            'seconds': result.get('seconds'),
+            'key': result.get('key'),
+        })
+
+    hits = sum(1 for result in results.values() if result['cache'] == 'hit')
+    print(f"\nEtapas: {len(order)} | aciertos de caché: {hits} | ejecutadas: "
+          f"{sum(1 for result in results.values() if result['cache'] == 'miss')}")
+    return results
+
+def _run_stage(name, key, stages):
+    stage = stages[name]
+    start = time.perf_counter()
+    try:
+        stage['run']()
+    except Exception as e:
+        print(f"[{name}] Error: {e}")
+        return {'cache': 'miss', 'status': 'error', 'error': f"{type(e).__name__}: {e}",
+                'seconds': time.perf_counter() - start}
+    # Si la etapa modifica sus propias entradas, la clave válida es la del estado resultante
+    if stage.get('mutates_inputs'):
+        key = stage_key(name, stages)
+    return {'cache': 'miss', 'status': 'ok', 'key': key, 'seconds': round(time.perf_counter() - start, 3)}
+
+def main(targets=None, force=()):
+    print("\n===== EJECUTANDO PIPELINE POR ETAPAS =====\n")
+    results = run_pipeline(targets, force)
+    failed = [name for name, result in results.items() if result.get('status') == 'error']
+    if failed:
+        print(f"Etapas con error: {', '.join(failed)}")
+    return not failed
+
+def parse_args(args):
+    """[etapa ...] [--force etapa,...|all] -> (etapas o None, etapas forzadas)"""
+    force = ()
+    if "--force" in args:
+        index = args.index("--force")
+        force = tuple(STAGES) if args[index + 1] == "all" else tuple(args[index + 1].split(","))
+        args = args[:index] + args[index + 2:]
+    return args or None, force
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.orquestador [etapa ...] [--force etapa,...|all]
+    sys.exit(0 if main(*parse_args(sys.argv[1:])) else 1)
@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import metricas
+from . import deduplicacion
+from . import esquema
+from .limpieza_por_bloques import CRITICAL_COLS, JSON_COLS
+
+# Configuración
+WORKERS = os.cpu_count() or 1
+PARTITION_BY = "cca3"  # "cca3": hash del código; "region": una partición por región
+
+def partition_ids(df, n_partitions, by=PARTITION_BY):
+    """Asigna cada fila a una partición, por hash de cca3 o por región"""
+    if by == "region":
+        codes, _ = pd.factorize(df['region'], use_na_sentinel=False)
+        return codes % n_partitions
+    hashes = pd.util.hash_pandas_object(df['cca3'], index=False).to_numpy()
+    return (hashes % np.uint64(n_partitions)).astype(np.int64)
+
+def split_partitions(df, n_partitions, by=PARTITION_BY):
+    ids = partition_ids(df, n_partitions, by)
+    return [df[ids == i] for i in range(n_partitions) if (ids == i).any()]
+
+def _run_partitions(func, tasks, workers):
+    """Ejecuta las tareas en un pool de procesos (o en el mismo proceso con un solo worker)"""
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*tasks)))
+
+def plan_cleaning(df, near_duplicates=True):
+    """Pasos globales previos al reparto: deduplicación, nulos, medianas y columnas de texto"""
+    deduped = df.drop_duplicates()
+    duplicates_removed = len(df) - len(deduped)
+    # Los casi duplicados pueden caer en particiones distintas: se resuelven antes del reparto
+    near_duplicate_stats = None
+    if near_duplicates:
+        deduped, near_duplicate_stats = deduplicacion.resolve(deduped)
+    kept = np.ones(len(deduped), dtype=bool)
+    null_operations = {}
+    fills = {}
+
+    # Mismo recorrido por columnas que clean_transform_data
+    for col in deduped.columns:
+        nulls = deduped[col].isnull().to_numpy()
+        null_count = int((nulls & kept).sum())
+        if null_count > 0:
+            if col in CRITICAL_COLS:
+                null_operations[col] = f"Eliminadas {null_count} filas con valores nulos"
+            elif pd.api.types.is_numeric_dtype(deduped[col]):
+                fills[col] = deduped[col][kept].median()
+                null_operations[col] = f"Imputados {null_count} valores nulos con la mediana"
+            else:
+                fills[col] = "Unknown"
+                null_operations[col] = f"Imputados {null_count} valores nulos con 'Unknown'"
+        if col in CRITICAL_COLS:
+            kept &= ~nulls
+
+    type_corrections = {}
+    if 'population' in deduped.columns and not pd.api.types.is_integer_dtype(deduped['population']):
+        type_corrections['population'] = 'Convertido a entero'
+    if 'area' in deduped.columns and not pd.api.types.is_float_dtype(deduped['area']):
+        type_corrections['area'] = 'Convertido a float'
+
+    # Las columnas de texto se deciden con la primera fila que sobrevive a la limpieza
+    text_cols = []
+    first_rows = deduped[kept].head(1)
+    if not first_rows.empty:
+        for col in esquema.text_columns(deduped):
+            # population y area dejan de ser texto tras la corrección de tipos
+            if col in JSON_COLS or col in type_corrections:
+                continue
+            value = first_rows[col].iloc[0]
+            if isinstance(value, str) or (pd.isna(value) and col in fills):
+                text_cols.append(col)
+
+    return deduped, {
+        'duplicates_removed': duplicates_removed,
+        'near_duplicates': near_duplicate_stats,
+        'fills': fills,
+        'text_cols': text_cols,
+        'null_operations': null_operations,
+        'type_corrections': type_corrections,
+    }
+
+def clean_partition(part, plan):
+    """Pasos fila a fila de la limpieza sobre una partición"""
+    cleaned = part.dropna(subset=[col for col in CRITICAL_COLS if col in part.columns]).copy()
+    for col, value in plan['fills'].items():
+        cleaned[col] = esquema.fill_missing(cleaned[col], value)
+    if 'population' in plan['type_corrections']:
+        cleaned['population'] = cleaned['population'].astype('int64')
+    if 'area' in plan['type_corrections']:
+        cleaned['area'] = cleaned['area'].astype('float64')
+    for col in plan['text_cols']:
+        cleaned[col] = esquema.strip_text(cleaned[col])
+    metricas.add_metrics(cleaned, ['population_density'])
+    return cleaned
+
+def clean_parallel(df, workers=WORKERS, by=PARTITION_BY, near_duplicates=True):
+    """Limpieza en paralelo por particiones; devuelve el mismo resultado que clean_transform_data"""
+    print(f"\n=== LIMPIEZA EN PARALELO ({workers} workers, particiones por {by}) ===")
+    initial_records = len(df)
+    deduped, plan = plan_cleaning(df, near_duplicates)
+
+    parts = split_partitions(deduped, max(1, workers), by)
+    results = _run_partitions(clean_partition, [(part, plan) for part in parts], workers)
+    cleaned_df = pd.concat(results).sort_index() if results else deduped.iloc[0:0]
+
+    text_transformations = {col: 'Eliminados espacios en blanco innecesarios' for col in plan['text_cols']}
+    print(f"  - {plan['duplicates_removed']} registros duplicados eliminados")
+    if plan['near_duplicates'] is not None:
+        print(f"  - {plan['near_duplicates']['merged_records']} casi duplicados fusionados")
+    print(f"  - {len(parts)} particiones procesadas")
+
+    return {
+        'cleaned_df': cleaned_df,
+        'stats': {
+            'initial_records': initial_records,
+            'final_records': len(cleaned_df),
+            'duplicates_removed': plan['duplicates_removed'],
+            'near_duplicates': plan['near_duplicates'],
+            'null_operations': plan['null_operations'],
+            'type_corrections': plan['type_corrections'],
+            'text_transformations': text_transformations
+        }
+    }
+
+def enrich_partition(countries_part, relations_part, languages_df):
+    """Enriquecimiento y métricas fila a fila sobre una partición"""
+    from . import enrichment
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        enriched, stats = enrichment.enrich_data(countries_part, relations_part, languages_df)
+    metricas.add_metrics(enriched, ['language_density', 'linguistic_diversity'])
+    return enriched, stats
+
+def enrich_parallel(countries_df, country_languages_df, languages_df, workers=WORKERS, families=True):
+    """Enriquecimiento en paralelo por hash de cca3; las familias por región se calculan tras unir.
+
+    Con families=False no se calculan: el reporte las lee de las tablas de agregados.
+    """
+    print(f"\n=== ENRIQUECIMIENTO EN PARALELO ({workers} workers) ===")
+    n_partitions = max(1, workers)
+    country_ids = partition_ids(countries_df, n_partitions, "cca3")
+    if country_languages_df.empty:
+        relation_ids = np.empty(0, dtype=np.int64)
+    else:
+        relation_ids = partition_ids(country_languages_df, n_partitions, "cca3")
+
+    tasks = [
+        (countries_df[country_ids == i],
+         country_languages_df[relation_ids == i] if len(relation_ids) else country_languages_df,
+         languages_df)
+        for i in range(n_partitions) if (country_ids == i).any()
+    ]
+    results = _run_partitions(enrich_partition, tasks, workers)
+    final_df = pd.concat([enriched for enriched, _ in results]).sort_index()
+
+    match_stats = {
+        'countries_with_languages': sum(stats['countries_with_languages'] for _, stats in results),
+        'countries_enriched': sum(stats['countries_enriched'] for _, stats in results),
+        'total_language_matches': sum(stats['total_language_matches'] for _, stats in results),
+        'language_relations': sum(stats['language_relations'] for _, stats in results),
+        'literal_language_matches': sum(stats['literal_language_matches'] for _, stats in results),
+        'countries_enriched_literal': sum(stats['countries_enriched_literal'] for _, stats in results),
+        # El orden del reporte es el del dataset, no el de las particiones
+        'countries_without_matches': final_df.loc[
+            (final_df['language_count'] > 0) & final_df['primary_language'].isna(), 'name_common'].tolist()
+    }
+
+    region_language_families = metricas.region_language_families(final_df) if families else None
+    print(f"  - Países enriquecidos con datos adicionales: {match_stats['countries_enriched']}")
+    return final_df, match_stats, region_language_families
+
+def synthetic_countries(n_rows, seed=0):
+    """DataFrame sintético con el esquema de countries para medir el escalado"""
+    from . import ingestion
+    from . import servidor_local
+
+    rows = [ingestion.country_to_row(servidor_local.generate_country(i, seed)) for i in range(n_rows)]
+    df = pd.DataFrame(rows, columns=ingestion.STORED_FIELDS + ['timestamp', 'content_hash'])
+    df.insert(0, 'id', np.arange(1, n_rows + 1))
+    return df.drop(columns=['content_hash'])
+
+def benchmark(n_rows=200_000, max_workers=WORKERS):
+    """Mide la limpieza paralela con 1..N workers contra la ejecución en serie"""
+    from . import simulacion_procesamiento
+
+    df = synthetic_countries(n_rows)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        serial = simulacion_procesamiento.clean_transform_data(df, {})
+        serial_time = time.perf_counter() - start
+    print(f"{n_rows} filas - serie: {serial_time:.2f}s")
+
+    for workers in range(1, max_workers + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            parallel = clean_parallel(df, workers=workers)
+            elapsed = time.perf_counter() - start
+        pd.testing.assert_frame_equal(serial['cleaned_df'], parallel['cleaned_df'])
+        print(f"  - {workers} workers: {elapsed:.2f}s (x{serial_time / elapsed:.2f})")
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+              int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS)
@@ -0,0 +1,94 @@
+def build_index(records, key='cca3'):
+    """Construye un índice hash clave -> registro en una sola pasada, separando las claves repetidas"""
+    index = {}
+    duplicates = []
+    for record in records:
+        record_key = record.get(key)
+        if record_key in index:
+            duplicates.append(record_key)
+            continue
+        index[record_key] = record
+    return index, duplicates
+
+def _differences(api_record, db_record, compared):
+    return {
+        field: {'api': api_record.get(field), 'db': db_record.get(field)}
+        for field in compared
+        if api_record.get(field) != db_record.get(field)
+    }
+
+def reconcile(api_records, db_records, fields, key='cca3'):
+    """Compara la API con la BD en tiempo lineal: coincidentes, con diferencias, faltantes y sobrantes"""
+    api_index, api_duplicates = build_index(api_records, key)
+    db_index, db_duplicates = build_index(db_records, key)
+    compared = [field for field in fields if field != key]
+
+    matched = []
+    mismatched = {}
+    missing = []
+    for record_key, api_record in api_index.items():
+        db_record = db_index.get(record_key)
+        if db_record is None:
+            missing.append(record_key)
+            continue
+
+        diffs = _differences(api_record, db_record, compared)
+        if diffs:
+            mismatched[record_key] = diffs
+        else:
+            matched.append(record_key)
+
+    extra = [record_key for record_key in db_index if record_key not in api_index]
+
+    return {
+        'fields': compared,
+        'matched': matched,
+        'mismatched': mismatched,
+        'missing': missing,
+        'extra': extra,
+        'duplicates': {'api': api_duplicates, 'db': db_duplicates},
+        'api_index': api_index,
+        'db_index': db_index
+    }
+
+# La misma comparación sobre tablas de SQLite: los registros se recorren de a uno y nunca se reúnen en memoria.
+# api_table tiene una columna seq con el orden de llegada; db_filter se escribe sobre el alias d de db_table.
+def iter_table_pairs(conn, api_table, db_table, fields, key='cca3', db_filter="1"):
+    """Primera aparición de cada clave de la API, en orden de llegada: (clave, registro, diferencias o None si falta en la BD)"""
+    compared = [field for field in fields if field != key]
+    query = f"""
+    SELECT {", ".join(f"a.{field}" for field in fields)}, d.{key}, {", ".join(f"d.{field}" for field in compared)}
+    FROM {api_table} a
+    LEFT JOIN {db_table} d ON d.{key} = a.{key} AND {db_filter}
+    WHERE NOT EXISTS (SELECT 1 FROM {api_table} b WHERE b.{key} IS a.{key} AND b.seq < a.seq)
+    ORDER BY a.seq
+    """
+    width = len(fields)
+    for row in conn.execute(query):
+        api_record = dict(zip(fields, row[:width]))
+        if row[width] is None:
+            yield api_record[key], api_record, None
+        else:
+            yield api_record[key], api_record, _differences(api_record, dict(zip(compared, row[width + 1:])), compared)
+
+def iter_table_extra(conn, api_table, db_table, key='cca3', db_filter="1", columns=()):
+    """Registros de la BD cuya clave no llegó desde la API: (clave, {columna: valor})"""
+    selected = "".join(f", d.{col}" for col in columns)
+    query = f"""
+    SELECT d.{key}{selected} FROM {db_table} d
+    WHERE {db_filter} AND NOT EXISTS (SELECT 1 FROM {api_table} a WHERE a.{key} = d.{key})
+    ORDER BY d.rowid
+    """
+    for row in conn.execute(query):
+        yield row[0], dict(zip(columns, row[1:]))
+
+def table_summary(conn, api_table, db_table, fields, key='cca3', db_filter="1"):
+    """Conteos de reconcile entre dos tablas de SQLite, en una pasada"""
+    summary = {'fields': [field for field in fields if field != key], 'matched': 0, 'mismatched': 0, 'missing': 0}
+    for _, _, diffs in iter_table_pairs(conn, api_table, db_table, fields, key, db_filter):
+        summary['missing' if diffs is None else 'mismatched' if diffs else 'matched'] += 1
+    summary['extra'] = sum(1 for _ in iter_table_extra(conn, api_table, db_table, key, db_filter))
+    summary['api_records'] = conn.execute(f"SELECT COUNT(*) FROM {api_table}").fetchone()[0]
+    summary['db_records'] = conn.execute(f"SELECT COUNT(*) FROM {db_table} d WHERE {db_filter}").fetchone()[0]
+    summary['api_duplicates'] = summary['api_records'] - summary['matched'] - summary['mismatched'] - summary['missing']
+    return summary
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from queue import Empty
+from datetime import datetime
+from . import rutas
+
+# Configuración
+SCALES = [250, 1_000, 5_000]  # Países servidos por el servidor local en cada escala
+BASELINE_PATH = rutas.output("benchmarks", "baseline.json")
+RESULTS_PATH = rutas.output("benchmarks", "resultados.json")
+REGRESSION_THRESHOLD = 0.25  # Incremento relativo tolerado en tiempo y memoria pico
+MIN_SECONDS_DELTA = 0.05  # Diferencias absolutas menores se consideran ruido
+MIN_RSS_DELTA_MB = 5.0
+REPEATS = 3  # Repeticiones completas por escala; se conserva la mejor de cada medición
+MEASURE_TIMEOUT = 900  # Segundos máximos por medición; pasado ese tiempo el proceso se termina y cuenta como fallo
+STATIC_DIRS = ["db", "xlsx", "auditoria", "columnar", "cache"]
+
+def _count_rows(table="countries"):
+    import sqlite3
+    from . import ingestion
+
+    conn = sqlite3.connect(ingestion.DB_PATH)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+def _parquet_rows(path):
+    import pyarrow.parquet as pq
+    return pq.read_metadata(path).num_rows
+
+# Etapas completas: cada una devuelve (segundos, filas producidas)
+def stage_ingestion(url):
+    from . import ingestion
+    ingestion.BASE_URL = url
+    start = time.perf_counter()
+    ingestion.main()
+    return time.perf_counter() - start, _count_rows()
+
+def stage_cleaning(url):
+    from . import simulacion_procesamiento
+    start = time.perf_counter()
+    simulacion_procesamiento.main()
+    return time.perf_counter() - start, _parquet_rows(simulacion_procesamiento.CLEANED_DATA_PATH)
+
+def stage_enrichment(url):
+    from . import enrichment
+    start = time.perf_counter()
+    enrichment.main()
+    return time.perf_counter() - start, _parquet_rows(enrichment.ENRICHED_DATA_PATH)
+
+STAGES = {
+    'ingestion': stage_ingestion,
+    'cleaning': stage_cleaning,
+    'enrichment': stage_enrichment,
+}
+
+# Funciones críticas, medidas por separado sobre las salidas de las etapas
+def hot_insert_country_data(url):
+    import sqlite3
+    from . import ingestion
+
+    countries = list(ingestion.stream_country_data(url))
+    ingestion.DB_PATH = rutas.output("db", "insert_country_data.db")
+    conn = sqlite3.connect(ingestion.DB_PATH)
+    ingestion.create_countries_table(conn.cursor())
+    conn.close()
+
+    start = time.perf_counter()
+    for country in countries:
+        ingestion.insert_country_data(country)
+    return time.perf_counter() - start, len(countries)
+
+def hot_generate_audit_file(url):
+    from . import ingestion
+
+    spool_path = ingestion.create_audit_spool()
+    try:
+        for _ in ingestion.spool_projections(ingestion.stream_country_data(url), spool_path):
+            pass
+        start = time.perf_counter()
+        summary = ingestion.generate_audit_file(spool_path, True)
+        return time.perf_counter() - start, summary['api_records']
+    finally:
+        os.remove(spool_path)
+
+def hot_extract_country_languages(url):
+    from . import enrichment
+
+    countries_df = enrichment.load_cleaned_data()
+    start = time.perf_counter()
+    enrichment.extract_country_languages(countries_df)
+    return time.perf_counter() - start, len(countries_df)
+
+def hot_enrich_data(url):
+    from . import enrichment
+
+    countries_df = enrichment.load_cleaned_data()
+    languages_df = enrichment.load_languages_data()
+    country_languages_df = enrichment.extract_country_languages(countries_df)
+    start = time.perf_counter()
+    enrichment.enrich_data(countries_df, country_languages_df, languages_df)
+    return time.perf_counter() - start, len(countries_df)
+
+def hot_excel_writers(url):
+    from . import ingestion
+    from . import simulacion_procesamiento
+    from . import enrichment
+    from . import intercambio
+    from . import exportacion
+
+    cleaned_df = enrichment.load_cleaned_data()
+    enriched_df = intercambio.read_stage_output(enrichment.ENRICHED_DATA_PATH)
+    start = time.perf_counter()
+    ingestion.generate_excel_sample()
+    exportacion.write_excel(cleaned_df, simulacion_procesamiento.CLEANED_EXCEL_PATH)
+    exportacion.write_excel(enriched_df, enrichment.ENRICHED_EXCEL_PATH)
+    return time.perf_counter() - start, _count_rows() + len(cleaned_df) + len(enriched_df)
+
+HOT_FUNCTIONS = {
+    'insert_country_data': hot_insert_country_data,
+    'generate_audit_file': hot_generate_audit_file,
+    'extract_country_languages': hot_extract_country_languages,
+    'enrich_data': hot_enrich_data,
+    'excel_writers': hot_excel_writers,
+}
+
+def _run_in_child(name, url, workdir, queue):
+    """Ejecuta una medición en un proceso limpio para que el RSS pico sea solo suyo"""
+    # Las etapas se importan después: sus salidas quedan en el directorio de la repetición
+    rutas.set_base_dir(workdir)
+    target = {**STAGES, **HOT_FUNCTIONS}[name]
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            seconds, rows = target(url)
+        queue.put({
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    except BaseException as e:  # También SystemExit de una etapa: el padre recibe el error en lugar de esperar
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+def measure(name, url, workdir, timeout=MEASURE_TIMEOUT):
+    """Mide una etapa o función crítica en un proceso nuevo y devuelve sus métricas.
+
+    Si el proceso muere sin publicar el resultado (OOM, señal, fallo de una extensión en C) o supera
+    el tiempo máximo, la medición se devuelve como error en lugar de bloquear el benchmark.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_in_child, args=(name, url, workdir, queue))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                # Última lectura: el resultado pudo llegar justo antes de que el proceso terminara
+                try:
+                    result = queue.get(timeout=1)
+                except Empty:
+                    result = {'error': f"el proceso terminó sin resultado (código de salida {process.exitcode})"}
+            elif time.monotonic() > deadline:
+                process.kill()
+                result = {'error': f"sin resultado después de {timeout}s; proceso terminado"}
+    process.join(timeout=30)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    if 'error' not in result and process.exitcode != 0:
+        result = {'error': f"el proceso terminó con código de salida {process.exitcode}"}
+    return result
+
+def prepare_workdir(workdir):
+    """Directorio base de una repetición; los datasets de entrada se leen desde el paquete"""
+    for name in STATIC_DIRS:
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+
+def _best(runs):
+    """Mejor repetición: el ruido de la máquina solo puede sumar tiempo y memoria.
+    Una repetición con error (o caída) invalida la medición aunque las demás hayan terminado."""
+    failed = [run for run in runs if 'error' in run]
+    if failed:
+        return {**failed[0], 'repeats': len(runs)}
+    best = min(runs, key=lambda run: run['seconds'])
+    return {**best, 'peak_rss_mb': min(run['peak_rss_mb'] for run in runs), 'repeats': len(runs)}
+
+def run_benchmarks(scales=SCALES, repeats=REPEATS):
+    """Ejecuta las etapas y las funciones críticas en cada escala contra el servidor local"""
+    from . import servidor_local
+
+    results = {}
+    for n_records in scales:
+        print(f"\n=== ESCALA: {n_records} países ===")
+        server, url = servidor_local.start_server(n_records, port=0)
+        runs = {name: [] for name in list(STAGES) + list(HOT_FUNCTIONS)}
+        for _ in range(repeats):
+            # Cada repetición parte de un directorio vacío; las etapas consumen la salida de la anterior
+            with tempfile.TemporaryDirectory() as workdir:
+                prepare_workdir(workdir)
+                for name in runs:
+                    runs[name].append(measure(name, url, workdir))
+        server.shutdown()
+
+        results[str(n_records)] = {name: _best(name_runs) for name, name_runs in runs.items()}
+        for name, result in results[str(n_records)].items():
+            if 'error' in result:
+                print(f"  - {name}: ERROR {result['error']}")
+            else:
+                print(f"  - {name}: {result['seconds']:.3f}s, {result['rows_per_sec'] or 0:,.0f} filas/s, "
+                      f"RSS pico {result['peak_rss_mb']:.1f} MB")
+    return results
+
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Compara con la línea base; devuelve las mediciones que empeoraron más allá del umbral"""
+    regressions = []
+    for scale, measurements in baseline.get('results', {}).items():
+        for name, base in measurements.items():
+            current = results.get(scale, {}).get(name)
+            if current is None or 'error' in base:
+                continue
+            if 'error' in current:
+                regressions.append(f"{name} @ {scale}: {current['error']}")
+                continue
+            for metric, min_delta in (('seconds', MIN_SECONDS_DELTA), ('peak_rss_mb', MIN_RSS_DELTA_MB)):
+                delta = current[metric] - base[metric]
+                if delta > min_delta and current[metric] > base[metric] * (1 + threshold):
+                    regressions.append(f"{name} @ {scale}: {metric} {base[metric]} -> {current[metric]} "
+                                       f"(+{delta / base[metric]:.0%})")
+    return regressions
+
+def failed_measurements(results):
+    """Mediciones con error, caída o tiempo agotado en alguna repetición"""
+    return [f"{name} @ {scale}: {result['error']}"
+            for scale, measurements in results.items()
+            for name, result in measurements.items() if 'error' in result]
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': datetime.now().isoformat(), 'results': results}, f, indent=2)
+
+def main(save_baseline=False, threshold=REGRESSION_THRESHOLD):
+    results = run_benchmarks()
+    save_results(results, RESULTS_PATH)
+
+    failures = failed_measurements(results)
+    if failures:
+        # Una medición caída no sirve como línea base ni como comparación
+        print("\nMediciones fallidas:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return False
+
+    if save_baseline or not os.path.exists(BASELINE_PATH):
+        save_results(results, BASELINE_PATH)
+        print(f"\nLínea base guardada en {BASELINE_PATH}")
+        return True
+
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, threshold)
+    if regressions:
+        print(f"\nRegresiones por encima del {threshold:.0%}:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return False
+    print(f"\nSin regresiones respecto a {BASELINE_PATH} (umbral {threshold:.0%})")
+    return True
+
+if __name__ == "__main__":
+    # python -m pipeline_paises.rendimiento [baseline] [umbral]
+    ok = main(save_baseline="baseline" in sys.argv[1:],
+              threshold=next((float(arg) for arg in sys.argv[1:] if arg != "baseline"), REGRESSION_THRESHOLD))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,22 @@
+import os
+
+# Configuración
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.path.join(PACKAGE_DIR, "Dataset2_Actividad3")  # Datasets de entrada, instalados con el paquete
+BASE_DIR_ENV = "PIPELINE_BASE_DIR"  # Directorio de las salidas (db, xlsx, auditoria, ...); también pipeline --base-dir
+BASE_DIR = os.path.abspath(os.environ.get(BASE_DIR_ENV) or os.path.join(PACKAGE_DIR, "static"))
+
+def set_base_dir(path):
+    """Cambia el directorio de las salidas. Las etapas fijan sus rutas al importarse: se llama antes de importarlas"""
+    global BASE_DIR
+    BASE_DIR = os.path.abspath(path)
+    # Los procesos hijos (workers en paralelo, mediciones de rendimiento) lo heredan
+    os.environ[BASE_DIR_ENV] = BASE_DIR
+
+def dataset(name):
+    """Ruta de un dataset de entrada, resuelta desde el paquete y no desde el directorio actual"""
+    return os.path.join(DATASETS_DIR, name)
+
+def output(*parts):
+    """Ruta de una salida dentro del directorio base"""
+    return os.path.join(BASE_DIR, *parts)
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import zlib
+import random
+import time
+import hashlib
+import resource
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Configuración
+HOST = "127.0.0.1"
+PORT = 8765
+SEED = 42
+LAST_MODIFIED = "Sun, 06 Apr 2025 00:00:00 GMT"
+REGIONS = ["Africa", "Americas", "Asia", "Europe", "Oceania", "Antarctic"]
+LANGUAGES = {"eng": "English", "spa": "Spanish", "fra": "French", "ara": "Arabic",
+             "por": "Portuguese", "rus": "Russian", "zho": "Chinese", "deu": "German"}
+CURRENCIES = {"USD": "United States dollar", "EUR": "Euro", "XOF": "West African CFA franc",
+              "GBP": "British pound", "INR": "Indian rupee"}
+
+def generate_country(index, seed=SEED):
+    """Genera un país sintético con la misma forma que la API de Rest Countries"""
+    rng = random.Random(seed * 1_000_003 + index)
+    cca3 = f"{index:06d}"
+    name = f"Country {index}"
+    langs = dict(rng.sample(sorted(LANGUAGES.items()), rng.randint(1, 3)))
+    currency = rng.choice(sorted(CURRENCIES))
+    return {
+        "cca3": cca3,
+        "name": {"common": name, "official": f"Republic of {name}",
+                 "nativeName": {k: {"official": f"{v} {name}", "common": name} for k, v in langs.items()}},
+        "region": rng.choice(REGIONS),
+        "subregion": f"Subregion {rng.randint(1, 20)}",
+        "population": rng.randint(1_000, 200_000_000),
+        "area": round(rng.uniform(10, 5_000_000), 1),
+        "languages": langs,
+        "capital": [f"Capital {index}"],
+        "timezones": [f"UTC{rng.randint(-11, 12):+03d}:00"],
+        "currencies": {currency: {"name": CURRENCIES[currency], "symbol": "$"}},
+        "flags": {"png": f"https://flagcdn.com/w320/{cca3.lower()}.png"},
+        "translations": {k: {"official": f"{name} ({k})", "common": name}
+                         for k in ["ara", "ces", "deu", "est", "fin", "fra", "hrv", "hun", "ita", "jpn"]},
+    }
+
+def project_fields(country, fields):
+    """Aplica la proyección ?fields= de la API"""
+    if not fields:
+        return country
+    return {key: value for key, value in country.items() if key in fields}
+
+def iter_payload(n_records, seed=SEED, fields=None, region=None, record_delay=0.0):
+    """Produce el cuerpo JSON del endpoint /all (o /region/{region}) por fragmentos, sin construirlo completo"""
+    yield b"["
+    first = True
+    for i in range(n_records):
+        country = generate_country(i, seed)
+        if region and country["region"].lower() != region:
+            continue
+        if record_delay:
+            time.sleep(record_delay)  # Simula un enlace lento
+        prefix = b"" if first else b","
+        first = False
+        yield prefix + json.dumps(project_fields(country, fields)).encode("utf-8")
+    yield b"]"
+
+def iter_gzip(chunks, flush_each=False):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        # En un enlace lento se envía cada país en cuanto está listo
+        if flush_each:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def records_for_size(megabytes, seed=SEED):
+    """Calcula cuántos países sintéticos hacen falta para un cuerpo de aproximadamente N MB"""
+    sample = len(json.dumps(generate_country(0, seed)).encode("utf-8")) + 1
+    return max(1, int(megabytes * 1024 * 1024 / sample))
+
+class CountriesHandler(BaseHTTPRequestHandler):
+    n_records = 250
+    seed = SEED
+    counters = None  # Solicitudes atendidas por código de estado
+    latency = 0.0  # Segundos de espera antes de responder
+    record_delay = 0.0  # Segundos de espera por país enviado
+    fail_first = 0  # Solicitudes iniciales de cada ruta que fallan con 503
+    attempts = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/v3.1/all":
+            region = None
+        elif url.path.startswith("/v3.1/region/"):
+            region = url.path[len("/v3.1/region/"):].lower()
+            if region not in {name.lower() for name in REGIONS}:
+                self.send_error(404)
+                return
+        else:
+            self.send_error(404)
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+        # Fallos inyectados para probar los reintentos del cliente
+        if self.attempts is not None:
+            with self.lock:
+                self.attempts[self.path] = self.attempts.get(self.path, 0) + 1
+                failing = self.attempts[self.path] <= self.fail_first
+            if failing:
+                self._count(503)
+                self.send_error(503)
+                return
+
+        fields = parse_qs(url.query).get("fields", [""])[0]
+        fields = set(fields.split(",")) if fields else None
+        etag = '"' + hashlib.sha1(
+            f"{self.n_records}:{self.seed}:{region}:{sorted(fields or [])}".encode()).hexdigest() + '"'
+
+        # Revalidación condicional
+        if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == LAST_MODIFIED):
+            self._count(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        self._count(200)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+
+        chunks = iter_payload(self.n_records, self.seed, fields, region, self.record_delay)
+        for chunk in iter_gzip(chunks, flush_each=bool(self.record_delay)) if gzip else chunks:
+            self.wfile.write(chunk)
+
+    def _count(self, status):
+        if self.counters is not None:
+            with self.lock:
+                self.counters[status] = self.counters.get(status, 0) + 1
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(n_records, host=HOST, port=PORT, seed=SEED, latency=0.0, record_delay=0.0, fail_first=0):
+    """Arranca el servidor en un hilo y devuelve (servidor, url_base)"""
+    handler = type("Handler", (CountriesHandler,), {
+        "n_records": n_records, "seed": seed, "counters": {}, "lock": threading.Lock(),
+        "latency": latency, "record_delay": record_delay, "fail_first": fail_first, "attempts": {},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.counters = handler.counters
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v3.1/all"
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure_streaming_ingestion(megabytes):
+    """Ingiere un payload sintético de N MB en streaming y reporta la memoria pico"""
+    from . import ingestion
+    from . import cliente_http
+
+    n_records = records_for_size(megabytes)
+    server, url = start_server(n_records, port=0)
+    print(f"Servidor local sirviendo {n_records} países (~{megabytes} MB) en {url}")
+
+    rss_before = peak_rss_mb()
+    with tempfile.TemporaryDirectory() as tmp:
+        ingestion.DB_PATH = os.path.join(tmp, "ingestion.db")
+        cliente_http.CACHE_DIR = os.path.join(tmp, "cache")
+        stats = ingestion.bulk_insert_country_data(ingestion.stream_country_data(url))
+    server.shutdown()
+    rss_after = peak_rss_mb()
+
+    print(f"Registros cargados: {stats['inserted']}")
+    print(f"RSS pico antes: {rss_before:.1f} MB, después: {rss_after:.1f} MB "
+          f"(incremento {rss_after - rss_before:.1f} MB para un payload de ~{megabytes} MB)")
+    return stats, rss_after - rss_before
+
+def measure_http_cache(n_records=250, runs=5):
+    """Repite la descarga contra el servidor local y reporta aciertos de caché y respuestas 304"""
+    from . import ingestion
+    from . import cliente_http
+
+    server, url = start_server(n_records, port=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        cliente_http.CACHE_DIR = tmp
+        cliente_http.reset_cache_stats()
+
+        # Primera descarga completa, luego revalidaciones (TTL 0) y lecturas frescas
+        for ttl in [0] * runs + [cliente_http.CACHE_TTL] * runs:
+            chunks = cliente_http.fetch(url, params={'fields': ingestion.API_FIELDS}, ttl=ttl)
+            countries = sum(1 for _ in ingestion.iter_json_array(chunks))
+    server.shutdown()
+
+    stats = cliente_http.cache_stats()
+    print(f"Solicitudes: {stats['requests']} ({countries} países por respuesta)")
+    print(f"  - Descargas completas (200): {server.counters.get(200, 0)}")
+    print(f"  - Revalidaciones sin cuerpo (304): {server.counters.get(304, 0)}")
+    print(f"  - Aciertos sin red: {stats['hits']}")
+    print(f"Tasa de aciertos de caché: {stats['hit_ratio']:.0%}")
+    return stats, server.counters
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        measure_http_cache()
+    else:
+        measure_streaming_ingestion(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
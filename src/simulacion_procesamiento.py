@@ -1,22 +1,36 @@
 import os
+import sys
 import sqlite3
 import pandas as pd
-import numpy as np
-from datetime import datetime
-import ingestion  # Importamos el módulo de ingestion.py
-import ensuciar_datos  # Importar el nuevo módulo
+from . import ensuciar_datos  # Importar el nuevo módulo
+from . import intercambio  # Formato columnar compartido con enrichment.py
+from . import metricas  # Métricas derivadas vectorizadas
+from . import limpieza_por_bloques  # Modo de limpieza por bloques (fuera de memoria)
+from . import paralelo  # Modo de limpieza en paralelo por particiones
+from . import limpieza_sql  # Modo de limpieza compilada a SQL dentro de la base de datos
+from . import deduplicacion  # Casi duplicados y errores tipográficos
+from . import esquema  # Tipos compactos: categorías, numéricos reducidos y texto en Arrow
+from . import instrumentacion  # Spans con tiempos, filas y memoria por paso
+from . import exportacion  # Excel por lotes y salidas escritas en paralelo
+from . import auditoria  # Log de auditoría estructurado; los reportes se renderizan de sus eventos
+from . import rutas  # Rutas de las salidas, independientes del directorio actual
 
 # Configuración de rutas
-DB_PATH = "src/static/db/ingestion.db"
-CLEANED_DATA_PATH = "src/static/xlsx/cleaned_data.xlsx"
-CLEANING_REPORT_PATH = "src/static/auditoria/cleaning_report.txt"
-
-# Asegurar directorios
-os.makedirs(os.path.dirname(CLEANED_DATA_PATH), exist_ok=True)
-os.makedirs(os.path.dirname(CLEANING_REPORT_PATH), exist_ok=True)
+DB_PATH = rutas.output("db", "ingestion.db")
+CLEANED_DATA_PATH = rutas.output("columnar", "cleaned_data.parquet")
+CLEANED_EXCEL_PATH = rutas.output("xlsx", "cleaned_data.xlsx")
+EXPORT_EXCEL = True  # Copia opcional en Excel; la etapa siguiente lee el archivo columnar
+CLEANING_REPORT_PATH = rutas.output("auditoria", "cleaning_report.txt")
+INGESTION_CONTROL_COLUMNS = ['content_hash', 'deleted_at']
+CLEANING_MODE = "memory"  # "memory": todo en un DataFrame; "chunked": por bloques con presupuesto de memoria; "parallel": por particiones en varios procesos; "sql": en SQLite (tabla countries_clean)
+MEMORY_BUDGET_MB = limpieza_por_bloques.MEMORY_BUDGET_MB
+WORKERS = paralelo.WORKERS
+NEAR_DUPLICATES = True  # Fusionar casi duplicados y reparar errores tipográficos (modos memory y parallel)
 
 def check_db_exists():
     """Verifica si la base de datos existe y contiene datos"""
+    from . import ingestion  # Solo se necesita (con requests) si hay que crear la base de datos
+
     if not os.path.exists(DB_PATH):
         print(f"La base de datos no existe en {DB_PATH}. Ejecutando ingestion.py para crearla...")
         ingestion.main()
@@ -46,16 +60,24 @@ def check_db_exists():
     print(f"Base de datos encontrada con {count} registros.")
     return False
 
-def load_data_from_db():
-    """Carga los datos desde la base de datos a un DataFrame de Pandas"""
-    conn = sqlite3.connect(DB_PATH)
-    # Cargar todos los campos disponibles en la tabla countries
-    query = """
-    SELECT * FROM countries
+def countries_query(conn, table="countries"):
+    """Construye la consulta de los campos de datos de countries, sin columnas de control ni países dados de baja"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    selected = ", ".join(f'"{col}"' for col in columns if col not in INGESTION_CONTROL_COLUMNS)
+    query = f"""
+    SELECT {selected} FROM {table}
     """
-    df = pd.read_sql_query(query, conn)
+    if 'deleted_at' in columns:
+        query += "WHERE deleted_at IS NULL\n"
+    return query
+
+def load_data_from_db(span=None, table="countries"):
+    """Carga los datos desde la base de datos a un DataFrame de Pandas con el esquema compacto"""
+    conn = sqlite3.connect(DB_PATH)
+    # Cargar todos los campos de datos de la tabla countries (o de su copia ensuciada)
+    df = pd.read_sql_query(countries_query(conn, table), conn)
     conn.close()
-    return df
+    return esquema.load(df, "limpieza", span)
 
 def exploratory_analysis(df):
     """Realiza un análisis exploratorio de los datos"""
@@ -79,7 +101,7 @@ def exploratory_analysis(df):
     
     # Identificar posibles outliers en campos numéricos
     print("\nEstadísticas descriptivas para campos numéricos:")
-    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
+    numeric_cols = df.select_dtypes(include=['number']).columns
     if not numeric_cols.empty:
         print(df[numeric_cols].describe())
     
@@ -105,6 +127,13 @@ def clean_transform_data(df, analysis_results):
     cleaned_df.drop_duplicates(inplace=True)
     duplicates_removed = initial_records - len(cleaned_df)
     print(f"  - {duplicates_removed} registros duplicados eliminados")
+
+    # 1b. Casi duplicados: mismo país con errores tipográficos, variaciones numéricas o nulos
+    near_duplicates = None
+    if NEAR_DUPLICATES:
+        print("Resolviendo casi duplicados y errores tipográficos...")
+        cleaned_df, near_duplicates = deduplicacion.resolve(cleaned_df)
+        print(f"  - {near_duplicates['merged_records']} casi duplicados fusionados")
     
     # 2. Manejo de valores nulos
     print("Procesando valores nulos...")
@@ -128,27 +157,27 @@ def clean_transform_data(df, analysis_results):
             
             elif pd.api.types.is_numeric_dtype(cleaned_df[col]):
                 # Rellenar valores numéricos con la mediana
-                cleaned_df[col].fillna(cleaned_df[col].median(), inplace=True)
+                cleaned_df[col] = cleaned_df[col].fillna(cleaned_df[col].median())
                 null_operations[col] = f"Imputados {null_count} valores nulos con la mediana"
             
             else:
                 # Rellenar otros tipos con cadena vacía o 'Unknown'
-                cleaned_df[col].fillna("Unknown", inplace=True)
+                cleaned_df[col] = esquema.fill_missing(cleaned_df[col], "Unknown")
                 null_operations[col] = f"Imputados {null_count} valores nulos con 'Unknown'"
     
     # 3. Corrección de tipos de datos
     print("Corrigiendo tipos de datos...")
     type_corrections = {}
     
-    # Asegurar que population sea entero
+    # Asegurar que population sea entero (los enteros reducidos del esquema compacto se conservan)
     if 'population' in cleaned_df.columns:
-        if cleaned_df['population'].dtype != 'int64':
+        if not pd.api.types.is_integer_dtype(cleaned_df['population']):
             cleaned_df['population'] = cleaned_df['population'].astype('int64')
             type_corrections['population'] = 'Convertido a entero'
     
     # Asegurar que area sea float
     if 'area' in cleaned_df.columns:
-        if cleaned_df['area'].dtype != 'float64':
+        if not pd.api.types.is_float_dtype(cleaned_df['area']):
             cleaned_df['area'] = cleaned_df['area'].astype('float64')
             type_corrections['area'] = 'Convertido a float'
     
@@ -156,23 +185,18 @@ def clean_transform_data(df, analysis_results):
     print("Aplicando transformaciones adicionales...")
     
     # Normalizar columnas de texto (convertir a minúsculas para consistencia)
-    text_cols = cleaned_df.select_dtypes(include=['object']).columns
+    text_cols = esquema.text_columns(cleaned_df)
     text_transformations = {}
     
     for col in text_cols:
         # Solo normalizar columnas de texto simples, no JSON serializado
         if col not in ['languages', 'capital', 'timezones', 'currencies']:
             if isinstance(cleaned_df[col].iloc[0], str):
-                cleaned_df[col] = cleaned_df[col].str.strip()
+                cleaned_df[col] = esquema.strip_text(cleaned_df[col])
                 text_transformations[col] = 'Eliminados espacios en blanco innecesarios'
     
-    # Calcular densidad de población
-    if 'population' in cleaned_df.columns and 'area' in cleaned_df.columns:
-        # Evitar división por cero
-        cleaned_df['population_density'] = cleaned_df.apply(
-            lambda row: row['population'] / row['area'] if row['area'] > 0 else np.nan, 
-            axis=1
-        )
+    # Calcular densidad de población (división enmascarada, evita división por cero)
+    if metricas.add_metrics(cleaned_df, ['population_density']):
         print("  - Agregada columna 'population_density' (población/área)")
     
     # Resultado de la limpieza
@@ -184,112 +208,270 @@ def clean_transform_data(df, analysis_results):
             'initial_records': initial_records,
             'final_records': final_records,
             'duplicates_removed': duplicates_removed,
+            'near_duplicates': near_duplicates,
             'null_operations': null_operations,
             'type_corrections': type_corrections,
             'text_transformations': text_transformations
         }
     }
 
-def generate_output_files(cleaned_data, analysis_results, cleaning_results):
+def generate_output_files(cleaned_data, analysis_results, cleaning_results, export_excel=None):
     """Genera los archivos de salida: datos limpios y reporte de auditoría"""
     print("\n=== GENERANDO ARCHIVOS DE SALIDA ===")
+    export_excel = EXPORT_EXCEL if export_excel is None else export_excel
     
-    # 1. Exportar datos limpios a Excel
+    # Las tres salidas son independientes y se escriben a la vez
+    # 1. Datos limpios en formato columnar para la etapa de enriquecimiento
     print(f"Exportando datos limpios a {CLEANED_DATA_PATH}...")
-    cleaned_data.to_excel(CLEANED_DATA_PATH, index=False)
+    outputs = [("cleaning.write_parquet", len(cleaned_data),
+                lambda: intercambio.write_stage_output(cleaned_data, CLEANED_DATA_PATH, stage="cleaning"))]
+
+    if export_excel:
+        print(f"Exportando copia en Excel a {CLEANED_EXCEL_PATH}...")
+        outputs.append(("cleaning.to_excel", len(cleaned_data),
+                        lambda: exportacion.write_excel(cleaned_data, CLEANED_EXCEL_PATH)))
     
-    # 2. Generar reporte de auditoría
-    print(f"Generando reporte de auditoría en {CLEANING_REPORT_PATH}...")
+    # 2. Reporte de auditoría
+    outputs.append(("cleaning.report", None,
+                    lambda: generate_cleaning_report(cleaned_data, analysis_results, cleaning_results)))
+    exportacion.run_outputs(outputs)
     
-    with open(CLEANING_REPORT_PATH, 'w') as f:
-        f.write("INFORME DE AUDITORÍA DE LIMPIEZA DE DATOS\n")
-        f.write("========================================\n\n")
-        f.write(f"Fecha y hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
+    print(f"Archivos generados exitosamente.")
+
+def generate_cleaning_report(cleaned_data, analysis_results, cleaning_results):
+    """Escribe el reporte de auditoría; de cleaned_data solo se usan las columnas y las primeras filas"""
+    print(f"Generando reporte de auditoría en {CLEANING_REPORT_PATH}...")
+    events = cleaning_events(cleaned_data, analysis_results, cleaning_results)
+    auditoria.write_report(events, render_cleaning_report, CLEANING_REPORT_PATH)
+
+def cleaning_events(cleaned_data, analysis_results, cleaning_results):
+    """Eventos de auditoría de la limpieza: resumen, fusiones por país y acciones por columna"""
+    stats = cleaning_results['stats']
+    near_duplicates = stats.get('near_duplicates')
+    sample = cleaned_data.head(5)[['cca3', 'name_common', 'region', 'population', 'area']]
+    events = [auditoria.record(
+        'cleaning', 'run',
+        total_records=analysis_results['total_records'], duplicates_found=analysis_results['duplicates'],
+        null_values=analysis_results['null_values'],
+        initial_records=stats['initial_records'], final_records=stats['final_records'],
+        duplicates_removed=stats['duplicates_removed'],
+        near_duplicates_resolved=near_duplicates is not None,
+        merged_records=near_duplicates['merged_records'] if near_duplicates else 0,
+        columns=len(cleaned_data.columns),
+        sample={'index': sample.index.tolist(), 'columns': list(sample.columns),
+                'rows': sample.astype(object).where(sample.notna(), None).values.tolist()},
+    )]
+    if near_duplicates:
+        for decision in near_duplicates['decisions']:
+            events.append(auditoria.record('cleaning', 'near_duplicate', decision['cca3'], kept=decision['kept'],
+                                           merged=decision['merged'], differences=decision['differences'],
+                                           repairs=decision['repairs']))
+        for col, repairs in near_duplicates['category_repairs'].items():
+            for value, repair in repairs.items():
+                events.append(auditoria.record('cleaning', 'category_repair', column=col, value=value,
+                                               after=repair['after'], rows=repair['rows']))
+    for event, operations in (('null_operation', stats['null_operations']),
+                              ('type_correction', stats['type_corrections']),
+                              ('text_transformation', stats['text_transformations'])):
+        for col, operation in operations.items():
+            events.append(auditoria.record('cleaning', event, column=col, operation=operation))
+    return events
+
+def render_cleaning_report(events):
+    """Texto del informe de limpieza a partir de sus eventos"""
+    grouped = auditoria.by_event(events)
+    run = grouped['run'][0]
+    lines = [
+        "INFORME DE AUDITORÍA DE LIMPIEZA DE DATOS",
+        "========================================",
+        "",
+        f"Fecha y hora: {auditoria.report_timestamp(run)}",
+        "",
         # Información del análisis exploratorio
-        f.write("1. ANÁLISIS EXPLORATORIO INICIAL\n")
-        f.write("-------------------------------\n")
-        f.write(f"Total de registros analizados: {analysis_results['total_records']}\n")
-        f.write(f"Registros duplicados encontrados: {analysis_results['duplicates']}\n")
-        
-        f.write("\nValores nulos por columna:\n")
-        null_values = analysis_results['null_values']
-        if any(null_values.values()):
-            for col, count in null_values.items():
-                if count > 0:
-                    f.write(f"  - {col}: {count} valores nulos\n")
-        else:
-            f.write("  - No se encontraron valores nulos\n")
-        
-        # Información del proceso de limpieza
-        f.write("\n2. PROCESO DE LIMPIEZA Y TRANSFORMACIÓN\n")
-        f.write("-------------------------------------\n")
-        stats = cleaning_results['stats']
-        
-        f.write(f"Registros antes de la limpieza: {stats['initial_records']}\n")
-        f.write(f"Registros después de la limpieza: {stats['final_records']}\n")
-        f.write(f"Registros eliminados: {stats['initial_records'] - stats['final_records']}\n\n")
-        
-        f.write("a. Eliminación de duplicados:\n")
-        f.write(f"   - {stats['duplicates_removed']} registros duplicados eliminados\n\n")
-        
-        f.write("b. Manejo de valores nulos:\n")
-        if stats['null_operations']:
-            for col, operation in stats['null_operations'].items():
-                f.write(f"   - {col}: {operation}\n")
-        else:
-            f.write("   - No fue necesario realizar operaciones con valores nulos\n\n")
-        
-        f.write("c. Corrección de tipos de datos:\n")
-        if stats['type_corrections']:
-            for col, correction in stats['type_corrections'].items():
-                f.write(f"   - {col}: {correction}\n")
+        "1. ANÁLISIS EXPLORATORIO INICIAL",
+        "-------------------------------",
+        f"Total de registros analizados: {run['total_records']}",
+        f"Registros duplicados encontrados: {run['duplicates_found']}",
+        "",
+        "Valores nulos por columna:",
+    ]
+    null_values = run['null_values']
+    if any(null_values.values()):
+        lines += [f"  - {col}: {count} valores nulos" for col, count in null_values.items() if count > 0]
+    else:
+        lines.append("  - No se encontraron valores nulos")
+
+    # Información del proceso de limpieza
+    lines += [
+        "",
+        "2. PROCESO DE LIMPIEZA Y TRANSFORMACIÓN",
+        "-------------------------------------",
+        f"Registros antes de la limpieza: {run['initial_records']}",
+        f"Registros después de la limpieza: {run['final_records']}",
+        f"Registros eliminados: {run['initial_records'] - run['final_records']}",
+        "",
+        "a. Eliminación de duplicados:",
+        f"   - {run['duplicates_removed']} registros duplicados eliminados",
+        "",
+        "a2. Casi duplicados y errores tipográficos:",
+    ]
+    if not run['near_duplicates_resolved']:
+        lines += ["   - No se resolvieron casi duplicados en este modo de limpieza", ""]
+    else:
+        lines.append(f"   - {run['merged_records']} registros fusionados con su versión conservada")
+        for decision in grouped.get('near_duplicate', []):
+            lines.append(f"   - {decision['entity']}: se conserva la fila {decision['kept']}, "
+                         f"se fusionan {decision['merged']} (diferencias en {', '.join(decision['differences']) or 'nulos'})")
+            for col, repair in decision['repairs'].items():
+                lines.append(f"       {col}: {repair['before']!r} -> {repair['after']!r}")
+        for repair in grouped.get('category_repair', []):
+            lines.append(f"   - {repair['column']}: {repair['value']!r} -> {repair['after']!r} en {repair['rows']} filas")
+        lines.append("")
+
+    sections = [
+        ("b. Manejo de valores nulos:", 'null_operation',
+         "   - No fue necesario realizar operaciones con valores nulos"),
+        ("c. Corrección de tipos de datos:", 'type_correction',
+         "   - No fue necesario realizar correcciones de tipos de datos"),
+    ]
+    for title, event, empty in sections:
+        lines.append(title)
+        if grouped.get(event):
+            lines += [f"   - {item['column']}: {item['operation']}" for item in grouped[event]]
         else:
-            f.write("   - No fue necesario realizar correcciones de tipos de datos\n\n")
-        
-        f.write("d. Transformaciones adicionales:\n")
-        if stats['text_transformations']:
-            for col, transformation in stats['text_transformations'].items():
-                f.write(f"   - {col}: {transformation}\n")
-        f.write("   - Agregada columna 'population_density' que representa la densidad de población\n\n")
-        
-        # Estadísticas finales
-        f.write("\n3. ESTADÍSTICAS FINALES\n")
-        f.write("----------------------\n")
-        f.write(f"Total de registros en el conjunto de datos limpio: {stats['final_records']}\n")
-        f.write(f"Columnas en el conjunto de datos limpio: {len(cleaned_data.columns)}\n")
-        
-        # Muestra de las primeras filas
-        f.write("\nMuestra de los primeros 5 registros después de la limpieza:\n")
-        f.write(cleaned_data.head(5)[['cca3', 'name_common', 'region', 'population', 'area']].to_string())
-        
-    print(f"Archivos generados exitosamente.")
+            lines += [empty, ""]
+
+    lines.append("d. Transformaciones adicionales:")
+    lines += [f"   - {item['column']}: {item['operation']}" for item in grouped.get('text_transformation', [])]
+    lines += ["   - Agregada columna 'population_density' que representa la densidad de población", "", ""]
+
+    # Estadísticas finales
+    sample = run['sample']
+    lines += [
+        "3. ESTADÍSTICAS FINALES",
+        "----------------------",
+        f"Total de registros en el conjunto de datos limpio: {run['final_records']}",
+        f"Columnas en el conjunto de datos limpio: {run['columns']}",
+        "",
+        "Muestra de los primeros 5 registros después de la limpieza:",
+    ]
+    lines.append(pd.DataFrame(sample['rows'], index=sample['index'], columns=sample['columns']).to_string())
+    return "\n".join(lines)
+
+def ensure_output_dirs():
+    """Crea los directorios de salida al ejecutar la etapa (no al importar el módulo)"""
+    for path in (CLEANED_DATA_PATH, CLEANED_EXCEL_PATH, CLEANING_REPORT_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
 
-def main():
+def main(mode=None, export_excel=None):
+    """export_excel=False omite la copia en Excel (el orquestador la escribe como etapa propia)"""
+    mode = mode or CLEANING_MODE
+    export_excel = EXPORT_EXCEL if export_excel is None else export_excel
+    ensure_output_dirs()
+    with instrumentacion.span("cleaning", mode=mode) as stage_span:
+        cleaned_rows = run(mode, export_excel)
+        stage_span['rows_out'] = cleaned_rows
+
+def run(mode, export_excel=None):
+    """Pasos de la etapa de limpieza; devuelve la cantidad de registros limpios"""
     print("\n===== INICIANDO SIMULACIÓN DE PROCESAMIENTO DE DATOS =====\n")
     
     # 1. Verificar si la base de datos existe o ejecutar ingestion.py
     db_created = check_db_exists()
 
-    # 2. Ensuciar los datos antes del análisis
+    # 2. Ensuciar los datos antes del análisis; la limpieza lee la copia ensuciada
+    table = "countries"
     if not db_created:  # Solo ensuciar si la BD ya existía
-        ensuciar_datos.ensuciar_datos()
+        with instrumentacion.span("cleaning.ensuciar_datos"):
+            table = ensuciar_datos.ensuciar_datos()
+
+    if mode == "chunked":
+        return main_chunked(export_excel, table)
+    if mode == "sql":
+        return main_sql(export_excel, table)
 
     # 3. Cargar datos desde la base de datos
-    df = load_data_from_db()
+    with instrumentacion.span("cleaning.load_data") as load_span:
+        df = load_data_from_db(load_span, table)
+        load_span['rows_out'] = len(df)
     print(f"Datos cargados desde la base de datos: {len(df)} registros")
 
     # 4. Realizar análisis exploratorio
-    analysis_results = exploratory_analysis(df)
+    with instrumentacion.span("cleaning.exploratory_analysis", rows_in=len(df)):
+        analysis_results = exploratory_analysis(df)
 
     # 5. Limpiar y transformar los datos
-    cleaning_results = clean_transform_data(df, analysis_results)
-    cleaned_df = cleaning_results['cleaned_df']
+    with instrumentacion.span("cleaning.clean_transform_data", rows_in=len(df), mode=mode) as clean_span:
+        if mode == "parallel":
+            cleaning_results = paralelo.clean_parallel(df, workers=WORKERS, near_duplicates=NEAR_DUPLICATES)
+        else:
+            cleaning_results = clean_transform_data(df, analysis_results)
+        cleaned_df = cleaning_results['cleaned_df']
+        clean_span['rows_out'] = len(cleaned_df)
 
     # 6. Generar archivos de salida
-    generate_output_files(cleaned_df, analysis_results, cleaning_results)
+    generate_output_files(cleaned_df, analysis_results, cleaning_results, export_excel)
 
     print("\n===== PROCESO DE SIMULACIÓN COMPLETADO =====")
+    return len(cleaned_df)
+
+def main_chunked(export_excel=None, table="countries"):
+    """Análisis, limpieza y salida por bloques, sin cargar la tabla completa"""
+    conn = sqlite3.connect(DB_PATH)
+    query = countries_query(conn, table)
+    conn.close()
+
+    with instrumentacion.span("cleaning.clean_in_chunks") as clean_span:
+        analysis_results, cleaning_results, sample_df = limpieza_por_bloques.clean_in_chunks(
+            DB_PATH, query, CLEANED_DATA_PATH, memory_budget_mb=MEMORY_BUDGET_MB, table=table)
+        clean_span['rows_in'] = cleaning_results['stats']['initial_records']
+        clean_span['rows_out'] = cleaning_results['stats']['final_records']
+
+    if NEAR_DUPLICATES:
+        print("Los casi duplicados no se resuelven en el modo por bloques (solo en los modos memory y parallel).")
+
+    print("\n=== GENERANDO ARCHIVOS DE SALIDA ===")
+    if EXPORT_EXCEL if export_excel is None else export_excel:
+        print("La copia en Excel se omite en el modo por bloques.")
+    generate_cleaning_report(sample_df, analysis_results, cleaning_results)
+
+    print("\n===== PROCESO DE SIMULACIÓN COMPLETADO =====")
+    return cleaning_results['stats']['final_records']
+
+def main_sql(export_excel=None, table="countries"):
+    """Limpieza ejecutada en SQLite: Python solo recibe las estadísticas y exporta countries_clean por lotes"""
+    with instrumentacion.span("cleaning.clean_in_sql") as clean_span:
+        analysis_results, cleaning_results, sample_df = limpieza_sql.clean_in_sql(
+            DB_PATH, INGESTION_CONTROL_COLUMNS, table)
+        clean_span['rows_in'] = cleaning_results['stats']['initial_records']
+        clean_span['rows_out'] = cleaning_results['stats']['final_records']
+
+    print("\n=== GENERANDO ARCHIVOS DE SALIDA ===")
+    final_records = cleaning_results['stats']['final_records']
+    print(f"Exportando {limpieza_sql.CLEAN_TABLE} a {CLEANED_DATA_PATH}...")
+    outputs = [("cleaning.write_parquet", final_records,
+                lambda: intercambio.write_stage_chunks(limpieza_sql.iter_clean_table(DB_PATH), CLEANED_DATA_PATH,
+                                                       stage="cleaning"))]
+    if EXPORT_EXCEL if export_excel is None else export_excel:
+        print(f"Exportando copia en Excel a {CLEANED_EXCEL_PATH}...")
+        outputs.append(("cleaning.to_excel", final_records,
+                        lambda: exportacion.write_excel(limpieza_sql.iter_clean_table(DB_PATH), CLEANED_EXCEL_PATH)))
+    outputs.append(("cleaning.report", None,
+                    lambda: generate_cleaning_report(sample_df, analysis_results, cleaning_results)))
+    exportacion.run_outputs(outputs)
+
+    print("\n===== PROCESO DE SIMULACIÓN COMPLETADO =====")
+    return final_records
+
+def export_excel_copy():
+    """Copia en Excel de los datos limpios, leída por lotes del archivo columnar; devuelve las filas escritas"""
+    ensure_output_dirs()
+    with instrumentacion.span("cleaning.to_excel") as excel_span:
+        print(f"Exportando copia en Excel a {CLEANED_EXCEL_PATH}...")
+        excel_span['rows_out'] = exportacion.write_excel(
+            intercambio.iter_stage_batches(CLEANED_DATA_PATH, exportacion.EXCEL_BATCH_SIZE), CLEANED_EXCEL_PATH)
+    return excel_span.get('rows_out')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python -m pipeline_paises.simulacion_procesamiento [memory|chunked|parallel|sql]: modo de esta ejecución
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Las salidas de las pruebas van a un directorio temporal, fijado antes de importar las etapas
+BASE_DIR = tempfile.mkdtemp(prefix="pipeline_paises_tests_")
+os.environ["PIPELINE_BASE_DIR"] = BASE_DIR
+
+# Sin instalar el paquete (pip install -e .), src/ se expone como pipeline_paises con un enlace simbólico;
+# se agrega a sys.path para que también lo encuentren los procesos hijos de los modos en paralelo
+LINK_DIR = None
+try:
+    import pipeline_paises  # noqa: F401
+except ImportError:
+    LINK_DIR = tempfile.mkdtemp(prefix="pipeline_paises_src_")
+    os.symlink(SRC_DIR, os.path.join(LINK_DIR, "pipeline_paises"))
+    sys.path.insert(0, LINK_DIR)
+
+from pipeline_paises import rutas, servidor_local, ingestion, cliente_http  # noqa: E402
+
+N_COUNTRIES = 120
+
+def pytest_unconfigure(config):
+    shutil.rmtree(BASE_DIR, ignore_errors=True)
+    if LINK_DIR:
+        shutil.rmtree(LINK_DIR, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def base_dir():
+    """Cada prueba empieza con el directorio de salidas vacío"""
+    shutil.rmtree(rutas.BASE_DIR, ignore_errors=True)
+    os.makedirs(rutas.BASE_DIR)
+    cliente_http.reset_cache_stats()
+    yield rutas.BASE_DIR
+
+@pytest.fixture
+def api(monkeypatch):
+    """Arranca servidores locales de la API; start(n) apunta la ingesta al nuevo servidor"""
+    servers = []
+
+    def start(n_records=N_COUNTRIES, **kwargs):
+        server, url = servidor_local.start_server(n_records, port=0, **kwargs)
+        servers.append(server)
+        monkeypatch.setattr(ingestion, "BASE_URL", url)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,49 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from pipeline_paises import agregados, metricas
+
+def synthetic(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'id': np.arange(n_rows),
+        'cca3': [f"S{i:08d}" for i in range(n_rows)],
+        'name_common': [f"Country {i}" for i in range(n_rows)],
+        'region': rng.choice(["Africa", "Americas", "Asia", "Europe", "Oceania"], n_rows),
+        'population': rng.integers(1_000, 100_000_000, n_rows),
+        'area': rng.uniform(10, 1_000_000, n_rows).round(1),
+        'language_family': rng.choice(["Indo-European", "Afro-Asiatic", "Niger-Congo", None], n_rows),
+        'language_count': rng.integers(0, 12, n_rows),
+    })
+    metricas.add_metrics(df, ['linguistic_diversity'])
+    return df
+
+def read_table(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        df = pd.read_sql(f"SELECT * FROM {table}", conn)
+    finally:
+        conn.close()
+    keys = agregados.AGGREGATES[table]
+    return df.sort_values(keys).reset_index(drop=True) if keys else df
+
+def test_incremental_matches_full_rebuild(tmp_path):
+    rng = np.random.default_rng(1)
+    df = synthetic(2000)
+    incremental = str(tmp_path / "incremental.db")
+    agregados.materialize(df, incremental)
+
+    # Filas modificadas, eliminadas y nuevas
+    changed = df.copy()
+    touched = rng.choice(len(changed), 100, replace=False)
+    changed.loc[touched, 'language_count'] = rng.integers(0, 12, len(touched))
+    changed = pd.concat([changed.drop(index=range(50)), synthetic(2030).iloc[2000:]], ignore_index=True)
+    metricas.add_metrics(changed, ['linguistic_diversity'])
+    stats = agregados.materialize(changed, incremental)
+    assert not stats['rebuilt'] and stats['added'] > 0 and stats['removed'] > 0
+
+    full = str(tmp_path / "full.db")
+    agregados.materialize(changed, full)
+    for table in agregados.AGGREGATES:
+        pd.testing.assert_frame_equal(read_table(incremental, table), read_table(full, table), check_exact=False)
+    assert agregados.region_language_families(incremental) == metricas.region_language_families(changed)
@@ -0,0 +1,28 @@
+from pipeline_paises import auditoria, orquestador, ingestion, simulacion_procesamiento, enrichment
+
+REPORTS = {
+    'ingestion': lambda: ingestion.AUDIT_PATH,
+    'cleaning': lambda: simulacion_procesamiento.CLEANING_REPORT_PATH,
+    'enrichment': lambda: enrichment.ENRICHMENT_REPORT_PATH,
+}
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def test_replay_matches_reports(api, capsys):
+    api(60)
+    orquestador.run_pipeline(['enrichment'])
+    for stage, path in REPORTS.items():
+        assert auditoria.render(stage) == read(path()), stage
+
+    # pipeline audit imprime el reporte tal como quedó en el archivo
+    capsys.readouterr()
+    auditoria.cli(['ingestion'])
+    assert capsys.readouterr().out == read(ingestion.AUDIT_PATH)
+
+def test_query_filters_events(api):
+    api(60)
+    ingestion.main("full")
+    events = list(auditoria.query(stage='ingestion', entity='000007'))
+    assert events and all(item['entity'] == '000007' for item in events)
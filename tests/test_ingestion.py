@@ -0,0 +1,86 @@
+import sqlite3
+from pipeline_paises import ingestion, cliente_http, descarga_concurrente
+
+def query(sql):
+    conn = sqlite3.connect(ingestion.DB_PATH)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def last_run():
+    """(insertados, actualizados, sin cambios, eliminados) de la última ingesta"""
+    return query("SELECT inserted, updated, unchanged, deleted FROM ingestion_runs ORDER BY rowid DESC LIMIT 1")[0]
+
+def fail_region(monkeypatch, region):
+    """Las partes de una región fallan con un error que no es de requests"""
+    monkeypatch.setattr(descarga_concurrente, "RETRIES", 1)
+    monkeypatch.setattr(descarga_concurrente, "BACKOFF_BASE", 0.01)
+    download = descarga_concurrente._download
+
+    def failing(part, output, cancelled):
+        if part['url'].endswith(f"/region/{region}"):
+            raise RuntimeError("fallo inyectado")
+        return download(part, output, cancelled)
+
+    monkeypatch.setattr(descarga_concurrente, "_download", failing)
+
+def test_delta_upsert_soft_deletes_and_restores(api):
+    api(120)
+    ingestion.main("full")
+
+    api(100)
+    ingestion.main("delta")
+    assert last_run() == (0, 0, 100, 20)
+    assert query("SELECT COUNT(*) FROM countries WHERE deleted_at IS NOT NULL") == [(20,)]
+
+    # Los países que vuelven a publicarse se reactivan
+    api(120)
+    ingestion.main("delta")
+    assert last_run() == (0, 20, 100, 0)
+    assert query("SELECT COUNT(*) FROM countries WHERE deleted_at IS NOT NULL") == [(0,)]
+
+def test_delta_upsert_detects_changes(api):
+    api(50)
+    ingestion.main("full")
+    api(50, seed=7)
+    ingestion.main("delta")
+    # Otra semilla cambia población, área y región de los mismos cca3
+    assert last_run() == (0, 50, 0, 0)
+
+def test_concurrent_download_matches_stream(api):
+    api(80)
+    streamed = sorted(ingestion.stream_country_data(), key=lambda country: country['cca3'])
+    stats = {}
+    concurrent = sorted(descarga_concurrente.iter_countries(stats=stats), key=lambda country: country['cca3'])
+    assert concurrent == streamed
+    assert stats['failed'] == [] and stats['incomplete'] == 0
+
+def test_unexpected_error_marks_part_failed(api, monkeypatch):
+    api(80)
+    fail_region(monkeypatch, "europe")
+    stats = {}
+    countries = list(descarga_concurrente.iter_countries(stats=stats))
+    assert stats['failed'] == ["europe[0]"]
+    assert stats['retries'] == 1
+    assert all(country['region'] != "Europe" for country in countries)
+
+def test_failed_part_skips_soft_delete(api, monkeypatch):
+    api(120)
+    ingestion.main("full")
+
+    api(100)
+    monkeypatch.setattr(ingestion, "FETCH_MODE", "concurrent")
+    fail_region(monkeypatch, "europe")
+    ingestion.main("delta")
+    assert last_run()[3] == 0
+    assert query("SELECT COUNT(*) FROM countries WHERE deleted_at IS NOT NULL") == [(0,)]
+
+def test_http_cache_revalidates_with_etag(api, monkeypatch):
+    server, url = api(30)
+    monkeypatch.setattr(cliente_http, "CACHE_TTL", 0)
+    first = b"".join(cliente_http.fetch(url))
+    second = b"".join(cliente_http.fetch(url))
+    assert first == second
+    assert server.counters.get(304) == 1
+    assert cliente_http.cache_stats()['revalidated'] == 1
@@ -0,0 +1,67 @@
+import sqlite3
+import functools
+import numpy as np
+import pytest
+from pipeline_paises import (ingestion, ensuciar_datos, simulacion_procesamiento as sp, intercambio, limpieza_sql,
+                             limpieza_por_bloques, servidor_local)
+
+MODES = ["memory", "chunked", "sql", "parallel"]
+
+@pytest.fixture
+def dirty_db(api, monkeypatch):
+    """BD ingerida del servidor local; cada limpieza la ensucia con la misma semilla y con duplicados"""
+    api(300)
+    ingestion.main("full")
+    monkeypatch.setattr(ensuciar_datos, "DUPLICATE_RATE", 0.05)
+    monkeypatch.setattr(ensuciar_datos, "ensuciar_datos", functools.partial(ensuciar_datos.ensuciar_datos, seed=3))
+    monkeypatch.setattr(sp, "WORKERS", 2)
+    return sp.DB_PATH
+
+def clean(mode):
+    sp.main(mode, export_excel=False)
+    return intercambio.read_stage_output(sp.CLEANED_DATA_PATH)
+
+def test_modes_produce_the_same_output(dirty_db, monkeypatch):
+    # Los casi duplicados solo se resuelven en memory y parallel
+    monkeypatch.setattr(sp, "NEAR_DUPLICATES", False)
+    outputs = {mode: clean(mode) for mode in MODES}
+
+    conn = sqlite3.connect(dirty_db)
+    dirty_rows, dirty_cca3 = conn.execute(
+        f"SELECT COUNT(*), COUNT(DISTINCT cca3) FROM {ensuciar_datos.DIRTY_TABLE}").fetchone()
+    assert conn.execute("SELECT COUNT(*) FROM countries").fetchone()[0] == 300
+    conn.close()
+    assert dirty_rows > dirty_cca3 == 300
+
+    for mode, df in outputs.items():
+        assert len(df) == 300, mode
+        assert df['cca3'].is_unique, mode
+        assert not df['cca3'].str.contains("*", regex=False).any(), mode
+    expected = limpieza_sql._comparable(outputs["memory"])
+    for mode in MODES[1:]:
+        assert limpieza_sql._comparable(outputs[mode]).equals(expected), mode
+
+def test_near_duplicates_only_in_memory_modes(dirty_db, monkeypatch):
+    # Con errores tipográficos en todas las regiones muestreadas
+    monkeypatch.setattr(ensuciar_datos, "TYPO_COLS", ['region'])
+    monkeypatch.setattr(ensuciar_datos, "TYPO_RATE", 0.1)
+    monkeypatch.setattr(ensuciar_datos, "TYPO_PROBABILITY", 1.0)
+    monkeypatch.setattr(sp, "NEAR_DUPLICATES", True)
+
+    memory = clean("memory")
+    chunked = clean("chunked")
+    assert set(memory['region']) <= set(servidor_local.REGIONS)
+    assert not set(chunked['region']) <= set(servidor_local.REGIONS)
+    assert "No se resolvieron casi duplicados" in open(sp.CLEANING_REPORT_PATH, encoding="utf-8").read()
+
+def test_spooled_median_matches_numpy(tmp_path):
+    rng = np.random.default_rng(0)
+    conn = sqlite3.connect(tmp_path / "median.db")
+    for n in (1, 2, 7, 10):
+        values = rng.normal(size=n)
+        conn.execute(f"CREATE TABLE t{n} (value REAL)")
+        conn.executemany(f"INSERT INTO t{n} VALUES (?)", ((value,) for value in values.tolist()))
+        assert limpieza_por_bloques._spooled_median(conn, f"t{n}") == float(np.median(values))
+    conn.execute("CREATE TABLE empty (value REAL)")
+    assert np.isnan(limpieza_por_bloques._spooled_median(conn, "empty"))
+    conn.close()
@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import subprocess
+import pipeline_paises
+from pipeline_paises import orquestador
+
+STAGE_MODULES = ["ingestion", "cliente_http", "simulacion_procesamiento", "enrichment", "codigos_idioma",
+                 "esquema", "agregados"]
+
+def test_second_run_is_all_cache_hits(api):
+    api(60)
+    first = orquestador.run_pipeline()
+    assert all(result['cache'] == 'miss' and result['status'] == 'ok' for result in first.values())
+    second = orquestador.run_pipeline()
+    assert {result['cache'] for result in second.values()} == {'hit'}
+
+def test_cache_keys_without_importing_stages(api):
+    api(60)
+    orquestador.run_pipeline()
+    cache = orquestador.load_stage_cache()
+
+    # En un intérprete nuevo las claves se calculan sin importar las etapas
+    code = ("import sys, json\n"
+            "from pipeline_paises import orquestador\n"
+            "keys = {name: orquestador.stage_key(name) for name in orquestador.STAGES}\n"
+            "print(json.dumps({'keys': keys, 'modules': sorted(sys.modules)}))")
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(pipeline_paises.__file__))}
+    output = json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                       check=True, env=env).stdout)
+    for module in STAGE_MODULES:
+        assert f"pipeline_paises.{module}" not in output['modules']
+    assert "requests" not in output['modules'] and "pandas" not in output['modules']
+    # La URL de la ingesta apunta al servidor local solo en este proceso
+    for name in orquestador.STAGES:
+        if name != 'ingestion':
+            assert output['keys'][name] == cache[name]['key'], name
+
+def test_source_config_matches_modules():
+    for module in STAGE_MODULES:
+        path = os.path.join(orquestador.SRC_DIR, f"{module}.py")
+        loaded = orquestador.stage_module(module)
+        for name, value in orquestador._read_constants(path).items():
+            if not name.isupper():
+                continue  # Estado interno del módulo, no configuración
+            assert getattr(loaded, name) == value, (module, name)